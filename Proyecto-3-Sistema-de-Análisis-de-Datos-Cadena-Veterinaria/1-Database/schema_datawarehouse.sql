@@ -49,63 +49,78 @@ CREATE TABLE dw.dim_tiempo (
     fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Agrega a dw.dim_tiempo los días siguientes a su última fecha (desde
+-- 2020-01-01 si está vacía) hasta p_hasta y devuelve cuántos agregó. El ETL la
+-- llama en cada corrida para cubrir los meses de las particiones por adelantado.
+CREATE OR REPLACE FUNCTION dw.extender_dim_tiempo(p_hasta DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_agregados INTEGER;
+BEGIN
+    INSERT INTO dw.dim_tiempo (
+        fecha, dia, dia_semana, dia_nombre, dia_corto, dia_anio, es_fin_semana,
+        semana_anio, semana_mes, mes, mes_nombre, mes_corto, mes_anio,
+        trimestre, trimestre_anio, anio
+    )
+    SELECT 
+        fecha,
+        EXTRACT(DAY FROM fecha)::INTEGER,
+        EXTRACT(ISODOW FROM fecha)::INTEGER,
+        CASE EXTRACT(ISODOW FROM fecha)
+            WHEN 1 THEN 'Lunes'
+            WHEN 2 THEN 'Martes'
+            WHEN 3 THEN 'Miércoles'
+            WHEN 4 THEN 'Jueves'
+            WHEN 5 THEN 'Viernes'
+            WHEN 6 THEN 'Sábado'
+            WHEN 7 THEN 'Domingo'
+        END,
+        CASE EXTRACT(ISODOW FROM fecha)
+            WHEN 1 THEN 'Lun'
+            WHEN 2 THEN 'Mar'
+            WHEN 3 THEN 'Mié'
+            WHEN 4 THEN 'Jue'
+            WHEN 5 THEN 'Vie'
+            WHEN 6 THEN 'Sáb'
+            WHEN 7 THEN 'Dom'
+        END,
+        EXTRACT(DOY FROM fecha)::INTEGER,
+        EXTRACT(ISODOW FROM fecha) IN (6, 7),
+        EXTRACT(WEEK FROM fecha)::INTEGER,
+        CEIL(EXTRACT(DAY FROM fecha) / 7.0)::INTEGER,
+        EXTRACT(MONTH FROM fecha)::INTEGER,
+        CASE EXTRACT(MONTH FROM fecha)
+            WHEN 1 THEN 'Enero'
+            WHEN 2 THEN 'Febrero'
+            WHEN 3 THEN 'Marzo'
+            WHEN 4 THEN 'Abril'
+            WHEN 5 THEN 'Mayo'
+            WHEN 6 THEN 'Junio'
+            WHEN 7 THEN 'Julio'
+            WHEN 8 THEN 'Agosto'
+            WHEN 9 THEN 'Septiembre'
+            WHEN 10 THEN 'Octubre'
+            WHEN 11 THEN 'Noviembre'
+            WHEN 12 THEN 'Diciembre'
+        END,
+        TO_CHAR(fecha, 'Mon'),
+        TO_CHAR(fecha, 'YYYY-MM'),
+        EXTRACT(QUARTER FROM fecha)::INTEGER,
+        EXTRACT(YEAR FROM fecha) || '-Q' || EXTRACT(QUARTER FROM fecha),
+        EXTRACT(YEAR FROM fecha)::INTEGER
+    FROM generate_series(
+        COALESCE((SELECT MAX(fecha) + 1 FROM dw.dim_tiempo), '2020-01-01'::DATE),
+        p_hasta,
+        '1 day'::INTERVAL
+    ) AS fecha;
+
+    GET DIAGNOSTICS v_agregados = ROW_COUNT;
+    RETURN v_agregados;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Poblar dimensión tiempo (2020-2025)
-INSERT INTO dw.dim_tiempo (
-    fecha, dia, dia_semana, dia_nombre, dia_corto, dia_anio, es_fin_semana,
-    semana_anio, semana_mes, mes, mes_nombre, mes_corto, mes_anio,
-    trimestre, trimestre_anio, anio
-)
-SELECT 
-    fecha,
-    EXTRACT(DAY FROM fecha)::INTEGER,
-    EXTRACT(ISODOW FROM fecha)::INTEGER,
-    CASE EXTRACT(ISODOW FROM fecha)
-        WHEN 1 THEN 'Lunes'
-        WHEN 2 THEN 'Martes'
-        WHEN 3 THEN 'Miércoles'
-        WHEN 4 THEN 'Jueves'
-        WHEN 5 THEN 'Viernes'
-        WHEN 6 THEN 'Sábado'
-        WHEN 7 THEN 'Domingo'
-    END,
-    CASE EXTRACT(ISODOW FROM fecha)
-        WHEN 1 THEN 'Lun'
-        WHEN 2 THEN 'Mar'
-        WHEN 3 THEN 'Mié'
-        WHEN 4 THEN 'Jue'
-        WHEN 5 THEN 'Vie'
-        WHEN 6 THEN 'Sáb'
-        WHEN 7 THEN 'Dom'
-    END,
-    EXTRACT(DOY FROM fecha)::INTEGER,
-    EXTRACT(ISODOW FROM fecha) IN (6, 7),
-    EXTRACT(WEEK FROM fecha)::INTEGER,
-    CEIL(EXTRACT(DAY FROM fecha) / 7.0)::INTEGER,
-    EXTRACT(MONTH FROM fecha)::INTEGER,
-    CASE EXTRACT(MONTH FROM fecha)
-        WHEN 1 THEN 'Enero'
-        WHEN 2 THEN 'Febrero'
-        WHEN 3 THEN 'Marzo'
-        WHEN 4 THEN 'Abril'
-        WHEN 5 THEN 'Mayo'
-        WHEN 6 THEN 'Junio'
-        WHEN 7 THEN 'Julio'
-        WHEN 8 THEN 'Agosto'
-        WHEN 9 THEN 'Septiembre'
-        WHEN 10 THEN 'Octubre'
-        WHEN 11 THEN 'Noviembre'
-        WHEN 12 THEN 'Diciembre'
-    END,
-    TO_CHAR(fecha, 'Mon'),
-    TO_CHAR(fecha, 'YYYY-MM'),
-    EXTRACT(QUARTER FROM fecha)::INTEGER,
-    EXTRACT(YEAR FROM fecha) || '-Q' || EXTRACT(QUARTER FROM fecha),
-    EXTRACT(YEAR FROM fecha)::INTEGER
-FROM generate_series(
-    '2020-01-01'::DATE,
-    '2025-12-31'::DATE,
-    '1 day'::INTERVAL
-) AS fecha;
+SELECT dw.extender_dim_tiempo('2025-12-31');
 
 -- ============================================
 -- DIMENSIÓN: Cliente (dim_cliente)
@@ -138,7 +153,8 @@ CREATE TABLE dw.dim_cliente (
     fecha_registro DATE,
     fecha_ultima_visita DATE,
     
-    -- SCD Type 2
+    -- SCD Type 2 (hash_atributos: md5 de los atributos rastreados por el ETL)
+    hash_atributos CHAR(32),
     fecha_inicio DATE NOT NULL,
     fecha_fin DATE,
     version INTEGER NOT NULL,
@@ -149,7 +165,7 @@ CREATE TABLE dw.dim_cliente (
 );
 
 CREATE INDEX idx_dim_cliente_id ON dw.dim_cliente(id_cliente);
-CREATE INDEX idx_dim_cliente_actual ON dw.dim_cliente(es_actual);
+CREATE UNIQUE INDEX idx_dim_cliente_id_actual ON dw.dim_cliente(id_cliente) WHERE es_actual = TRUE;  -- Una versión actual por id_cliente
 
 -- ============================================
 -- DIMENSIÓN: Mascota (dim_mascota)
@@ -184,7 +200,8 @@ CREATE TABLE dw.dim_mascota (
     -- Relación con cliente
     id_cliente INTEGER,
     
-    -- SCD Type 2
+    -- SCD Type 2 (hash_atributos: md5 de los atributos rastreados por el ETL)
+    hash_atributos CHAR(32),
     fecha_inicio DATE NOT NULL,
     fecha_fin DATE,
     version INTEGER NOT NULL,
@@ -196,7 +213,7 @@ CREATE TABLE dw.dim_mascota (
 
 CREATE INDEX idx_dim_mascota_id ON dw.dim_mascota(id_mascota);
 CREATE INDEX idx_dim_mascota_especie ON dw.dim_mascota(especie);
-CREATE INDEX idx_dim_mascota_actual ON dw.dim_mascota(es_actual);
+CREATE UNIQUE INDEX idx_dim_mascota_id_actual ON dw.dim_mascota(id_mascota) WHERE es_actual = TRUE;  -- Una versión actual por id_mascota
 
 -- ============================================
 -- DIMENSIÓN: Veterinario (dim_veterinario)
@@ -230,7 +247,8 @@ CREATE TABLE dw.dim_veterinario (
     -- Estado
     estado VARCHAR(20),
     
-    -- SCD Type 2
+    -- SCD Type 2 (hash_atributos: md5 de los atributos rastreados por el ETL)
+    hash_atributos CHAR(32),
     fecha_inicio DATE NOT NULL,
     fecha_fin DATE,
     version INTEGER NOT NULL,
@@ -242,7 +260,7 @@ CREATE TABLE dw.dim_veterinario (
 
 CREATE INDEX idx_dim_veterinario_id ON dw.dim_veterinario(id_veterinario);
 CREATE INDEX idx_dim_veterinario_esp ON dw.dim_veterinario(especialidad);
-CREATE INDEX idx_dim_veterinario_actual ON dw.dim_veterinario(es_actual);
+CREATE UNIQUE INDEX idx_dim_veterinario_id_actual ON dw.dim_veterinario(id_veterinario) WHERE es_actual = TRUE;  -- Una versión actual por id_veterinario
 
 -- ============================================
 -- DIMENSIÓN: Sede (dim_sede)
@@ -274,7 +292,8 @@ CREATE TABLE dw.dim_sede (
     estado VARCHAR(20),
     fecha_apertura DATE,
     
-    -- SCD Type 2
+    -- SCD Type 2 (hash_atributos: md5 de los atributos rastreados por el ETL)
+    hash_atributos CHAR(32),
     fecha_inicio DATE NOT NULL,
     fecha_fin DATE,
     version INTEGER NOT NULL,
@@ -286,7 +305,7 @@ CREATE TABLE dw.dim_sede (
 
 CREATE INDEX idx_dim_sede_id ON dw.dim_sede(id_sede);
 CREATE INDEX idx_dim_sede_ciudad ON dw.dim_sede(ciudad);
-CREATE INDEX idx_dim_sede_actual ON dw.dim_sede(es_actual);
+CREATE UNIQUE INDEX idx_dim_sede_id_actual ON dw.dim_sede(id_sede) WHERE es_actual = TRUE;  -- Una versión actual por id_sede
 
 -- ============================================
 -- DIMENSIÓN: Producto (dim_producto)
@@ -322,7 +341,8 @@ CREATE TABLE dw.dim_producto (
     -- Estado
     estado VARCHAR(20),
     
-    -- SCD Type 2
+    -- SCD Type 2 (hash_atributos: md5 de los atributos rastreados por el ETL)
+    hash_atributos CHAR(32),
     fecha_inicio DATE NOT NULL,
     fecha_fin DATE,
     version INTEGER NOT NULL,
@@ -334,7 +354,7 @@ CREATE TABLE dw.dim_producto (
 
 CREATE INDEX idx_dim_producto_id ON dw.dim_producto(id_producto);
 CREATE INDEX idx_dim_producto_cat ON dw.dim_producto(categoria);
-CREATE INDEX idx_dim_producto_actual ON dw.dim_producto(es_actual);
+CREATE UNIQUE INDEX idx_dim_producto_id_actual ON dw.dim_producto(id_producto) WHERE es_actual = TRUE;  -- Una versión actual por id_producto
 
 -- ============================================
 -- DIMENSIÓN: Servicio (dim_servicio)
@@ -364,7 +384,8 @@ CREATE TABLE dw.dim_servicio (
     -- Estado
     estado VARCHAR(20),
     
-    -- SCD Type 2
+    -- SCD Type 2 (hash_atributos: md5 de los atributos rastreados por el ETL)
+    hash_atributos CHAR(32),
     fecha_inicio DATE NOT NULL,
     fecha_fin DATE,
     version INTEGER NOT NULL,
@@ -376,7 +397,27 @@ CREATE TABLE dw.dim_servicio (
 
 CREATE INDEX idx_dim_servicio_id ON dw.dim_servicio(id_servicio);
 CREATE INDEX idx_dim_servicio_cat ON dw.dim_servicio(categoria);
-CREATE INDEX idx_dim_servicio_actual ON dw.dim_servicio(es_actual);
+CREATE UNIQUE INDEX idx_dim_servicio_id_actual ON dw.dim_servicio(id_servicio) WHERE es_actual = TRUE;  -- Una versión actual por id_servicio
+
+-- ============================================
+-- PARTICIONES MENSUALES DE HECHOS
+-- Las tablas de hechos se particionan por rango de fecha (un mes por
+-- partición); el ETL crea las particiones que necesita antes de cargar.
+-- ============================================
+CREATE OR REPLACE FUNCTION dw.asegurar_particion_mensual(p_tabla TEXT, p_fecha DATE)
+RETURNS VOID AS $$
+DECLARE
+    v_inicio DATE := DATE_TRUNC('month', p_fecha)::DATE;
+BEGIN
+    EXECUTE FORMAT(
+        'CREATE TABLE IF NOT EXISTS dw.%I PARTITION OF dw.%I FOR VALUES FROM (%L) TO (%L)',
+        p_tabla || '_' || TO_CHAR(v_inicio, 'YYYY_MM'),
+        p_tabla,
+        v_inicio,
+        (v_inicio + INTERVAL '1 month')::DATE
+    );
+END;
+$$ LANGUAGE plpgsql;
 
 -- ============================================
 -- TABLA DE HECHOS: Citas (fact_citas)
@@ -384,7 +425,10 @@ CREATE INDEX idx_dim_servicio_actual ON dw.dim_servicio(es_actual);
 DROP TABLE IF EXISTS dw.fact_citas CASCADE;
 
 CREATE TABLE dw.fact_citas (
-    sk_cita BIGSERIAL PRIMARY KEY,
+    sk_cita BIGSERIAL,
+    
+    -- Fecha de la cita (clave de partición, misma fecha que sk_tiempo)
+    fecha DATE NOT NULL,
     
     -- Claves foráneas (dimensiones)
     sk_tiempo INTEGER NOT NULL REFERENCES dw.dim_tiempo(sk_tiempo),
@@ -412,9 +456,14 @@ CREATE TABLE dw.fact_citas (
     asistio BOOLEAN,
     
     -- Metadata
-    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (sk_cita, fecha)
+) PARTITION BY RANGE (fecha);
 
+-- Claves degeneradas únicas (con la fecha, que exige el particionado): sostienen
+-- el ON CONFLICT DO NOTHING de las cargas y la búsqueda de sk_cita por id_cita
+CREATE UNIQUE INDEX idx_fact_citas_clave ON dw.fact_citas(id_cita, fecha);
 CREATE INDEX idx_fact_citas_tiempo ON dw.fact_citas(sk_tiempo);
 CREATE INDEX idx_fact_citas_mascota ON dw.fact_citas(sk_mascota);
 CREATE INDEX idx_fact_citas_veterinario ON dw.fact_citas(sk_veterinario);
@@ -427,7 +476,10 @@ CREATE INDEX idx_fact_citas_estado ON dw.fact_citas(estado);
 DROP TABLE IF EXISTS dw.fact_ventas CASCADE;
 
 CREATE TABLE dw.fact_ventas (
-    sk_venta BIGSERIAL PRIMARY KEY,
+    sk_venta BIGSERIAL,
+    
+    -- Fecha de la venta (clave de partición, misma fecha que sk_tiempo)
+    fecha DATE NOT NULL,
     
     -- Claves foráneas (dimensiones)
     sk_tiempo INTEGER NOT NULL REFERENCES dw.dim_tiempo(sk_tiempo),
@@ -458,9 +510,12 @@ CREATE TABLE dw.fact_ventas (
     margen_total DECIMAL(10,2),
     
     -- Metadata
-    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (sk_venta, fecha)
+) PARTITION BY RANGE (fecha);
 
+CREATE UNIQUE INDEX idx_fact_ventas_clave ON dw.fact_ventas(id_venta, tipo_venta, numero_linea, fecha);
 CREATE INDEX idx_fact_ventas_tiempo ON dw.fact_ventas(sk_tiempo);
 CREATE INDEX idx_fact_ventas_cliente ON dw.fact_ventas(sk_cliente);
 CREATE INDEX idx_fact_ventas_sede ON dw.fact_ventas(sk_sede);
@@ -473,13 +528,16 @@ CREATE INDEX idx_fact_ventas_tipo ON dw.fact_ventas(tipo_venta);
 DROP TABLE IF EXISTS dw.fact_tratamientos CASCADE;
 
 CREATE TABLE dw.fact_tratamientos (
-    sk_tratamiento BIGSERIAL PRIMARY KEY,
+    sk_tratamiento BIGSERIAL,
+    
+    -- Fecha de inicio del tratamiento (clave de partición)
+    fecha DATE NOT NULL,
     
     -- Claves foráneas
     sk_tiempo INTEGER NOT NULL REFERENCES dw.dim_tiempo(sk_tiempo),
     sk_mascota INTEGER REFERENCES dw.dim_mascota(sk_mascota),
     sk_veterinario INTEGER REFERENCES dw.dim_veterinario(sk_veterinario),
-    sk_cita BIGINT REFERENCES dw.fact_citas(sk_cita),
+    sk_cita BIGINT,  -- Referencia a fact_citas (sin FK: la PK particionada incluye la fecha)
     
     -- Claves degeneradas
     id_tratamiento INTEGER NOT NULL,
@@ -499,13 +557,198 @@ CREATE TABLE dw.fact_tratamientos (
     requiere_seguimiento BOOLEAN,
     
     -- Metadata
-    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (sk_tratamiento, fecha)
+) PARTITION BY RANGE (fecha);
 
+CREATE UNIQUE INDEX idx_fact_trat_clave ON dw.fact_tratamientos(id_tratamiento, fecha);
 CREATE INDEX idx_fact_trat_tiempo ON dw.fact_tratamientos(sk_tiempo);
 CREATE INDEX idx_fact_trat_mascota ON dw.fact_tratamientos(sk_mascota);
 CREATE INDEX idx_fact_trat_vet ON dw.fact_tratamientos(sk_veterinario);
 
+-- Particiones iniciales: el rango de dw.dim_tiempo
+DO $$
+BEGIN
+    PERFORM dw.asegurar_particion_mensual(tabla, mes::DATE)
+    FROM UNNEST(ARRAY['fact_citas', 'fact_ventas', 'fact_tratamientos']) AS tabla
+    CROSS JOIN generate_series('2020-01-01'::DATE, '2025-12-01'::DATE, '1 month'::INTERVAL) AS mes;
+END $$;
+
+-- ============================================
+-- AGREGADOS PARA TABLEAU
+-- Tablas resumen de las vistas v_tableau_* (3-Analytics/tableau_views.sql).
+-- Guardan claves sustitutas: las vistas unen las versiones actuales de las
+-- dimensiones al consultar. El ETL recalcula al final de cada corrida solo los
+-- meses cargados y las mascotas y clientes con hechos en esos meses.
+-- ============================================
+DROP TABLE IF EXISTS dw.agg_ventas_sede_mes CASCADE;
+
+CREATE TABLE dw.agg_ventas_sede_mes (
+    fecha_mes DATE NOT NULL,                -- Primer día del mes
+    sk_sede INTEGER NOT NULL,
+    num_ventas INTEGER NOT NULL,            -- id_venta distintos
+    unidades_vendidas BIGINT,
+    ingresos_ventas DECIMAL(14,2),
+    margen_ventas DECIMAL(14,2),
+    clientes_unicos INTEGER NOT NULL,
+    PRIMARY KEY (fecha_mes, sk_sede)
+);
+
+DROP TABLE IF EXISTS dw.agg_productos_mes CASCADE;
+
+CREATE TABLE dw.agg_productos_mes (
+    fecha_mes DATE NOT NULL,
+    sk_producto INTEGER NOT NULL,
+    veces_vendido INTEGER NOT NULL,
+    unidades BIGINT,
+    ingresos DECIMAL(14,2),
+    margen DECIMAL(14,2),
+    suma_precio_unitario DECIMAL(14,2),     -- Sumas y conteos no nulos: promedios exactos
+    lineas_con_precio INTEGER NOT NULL,
+    suma_margen_unitario DECIMAL(14,2),
+    lineas_con_margen INTEGER NOT NULL,
+    ultima_venta DATE,
+    PRIMARY KEY (fecha_mes, sk_producto)
+);
+
+DROP TABLE IF EXISTS dw.agg_citas_veterinario_mes CASCADE;
+
+CREATE TABLE dw.agg_citas_veterinario_mes (
+    fecha_mes DATE NOT NULL,
+    sk_veterinario INTEGER NOT NULL,
+    sk_sede INTEGER NOT NULL,
+    total_citas INTEGER NOT NULL,
+    citas_completadas INTEGER NOT NULL,
+    citas_no_asistidas INTEGER NOT NULL,
+    minutos_totales BIGINT,
+    citas_con_duracion INTEGER NOT NULL,
+    ingresos_citas DECIMAL(14,2),
+    citas_con_costo INTEGER NOT NULL,
+    consultas_emergencia INTEGER NOT NULL,
+    consultas_control INTEGER NOT NULL,
+    primeras_consultas INTEGER NOT NULL,
+    primera_cita DATE,
+    ultima_cita DATE,
+    PRIMARY KEY (fecha_mes, sk_veterinario, sk_sede)
+);
+
+-- Pares veterinario-mascota (mascotas únicas por veterinario y sede, no sumables por mes)
+DROP TABLE IF EXISTS dw.agg_mascotas_veterinario CASCADE;
+
+CREATE TABLE dw.agg_mascotas_veterinario (
+    sk_veterinario INTEGER NOT NULL,
+    sk_sede INTEGER NOT NULL,
+    sk_mascota INTEGER NOT NULL,
+    PRIMARY KEY (sk_veterinario, sk_sede, sk_mascota)
+);
+
+CREATE INDEX idx_agg_mascotas_veterinario_mascota ON dw.agg_mascotas_veterinario(sk_mascota);
+
+-- Historial de citas por mascota
+DROP TABLE IF EXISTS dw.agg_citas_mascota CASCADE;
+
+CREATE TABLE dw.agg_citas_mascota (
+    sk_mascota INTEGER PRIMARY KEY,
+    total_citas INTEGER NOT NULL,
+    gasto_total DECIMAL(14,2),
+    citas_con_costo INTEGER NOT NULL,
+    primera_visita DATE,
+    ultima_visita DATE
+);
+
+-- Estado RFM por cliente (v_tableau_rfm_clientes)
+DROP TABLE IF EXISTS dw.rfm_clientes CASCADE;
+
+CREATE TABLE dw.rfm_clientes (
+    sk_cliente INTEGER PRIMARY KEY,
+    num_compras INTEGER NOT NULL,           -- id_venta distintos (frecuencia)
+    gasto_total DECIMAL(14,2),              -- Monto
+    ultima_compra DATE NOT NULL             -- Recencia = CURRENT_DATE - ultima_compra
+);
+
+-- Cortes de quintil del RFM (una fila, recalculada en cada corrida del ETL)
+DROP TABLE IF EXISTS dw.rfm_cortes CASCADE;
+
+CREATE TABLE dw.rfm_cortes (
+    clientes INTEGER NOT NULL,
+    cortes_ultima_compra DATE[],            -- Percentiles 20/40/60/80 en orden descendente
+    cortes_num_compras INTEGER[],
+    cortes_gasto_total DECIMAL(14,2)[],
+    fecha_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Quintil (1-5) de un valor: 1 + cortes que quedan por encima (cortes descendentes).
+-- Una sola expresión para que el planificador la expanda en línea
+CREATE OR REPLACE FUNCTION dw.quintil_rfm(valor ANYELEMENT, cortes ANYARRAY)
+RETURNS INTEGER LANGUAGE SQL IMMUTABLE AS $$
+    SELECT 1 + COALESCE((valor < cortes[1])::INTEGER, 0) + COALESCE((valor < cortes[2])::INTEGER, 0)
+             + COALESCE((valor < cortes[3])::INTEGER, 0) + COALESCE((valor < cortes[4])::INTEGER, 0)
+$$;
+
+-- ============================================
+-- TABLA DE CONTROL: Cargas incrementales (etl_control)
+-- Marca de agua por proceso: último ID de origen ya cargado
+-- ============================================
+DROP TABLE IF EXISTS dw.etl_control CASCADE;
+
+CREATE TABLE dw.etl_control (
+    proceso VARCHAR(50) PRIMARY KEY,        -- fact_citas, fact_ventas_productos, fact_ventas_servicios
+    tabla_origen VARCHAR(50) NOT NULL,
+    ultimo_id BIGINT NOT NULL DEFAULT 0,    -- Marca de agua (ID máximo extraído)
+    id_en_curso BIGINT,                     -- Fin del rango de una corrida sin terminar
+    filas_ultima_carga INTEGER,
+    fecha_ultima_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Lotes mensuales ya confirmados de la corrida en curso (para retomarla tras un fallo)
+DROP TABLE IF EXISTS dw.etl_control_lotes CASCADE;
+
+CREATE TABLE dw.etl_control_lotes (
+    proceso VARCHAR(50) NOT NULL,
+    mes_anio VARCHAR(7) NOT NULL,           -- 'YYYY-MM' (dw.dim_tiempo)
+    filas INTEGER NOT NULL,
+    fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (proceso, mes_anio)
+);
+
+-- Filas de origen que su corrida no pudo cargar (mes fuera de dw.dim_tiempo o
+-- sin versión actual en una dimensión): cada corrida las vuelve a intentar
+DROP TABLE IF EXISTS dw.etl_pendientes CASCADE;
+
+CREATE TABLE dw.etl_pendientes (
+    proceso VARCHAR(50) NOT NULL,
+    id_origen BIGINT NOT NULL,
+    fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (proceso, id_origen)
+);
+
+-- ============================================
+-- TABLA DE CONTROL: Historial de corridas (etl_run_log)
+-- Un registro por paso medido de cada corrida del ETL
+-- ============================================
+DROP TABLE IF EXISTS dw.etl_run_log CASCADE;
+DROP SEQUENCE IF EXISTS dw.etl_corrida_seq;
+
+CREATE SEQUENCE dw.etl_corrida_seq;
+
+CREATE TABLE dw.etl_run_log (
+    id_registro BIGSERIAL PRIMARY KEY,
+    id_corrida BIGINT NOT NULL,             -- dw.etl_corrida_seq, uno por corrida
+    paso VARCHAR(100) NOT NULL,             -- dim_cliente cerrar, fact_citas 2024-03, corrida, ...
+    tabla VARCHAR(60),
+    operacion VARCHAR(10) NOT NULL,         -- INSERT, UPDATE, DELETE, COPY, ANALYZE, EXPORT, TOTAL, FASE
+    estado VARCHAR(10) NOT NULL,            -- ok, error
+    inicio TIMESTAMP NOT NULL,
+    duracion_segundos NUMERIC(12,3) NOT NULL,
+    filas BIGINT,
+    filas_por_segundo NUMERIC(14,1),
+    plan JSONB,                             -- EXPLAIN (ANALYZE, BUFFERS) con --explain
+    error TEXT
+);
+
+CREATE INDEX idx_etl_run_log_corrida ON dw.etl_run_log(id_corrida);
+
 -- ============================================
 -- VISTAS ANALÍTICAS
 -- ============================================
@@ -574,6 +817,17 @@ COMMENT ON TABLE dw.dim_tiempo IS 'Dimensión temporal con jerarquías completas
 COMMENT ON TABLE dw.fact_citas IS 'Hechos de citas veterinarias';
 COMMENT ON TABLE dw.fact_ventas IS 'Hechos de ventas (productos y servicios)';
 COMMENT ON TABLE dw.fact_tratamientos IS 'Hechos de tratamientos médicos';
+COMMENT ON TABLE dw.agg_ventas_sede_mes IS 'Ventas por mes y sede (v_tableau_ingresos_mensuales)';
+COMMENT ON TABLE dw.agg_productos_mes IS 'Ventas de productos por mes (v_tableau_top_productos)';
+COMMENT ON TABLE dw.agg_citas_veterinario_mes IS 'Citas por mes, veterinario y sede (v_tableau_productividad_veterinarios, v_tableau_ingresos_mensuales)';
+COMMENT ON TABLE dw.agg_mascotas_veterinario IS 'Mascotas atendidas por veterinario y sede (v_tableau_productividad_veterinarios)';
+COMMENT ON TABLE dw.agg_citas_mascota IS 'Historial de citas por mascota (v_tableau_mascotas_activas)';
+COMMENT ON TABLE dw.rfm_clientes IS 'Recencia, frecuencia y monto por cliente (v_tableau_rfm_clientes)';
+COMMENT ON TABLE dw.rfm_cortes IS 'Cortes de quintil del RFM sobre los clientes actuales';
+COMMENT ON TABLE dw.etl_control IS 'Marcas de agua de la carga incremental de hechos';
+COMMENT ON TABLE dw.etl_control_lotes IS 'Lotes mensuales confirmados de la corrida incremental en curso';
+COMMENT ON TABLE dw.etl_pendientes IS 'Filas de origen no cargadas que se reintentan en cada corrida';
+COMMENT ON TABLE dw.etl_run_log IS 'Pasos medidos de cada corrida del ETL (tiempo, filas, planes)';
 
 
 
@@ -444,7 +444,8 @@ CREATE INDEX idx_mascota_estado ON Mascota(Estado);
 
 CREATE INDEX idx_cita_fecha ON Cita(Fecha);
 CREATE INDEX idx_cita_estado ON Cita(Estado);
-CREATE INDEX idx_cita_mascota ON Cita(ID_Mascota);
+-- (ID_Mascota, Fecha): primera visita por mascota en el ETL (es_primera_cita)
+CREATE INDEX idx_cita_mascota ON Cita(ID_Mascota, Fecha);
 CREATE INDEX idx_cita_veterinario ON Cita(ID_Veterinario);
 CREATE INDEX idx_cita_sede ON Cita(ID_Sede);
 
@@ -463,6 +464,10 @@ CREATE INDEX idx_stock_producto ON Stock_Producto(ID_Producto);
 
 CREATE INDEX idx_historial_mascota ON Historial_Medico(ID_Mascota);
 CREATE INDEX idx_historial_fecha ON Historial_Medico(Fecha);
+CREATE INDEX idx_historial_cita ON Historial_Medico(ID_Cita);
+
+CREATE INDEX idx_tratamiento_cita ON Tratamiento(ID_Cita);
+CREATE INDEX idx_tratamiento_fecha ON Tratamiento(Fecha_Inicio);
 
 -- ============================================
 -- VISTAS ÚTILES
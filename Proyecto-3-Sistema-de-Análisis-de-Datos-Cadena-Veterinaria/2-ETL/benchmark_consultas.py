@@ -0,0 +1,374 @@
+"""
+============================================
+BENCHMARK DE CONSULTAS ANALÍTICAS - VETERINARIA
+============================================
+Ejecuta cada consulta nombrada de 3-Analytics/analytics.sql y cada vista
+v_tableau_* de 3-Analytics/tableau_views.sql sobre un Data Warehouse generado
+con data_generator.py + etl_process.py en uno o varios factores de escala, y
+guarda por consulta: filas, latencias (mín, p50, p95, p99, máx), tiempos y
+buffers del plan EXPLAIN (ANALYZE, BUFFERS), en un reporte JSON y otro CSV.
+
+Uso:
+    python benchmark_consultas.py --scales 0.1 1 --repeticiones 10 --servidor-temporal
+    python benchmark_consultas.py --scales 1 --comparar resultados_benchmark/consultas_sf1_....json
+
+Cada escala parte de una base dedicada (db_veterinaria_benchmark) recién
+creada con los scripts de 1-Database y 3-Analytics; el generador usa una
+semilla fija, así que dos corridas a la misma escala cargan los mismos datos
+y sus reportes se pueden comparar tras cambiar el esquema o los índices.
+Con --servidor-temporal se inicia un PostgreSQL local propio (initdb +
+pg_ctl en un directorio temporal) que se detiene y borra al terminar.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import psycopg2
+
+import data_generator
+import etl_process
+from benchmark_generador import guardar_reporte
+
+DIRECTORIO_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scripts que crean la base, en orden
+SCRIPTS_ESQUEMA = [
+    '1-Database/schema_oltp.sql',
+    '1-Database/initial_data.sql',
+    '1-Database/schema_datawarehouse.sql',
+    '3-Analytics/tableau_views.sql'
+]
+ARCHIVO_CONSULTAS = '3-Analytics/analytics.sql'
+ARCHIVO_VISTAS = '3-Analytics/tableau_views.sql'
+
+BASE_BENCHMARK = 'db_veterinaria_benchmark'
+
+# Parámetros del servidor que se guardan en el reporte (afectan los planes)
+PARAMETROS_SERVIDOR = [
+    'server_version', 'shared_buffers', 'work_mem', 'effective_cache_size',
+    'random_page_cost', 'max_parallel_workers_per_gather', 'jit'
+]
+
+COLUMNAS_REPORTE = [
+    'scale', 'origen', 'consulta', 'filas', 'repeticiones', 'min_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+    'max_ms', 'media_ms', 'plan_ejecucion_ms', 'plan_planificacion_ms', 'bloques_hit', 'bloques_leidos', 'error'
+]
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def leer_script(ruta_relativa):
+    """Lee un script SQL del proyecto (sin retornos de carro)"""
+    with open(os.path.join(DIRECTORIO_PROYECTO, ruta_relativa), encoding='utf-8') as archivo:
+        return archivo.read().replace('\r\n', '\n')
+
+def consultas_analytics():
+    """Consultas de analytics.sql nombradas por el comentario que las precede
+    
+    Cada sentencia termina en ';' al final de una línea; los comentarios de
+    sección (líneas '====' y títulos numerados) no cuentan como nombre.
+    """
+    consultas = []
+    nombre = None
+    lineas = []
+    for linea in leer_script(ARCHIVO_CONSULTAS).split('\n'):
+        limpia = linea.strip()
+        if not lineas:
+            if limpia.startswith('--'):
+                titulo = limpia.lstrip('-').strip()
+                if titulo and not titulo.startswith('=') and not re.match(r'^\d+\.', titulo):
+                    nombre = titulo
+                continue
+            if not limpia:
+                continue
+        lineas.append(linea)
+        if limpia.endswith(';'):
+            sql = '\n'.join(lineas).strip().rstrip(';')
+            if re.match(r'^(SELECT|WITH)\b', sql, re.IGNORECASE):
+                consultas.append({
+                    'origen': 'analytics.sql', 'consulta': nombre or f"consulta {len(consultas) + 1}", 'sql': sql
+                })
+            nombre = None
+            lineas = []
+    return consultas
+
+def consultas_vistas():
+    """Un SELECT * por cada vista v_tableau_* de tableau_views.sql"""
+    vistas = re.findall(r'CREATE OR REPLACE VIEW (dw\.v_tableau_\w+)', leer_script(ARCHIVO_VISTAS))
+    return [
+        {'origen': 'tableau_views.sql', 'consulta': vista, 'sql': f"SELECT * FROM {vista}"}
+        for vista in vistas
+    ]
+
+# ============================================
+# SERVIDOR Y BASE DE DATOS
+# ============================================
+
+def ruta_binario(directorio_bin, nombre):
+    """Ruta de un binario de PostgreSQL (del PATH si no se indica directorio)"""
+    return os.path.join(directorio_bin, nombre) if directorio_bin else nombre
+
+def iniciar_servidor_temporal(directorio_bin):
+    """Inicia un PostgreSQL propio en un directorio temporal (socket Unix, sin TCP)"""
+    directorio = tempfile.mkdtemp(prefix='pg_benchmark_')
+    datos = os.path.join(directorio, 'datos')
+    
+    print(f" Iniciando PostgreSQL temporal en {directorio}...")
+    try:
+        subprocess.run([ruta_binario(directorio_bin, 'initdb'), '-D', datos, '-U', 'postgres', '--auth=trust', '-E', 'UTF8'],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([ruta_binario(directorio_bin, 'pg_ctl'), '-D', datos, '-l', os.path.join(directorio, 'postgres.log'),
+                        '-w', '-o', f"-k {directorio} -c listen_addresses=''", 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        shutil.rmtree(directorio, ignore_errors=True)
+        raise
+    
+    servidor = {'directorio': directorio, 'pg_ctl': ruta_binario(directorio_bin, 'pg_ctl'), 'datos': datos}
+    configuracion = {'host': directorio, 'user': 'postgres', 'port': 5432}
+    return servidor, configuracion
+
+def detener_servidor_temporal(servidor):
+    """Detiene el PostgreSQL temporal y borra su directorio"""
+    subprocess.run([servidor['pg_ctl'], '-D', servidor['datos'], '-m', 'fast', '-w', 'stop'],
+                   check=False, stdout=subprocess.DEVNULL)
+    shutil.rmtree(servidor['directorio'], ignore_errors=True)
+
+def conectar(configuracion, base):
+    """Conexión en autocommit a la base indicada"""
+    conn = psycopg2.connect(**{**configuracion, 'database': base})
+    conn.autocommit = True
+    return conn
+
+def crear_base(configuracion, base):
+    """(Re)crea la base del benchmark y ejecuta los scripts de esquema"""
+    conn = conectar(configuracion, 'postgres')
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS "{base}";')
+        cursor.execute(f'CREATE DATABASE "{base}";')
+    conn.close()
+    
+    conn = conectar(configuracion, base)
+    with conn.cursor() as cursor:
+        for script in SCRIPTS_ESQUEMA:
+            cursor.execute(leer_script(script))
+    conn.close()
+
+def preparar_escala(args, configuracion, scale):
+    """Crea la base, genera los datos a la escala dada y ejecuta el ETL completo"""
+    print(f"\n=== PREPARANDO SF{scale:g} ===")
+    crear_base(configuracion, args.base)
+    
+    destino = {**configuracion, 'database': args.base}
+    data_generator.DB_CONFIG = destino
+    etl_process.DB_CONFIG = destino
+    
+    inicio = time.perf_counter()
+    data_generator.main(['--scale', str(scale), '--workers', str(args.workers_generador)])
+    duracion_generador = time.perf_counter() - inicio
+    
+    inicio = time.perf_counter()
+    etl_process.ejecutar_etl(workers=args.workers_etl)
+    duracion_etl = time.perf_counter() - inicio
+    
+    # Mapa de visibilidad y estadísticas al día: planes estables entre corridas
+    conn = conectar(configuracion, args.base)
+    with conn.cursor() as cursor:
+        cursor.execute("VACUUM ANALYZE;")
+    conn.close()
+    return {'duracion_generador': round(duracion_generador, 3), 'duracion_etl': round(duracion_etl, 3)}
+
+def describir_base(cursor):
+    """Parámetros del servidor y filas de los hechos (para el reporte)"""
+    cursor.execute("SELECT name, setting, unit FROM pg_settings WHERE name = ANY(%s);", (PARAMETROS_SERVIDOR,))
+    parametros = {nombre: f"{valor}{unidad or ''}" for nombre, valor, unidad in cursor.fetchall()}
+    
+    filas = {}
+    for tabla in ('fact_citas', 'fact_ventas', 'fact_tratamientos'):
+        cursor.execute(f"SELECT COUNT(*) FROM dw.{tabla};")
+        filas[tabla] = cursor.fetchone()[0]
+    return parametros, filas
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (p en 0-100) de una lista no vacía"""
+    ordenados = sorted(valores)
+    posicion = max(1, -(-len(ordenados) * p // 100))
+    return ordenados[int(posicion) - 1]
+
+def resumen_plan(plan):
+    """Tiempos y buffers compartidos del nodo raíz de un EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)"""
+    raiz = plan['Plan']
+    return {
+        'plan_ejecucion_ms': round(plan.get('Execution Time', 0), 3),
+        'plan_planificacion_ms': round(plan.get('Planning Time', 0), 3),
+        'bloques_hit': raiz.get('Shared Hit Blocks'),
+        'bloques_leidos': raiz.get('Shared Read Blocks')
+    }
+
+def medir_consulta(cursor, consulta, repeticiones, calentamiento):
+    """Ejecuta la consulta (calentamiento + repeticiones medidas) y luego su EXPLAIN ANALYZE"""
+    fila = {'origen': consulta['origen'], 'consulta': consulta['consulta'], 'filas': None,
+            'repeticiones': 0, 'error': None}
+    try:
+        latencias = []
+        for numero in range(calentamiento + repeticiones):
+            inicio = time.perf_counter()
+            cursor.execute(consulta['sql'])
+            filas = cursor.fetchall()
+            duracion = (time.perf_counter() - inicio) * 1000
+            if numero >= calentamiento:
+                latencias.append(duracion)
+        
+        fila['filas'] = len(filas)
+        fila['repeticiones'] = len(latencias)
+        fila.update({
+            'min_ms': round(min(latencias), 3),
+            'p50_ms': round(percentil(latencias, 50), 3),
+            'p95_ms': round(percentil(latencias, 95), 3),
+            'p99_ms': round(percentil(latencias, 99), 3),
+            'max_ms': round(max(latencias), 3),
+            'media_ms': round(sum(latencias) / len(latencias), 3)
+        })
+        
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {consulta['sql']}")
+        plan = cursor.fetchone()[0][0]
+        fila.update(resumen_plan(plan))
+        fila['plan'] = plan
+    except psycopg2.Error as e:
+        # Timeout u otro error: se registra y el benchmark sigue con la siguiente consulta
+        fila['error'] = str(e).strip()
+    return fila
+
+def medir_escala(args, configuracion, scale, consultas):
+    """Mide todas las consultas sobre la base ya preparada"""
+    conn = conectar(configuracion, args.base)
+    cursor = conn.cursor()
+    cursor.execute("SET statement_timeout = %s;", (int(args.timeout * 1000),))
+    parametros, filas_hechos = describir_base(cursor)
+    
+    print(f"\n=== MIDIENDO SF{scale:g}: {len(consultas)} consultas x {args.repeticiones} repeticiones ===")
+    filas = []
+    for consulta in consultas:
+        fila = {'scale': scale, **medir_consulta(cursor, consulta, args.repeticiones, args.calentamiento)}
+        if fila['error']:
+            print(f"  {fila['consulta']}: ERROR {fila['error']}")
+        else:
+            print(f"  {fila['consulta']}: p50 {fila['p50_ms']:.1f} ms | p95 {fila['p95_ms']:.1f} ms | "
+                  f"{fila['filas']:,} filas")
+        filas.append(fila)
+    
+    cursor.close()
+    conn.close()
+    return parametros, filas_hechos, filas
+
+# ============================================
+# REPORTE
+# ============================================
+
+def comparar_reportes(ruta_anterior, filas):
+    """Imprime el p50 de cada consulta frente al de un reporte anterior (misma escala y nombre)"""
+    with open(ruta_anterior, encoding='utf-8') as archivo:
+        anteriores = {
+            (fila['scale'], fila['consulta']): fila for fila in json.load(archivo)['consultas']
+        }
+    
+    print(f"\n COMPARACIÓN CON {ruta_anterior} (p50 anterior -> actual):")
+    for fila in filas:
+        anterior = anteriores.get((fila['scale'], fila['consulta']))
+        if not anterior or anterior.get('error') or fila['error']:
+            continue
+        cambio = fila['p50_ms'] / anterior['p50_ms'] if anterior['p50_ms'] else float('inf')
+        print(f"  SF{fila['scale']:g} {fila['consulta']}: {anterior['p50_ms']:.1f} -> {fila['p50_ms']:.1f} ms "
+              f"(x{cambio:.2f})")
+
+def parsear_argumentos():
+    """Lee las opciones de línea de comandos"""
+    parser = argparse.ArgumentParser(description='Benchmark de consultas analíticas - Veterinaria')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1], metavar='SF',
+                        help='Factores de escala del generador (1, 10, ...)')
+    parser.add_argument('--repeticiones', type=int, default=10,
+                        help='Ejecuciones medidas por consulta')
+    parser.add_argument('--calentamiento', type=int, default=1,
+                        help='Ejecuciones previas sin medir (caché caliente)')
+    parser.add_argument('--timeout', type=float, default=300,
+                        help='statement_timeout por consulta, en segundos')
+    parser.add_argument('--consultas', metavar='TEXTO',
+                        help='Mide solo las consultas cuyo nombre contiene este texto')
+    parser.add_argument('--workers-generador', type=int, default=0,
+                        help='Procesos en paralelo del generador (0 = secuencial)')
+    parser.add_argument('--workers-etl', type=int, default=etl_process.ETL_WORKERS,
+                        help='Conexiones en paralelo del ETL')
+    parser.add_argument('--base', default=BASE_BENCHMARK,
+                        help='Base de datos del benchmark (se borra y recrea en cada escala)')
+    parser.add_argument('--sin-preparar', action='store_true',
+                        help='Mide la base tal como está, sin recrearla ni generar datos (una escala)')
+    parser.add_argument('--servidor-temporal', action='store_true',
+                        help='Inicia un PostgreSQL propio (initdb + pg_ctl) y lo borra al terminar')
+    parser.add_argument('--pg-bin', metavar='DIR',
+                        help='Directorio de initdb y pg_ctl (por defecto, los del PATH)')
+    parser.add_argument('--comparar', metavar='REPORTE_JSON',
+                        help='Reporte anterior con el que comparar el p50 de cada consulta')
+    parser.add_argument('--salida', default='resultados_benchmark',
+                        help='Directorio de los reportes JSON/CSV')
+    return parser.parse_args()
+
+def main():
+    args = parsear_argumentos()
+    
+    consultas = consultas_analytics() + consultas_vistas()
+    if args.consultas:
+        consultas = [c for c in consultas if args.consultas.lower() in c['consulta'].lower()]
+    
+    servidor = None
+    if args.servidor_temporal:
+        servidor, configuracion = iniciar_servidor_temporal(args.pg_bin)
+    else:
+        configuracion = {clave: valor for clave, valor in etl_process.DB_CONFIG.items() if clave != 'database'}
+    
+    escalas = []
+    filas = []
+    try:
+        for scale in args.scales:
+            preparacion = {} if args.sin_preparar else preparar_escala(args, configuracion, scale)
+            parametros, filas_hechos, filas_escala = medir_escala(args, configuracion, scale, consultas)
+            escalas.append({'scale': scale, 'filas_hechos': filas_hechos, **preparacion})
+            filas.extend(filas_escala)
+    finally:
+        if servidor:
+            detener_servidor_temporal(servidor)
+    
+    resumen = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'semilla': data_generator.SEMILLA,
+        'repeticiones': args.repeticiones,
+        'calentamiento': args.calentamiento,
+        'servidor_temporal': args.servidor_temporal,
+        'servidor': parametros,
+        'python': platform.python_version(),
+        'cpu': os.cpu_count(),
+        'escalas': escalas
+    }
+    
+    nombre = f"consultas_sf{'_'.join(f'{s:g}' for s in args.scales)}_{datetime.now():%Y%m%d_%H%M%S}"
+    ruta_json, ruta_csv = guardar_reporte(args.salida, nombre, resumen, 'consultas', filas, COLUMNAS_REPORTE)
+    
+    if args.comparar:
+        comparar_reportes(args.comparar, filas)
+    print(f"\n Reporte: {ruta_json}")
+    print(f" Reporte: {ruta_csv}")
+
+if __name__ == "__main__":
+    main()
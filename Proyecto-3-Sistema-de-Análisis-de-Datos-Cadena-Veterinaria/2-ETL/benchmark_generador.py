@@ -0,0 +1,150 @@
+"""
+============================================
+BENCHMARK DEL GENERADOR Y DEL ETL - VETERINARIA
+============================================
+Ejecuta data_generator.py con un factor de escala (SF1, SF10, SF100, ...) y
+guarda por tabla: filas, tiempo de generación, tiempo de carga, filas/s y
+pico de memoria residente, en un reporte JSON y otro CSV.
+
+Uso:
+    python benchmark_generador.py --scale 10 --workers 4 --etl
+
+Parte de una base recién creada (schema_oltp.sql + initial_data.sql +
+schema_datawarehouse.sql) para que los resultados sean comparables.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+import data_generator
+
+COLUMNAS_REPORTE = [
+    'tabla', 'filas', 'tiempo_generacion', 'tiempo_carga', 'filas_por_segundo', 'rss_pico_mb'
+]
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+def argumentos_generador(args):
+    """Traduce las opciones del benchmark a la línea de comandos del generador"""
+    argv = ['--scale', str(args.scale), '--workers', str(args.workers)]
+    if args.vectorizado:
+        argv.append('--vectorizado')
+    if args.pool_faker:
+        argv.append('--pool-faker')
+    if args.streaming:
+        argv.append('--streaming')
+    return argv
+
+def medir_generador(args):
+    """Ejecuta el generador y devuelve (filas por tabla, duración total)"""
+    data_generator.METRICAS.clear()
+    inicio = time.perf_counter()
+    data_generator.main(argumentos_generador(args))
+    duracion = time.perf_counter() - inicio
+    
+    filas = []
+    for tabla, metrica in data_generator.METRICAS.items():
+        tiempo_total = metrica['tiempo_generacion'] + metrica['tiempo_carga']
+        filas.append({
+            'tabla': tabla,
+            'filas': metrica['filas'],
+            'tiempo_generacion': round(metrica['tiempo_generacion'], 3),
+            'tiempo_carga': round(metrica['tiempo_carga'], 3),
+            'filas_por_segundo': round(metrica['filas'] / tiempo_total) if tiempo_total > 0 else None,
+            'rss_pico_mb': metrica['rss_pico_mb']
+        })
+    return filas, duracion
+
+def medir_etl():
+    """Ejecuta el ETL completo sobre los datos recién generados y devuelve su duración"""
+    import etl_process
+    
+    inicio = time.perf_counter()
+    etl_process.ejecutar_etl()
+    return time.perf_counter() - inicio
+
+# ============================================
+# REPORTE
+# ============================================
+
+def guardar_reporte(directorio, nombre, resumen, clave, filas, columnas):
+    """Escribe el reporte como JSON ({'resumen': ..., clave: filas}) y CSV (una fila por elemento)
+    
+    El CSV lleva solo las columnas dadas; el resto de cada fila (planes,
+    detalles) queda solo en el JSON. benchmark_consultas.py lo reutiliza.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta_json = os.path.join(directorio, f"{nombre}.json")
+    ruta_csv = os.path.join(directorio, f"{nombre}.csv")
+    
+    with open(ruta_json, 'w', encoding='utf-8') as archivo:
+        json.dump({'resumen': resumen, clave: filas}, archivo, ensure_ascii=False, indent=2)
+    
+    with open(ruta_csv, 'w', encoding='utf-8', newline='') as archivo:
+        escritor = csv.DictWriter(archivo, fieldnames=columnas, extrasaction='ignore')
+        escritor.writeheader()
+        escritor.writerows(filas)
+    
+    return ruta_json, ruta_csv
+
+def parsear_argumentos():
+    """Lee las opciones de línea de comandos"""
+    parser = argparse.ArgumentParser(description='Benchmark del generador de datos - Veterinaria')
+    parser.add_argument('--scale', type=float, default=1, metavar='SF',
+                        help='Factor de escala (1, 10, 100, ...)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Procesos en paralelo del generador (0 = secuencial)')
+    parser.add_argument('--vectorizado', action='store_true', help='Backend NumPy del generador')
+    parser.add_argument('--pool-faker', action='store_true', help='Pools Faker pre-generados')
+    parser.add_argument('--streaming', action='store_true', help='COMMIT por lote')
+    parser.add_argument('--etl', action='store_true',
+                        help='Mide también el ETL completo después de generar')
+    parser.add_argument('--salida', default='resultados_benchmark',
+                        help='Directorio de los reportes JSON/CSV')
+    return parser.parse_args()
+
+def main():
+    args = parsear_argumentos()
+    
+    filas, duracion_generador = medir_generador(args)
+    duracion_etl = medir_etl() if args.etl else None
+    
+    resumen = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'scale': args.scale,
+        'semilla': data_generator.SEMILLA,
+        'workers': args.workers,
+        'vectorizado': args.vectorizado,
+        'pool_faker': args.pool_faker,
+        'streaming': args.streaming,
+        'python': platform.python_version(),
+        'cpu': os.cpu_count(),
+        'duracion_generador': round(duracion_generador, 3),
+        'duracion_etl': round(duracion_etl, 3) if duracion_etl is not None else None,
+        'rss_pico_mb': data_generator.rss_pico_mb(),
+        'filas_totales': sum(fila['filas'] for fila in filas)
+    }
+    
+    nombre = f"generador_sf{args.scale:g}_{datetime.now():%Y%m%d_%H%M%S}"
+    ruta_json, ruta_csv = guardar_reporte(args.salida, nombre, resumen, 'tablas', filas, COLUMNAS_REPORTE)
+    
+    print("\n RESULTADOS DEL BENCHMARK:")
+    for fila in filas:
+        print(f"  {fila['tabla']}: {fila['filas']:,} filas | "
+              f"generación {fila['tiempo_generacion']:.2f}s | carga {fila['tiempo_carga']:.2f}s | "
+              f"{fila['filas_por_segundo'] or 0:,} filas/s")
+    print(f"  Generador: {resumen['duracion_generador']:.2f}s | RSS pico: {resumen['rss_pico_mb']} MB")
+    if duracion_etl is not None:
+        print(f"  ETL: {resumen['duracion_etl']:.2f}s")
+    print(f"\n Reporte: {ruta_json}")
+    print(f" Reporte: {ruta_csv}")
+
+if __name__ == "__main__":
+    main()
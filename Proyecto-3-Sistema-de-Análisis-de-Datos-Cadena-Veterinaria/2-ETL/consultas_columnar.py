@@ -0,0 +1,233 @@
+"""
+============================================
+CONSULTAS COLUMNARES - VETERINARIA
+============================================
+Ejecuta las consultas de 3-Analytics/analytics.sql, las vistas v_tableau_* o
+una consulta propia sobre la instantánea Parquet que escribe
+etl_process.py --exportar-parquet, con DuckDB embebido en lugar de
+PostgreSQL: las agregaciones sobre millones de filas de hechos se resuelven
+en un motor columnar y en paralelo, sin cargar la base de producción.
+
+Uso:
+    python etl_process.py --exportar-parquet exportacion_dw
+    python consultas_columnar.py exportacion_dw
+    python consultas_columnar.py exportacion_dw --consultas rfm --repeticiones 5
+    python consultas_columnar.py exportacion_dw --comparar-postgres
+    python consultas_columnar.py exportacion_dw --sql "SELECT * FROM dw.v_tableau_ventas" --salida ventas.parquet
+
+Cada tabla exportada se ve como dw.<tabla> (los hechos leen todas sus
+carpetas mes_anio=YYYY-MM) y las vistas v_tableau_* se crean con el mismo
+SQL de tableau_views.sql; dw.quintil_rfm se define como macro de DuckDB.
+
+Requiere: pip install duckdb pyarrow
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import time
+
+import duckdb
+import psycopg2
+
+import etl_process
+from benchmark_consultas import ARCHIVO_VISTAS, consultas_analytics, consultas_vistas, leer_script, percentil
+
+# Mismo cálculo que dw.quintil_rfm en schema_datawarehouse.sql (listas de DuckDB: índice desde 1)
+MACRO_QUINTIL_RFM = """
+    CREATE MACRO dw.quintil_rfm(valor, cortes) AS
+        1 + COALESCE((valor < cortes[1])::INTEGER, 0) + COALESCE((valor < cortes[2])::INTEGER, 0)
+          + COALESCE((valor < cortes[3])::INTEGER, 0) + COALESCE((valor < cortes[4])::INTEGER, 0);
+"""
+
+# ============================================
+# INSTANTÁNEA
+# ============================================
+
+def literal(texto):
+    """Literal de texto SQL (rutas de archivos)"""
+    return "'" + texto.replace("'", "''") + "'"
+
+def leer_manifiesto(directorio):
+    """Manifiesto de la última exportación terminada de DIR"""
+    ruta = os.path.join(directorio, etl_process.ARCHIVO_MANIFIESTO)
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(
+            f"{directorio} no tiene {etl_process.ARCHIVO_MANIFIESTO}: no hay una exportación terminada "
+            f"(etl_process.py --exportar-parquet {directorio})"
+        )
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+def definiciones_vistas():
+    """Sentencias CREATE OR REPLACE VIEW dw.v_tableau_* de tableau_views.sql"""
+    return re.findall(r'^CREATE OR REPLACE VIEW dw\.v_tableau_\w+ AS\n.*?;$', leer_script(ARCHIVO_VISTAS), re.S | re.M)
+
+def abrir_instantanea(directorio, hilos=None, memoria=None):
+    """Conexión DuckDB en memoria con las tablas exportadas como vistas dw.<tabla>
+    
+    Devuelve (conexión, manifiesto, {vista: error}) con las vistas de Tableau
+    que DuckDB no pudo crear.
+    """
+    manifiesto = leer_manifiesto(directorio)
+    con = duckdb.connect()
+    if hilos:
+        con.execute(f"SET threads = {int(hilos)};")
+    if memoria:
+        con.execute(f"SET memory_limit = {literal(memoria)};")
+    
+    con.execute("CREATE SCHEMA dw;")
+    for tabla, datos in manifiesto['tablas'].items():
+        partes = os.path.join(directorio, tabla, '*', 'parte.parquet') if datos['particionada'] \
+            else os.path.join(directorio, tabla, 'parte.parquet')
+        if not glob.glob(partes):
+            continue  # Hecho sin filas: las consultas que lo usan fallan con tabla inexistente
+        # hive_partitioning = false: mes_anio es solo la carpeta, no una columna más
+        con.execute(
+            f"CREATE VIEW dw.{tabla} AS SELECT * FROM read_parquet({literal(partes)}, hive_partitioning = false);"
+        )
+    con.execute(MACRO_QUINTIL_RFM)
+    
+    errores = {}
+    for definicion in definiciones_vistas():
+        try:
+            con.execute(definicion)
+        except duckdb.Error as e:
+            errores[re.match(r'CREATE OR REPLACE VIEW (\S+)', definicion).group(1)] = str(e).strip()
+    return con, manifiesto, errores
+
+# ============================================
+# MEDICIÓN
+# ============================================
+
+def medir_latencias(ejecutar, sql, repeticiones, calentamiento):
+    """Ejecuta sql (calentamiento + repeticiones medidas) y devuelve (filas, latencias en ms)"""
+    latencias = []
+    for numero in range(calentamiento + repeticiones):
+        inicio = time.perf_counter()
+        filas = ejecutar(sql)
+        duracion = (time.perf_counter() - inicio) * 1000
+        if numero >= calentamiento:
+            latencias.append(duracion)
+    return len(filas), latencias
+
+def medir_motor(nombre, ejecutar, consulta, repeticiones, calentamiento, errores):
+    """Mide una consulta en un motor; los errores se registran y no detienen la corrida"""
+    try:
+        filas, latencias = medir_latencias(ejecutar, consulta['sql'], repeticiones, calentamiento)
+    except errores as e:
+        return {f"{nombre}_error": str(e).strip()}
+    return {f"{nombre}_filas": filas, f"{nombre}_p50_ms": round(percentil(latencias, 50), 3),
+            f"{nombre}_p95_ms": round(percentil(latencias, 95), 3)}
+
+def ejecutar_consultas(con, consultas, args):
+    """Mide cada consulta en DuckDB y, con --comparar-postgres, también en PostgreSQL"""
+    conn = cursor = None
+    if args.comparar_postgres:
+        conn = psycopg2.connect(**etl_process.DB_CONFIG)
+        conn.autocommit = True
+        cursor = conn.cursor()
+    
+    def en_duckdb(sql):
+        return con.execute(sql).fetchall()
+    
+    def en_postgres(sql):
+        cursor.execute(sql)
+        return cursor.fetchall()
+    
+    resultados = []
+    for consulta in consultas:
+        fila = {'origen': consulta['origen'], 'consulta': consulta['consulta']}
+        fila.update(medir_motor('duckdb', en_duckdb, consulta, args.repeticiones, args.calentamiento, duckdb.Error))
+        if cursor:
+            fila.update(medir_motor('postgres', en_postgres, consulta, args.repeticiones, args.calentamiento,
+                                    psycopg2.Error))
+        resultados.append(fila)
+        imprimir_resultado(fila)
+    
+    if conn:
+        cursor.close()
+        conn.close()
+    return resultados
+
+def imprimir_resultado(fila):
+    """Una línea por consulta: p50 en DuckDB y, si se midió, en PostgreSQL"""
+    if 'duckdb_error' in fila:
+        print(f"  {fila['consulta']}: ERROR DuckDB {fila['duckdb_error']}")
+        return
+    linea = f"  {fila['consulta']}: DuckDB p50 {fila['duckdb_p50_ms']:.1f} ms | {fila['duckdb_filas']:,} filas"
+    if 'postgres_error' in fila:
+        linea += f" | ERROR PostgreSQL {fila['postgres_error']}"
+    elif 'postgres_p50_ms' in fila:
+        aceleracion = fila['postgres_p50_ms'] / fila['duckdb_p50_ms'] if fila['duckdb_p50_ms'] else float('inf')
+        linea += f" | PostgreSQL p50 {fila['postgres_p50_ms']:.1f} ms (x{aceleracion:.1f})"
+        if fila['postgres_filas'] != fila['duckdb_filas']:
+            linea += f" | FILAS DISTINTAS: {fila['postgres_filas']:,} en PostgreSQL"
+    print(linea)
+
+def exportar_resultado(con, sql, ruta):
+    """Escribe el resultado de una consulta en CSV o Parquet (según la extensión) sin pasar por Python"""
+    formato = 'PARQUET' if ruta.lower().endswith('.parquet') else 'CSV, HEADER'
+    con.execute(f"COPY ({sql}) TO {literal(ruta)} (FORMAT {formato});")
+
+def parsear_argumentos():
+    """Lee las opciones de línea de comandos"""
+    parser = argparse.ArgumentParser(description='Consultas analíticas sobre la exportación Parquet (DuckDB) - Veterinaria')
+    parser.add_argument('directorio', help='Directorio de etl_process.py --exportar-parquet')
+    parser.add_argument('--consultas', metavar='TEXTO',
+                        help='Ejecuta solo las consultas cuyo nombre contiene este texto')
+    parser.add_argument('--sql', help='Ejecuta esta consulta en lugar de las de analytics.sql y las vistas')
+    parser.add_argument('--salida', metavar='RUTA',
+                        help='Con --sql, escribe el resultado en RUTA (.csv o .parquet)')
+    parser.add_argument('--mostrar', type=int, default=20,
+                        help='Con --sql sin --salida, filas a imprimir')
+    parser.add_argument('--repeticiones', type=int, default=3,
+                        help='Ejecuciones medidas por consulta')
+    parser.add_argument('--calentamiento', type=int, default=1,
+                        help='Ejecuciones previas sin medir')
+    parser.add_argument('--hilos', type=int, help='Hilos de DuckDB (por defecto, todos los núcleos)')
+    parser.add_argument('--memoria', help="Límite de memoria de DuckDB (p. ej. '4GB')")
+    parser.add_argument('--comparar-postgres', action='store_true',
+                        help='Mide también cada consulta en PostgreSQL (DB_CONFIG de etl_process.py)')
+    parser.add_argument('--json', metavar='RUTA', dest='ruta_json',
+                        help='Escribe las mediciones en un reporte JSON')
+    return parser.parse_args()
+
+def main():
+    args = parsear_argumentos()
+    con, manifiesto, errores = abrir_instantanea(args.directorio, args.hilos, args.memoria)
+    print(f" Instantánea de la corrida {manifiesto['id_corrida']} ({manifiesto['fecha']}): "
+          f"{len(manifiesto['tablas'])} tablas")
+    for vista, error in errores.items():
+        print(f"  {vista}: no se pudo crear en DuckDB: {error}")
+    
+    if args.sql:
+        if args.salida:
+            inicio = time.perf_counter()
+            exportar_resultado(con, args.sql, args.salida)
+            print(f" Resultado en {args.salida} ({time.perf_counter() - inicio:.2f}s)")
+        else:
+            resultado = con.execute(args.sql)
+            print(' | '.join(columna[0] for columna in resultado.description))
+            for fila in resultado.fetchmany(args.mostrar):
+                print(' | '.join('' if valor is None else str(valor) for valor in fila))
+        return
+    
+    consultas = consultas_analytics() + consultas_vistas()
+    if args.consultas:
+        consultas = [c for c in consultas if args.consultas.lower() in c['consulta'].lower()]
+    
+    print(f"\n=== {len(consultas)} consultas x {args.repeticiones} repeticiones ===")
+    resultados = ejecutar_consultas(con, consultas, args)
+    con.close()
+    
+    if args.ruta_json:
+        with open(args.ruta_json, 'w', encoding='utf-8') as archivo:
+            json.dump({'instantanea': manifiesto, 'vistas_con_error': errores, 'consultas': resultados},
+                      archivo, ensure_ascii=False, indent=2)
+        print(f"\n Reporte: {args.ruta_json}")
+
+if __name__ == "__main__":
+    main()
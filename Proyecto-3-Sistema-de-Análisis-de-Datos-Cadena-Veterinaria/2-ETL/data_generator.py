@@ -3,18 +3,43 @@
 GENERADOR DE DATOS MASIVOS - VETERINARIA
 ============================================
 Genera 100,000+ registros realistas para el proyecto
-Requiere: pip install faker psycopg2-binary pandas --break-system-packages
+Requiere: pip install faker psycopg2-binary pandas numpy --break-system-packages
+Opcional: pip install pyarrow (salida --formato parquet)
 """
 
 import psycopg2
 from faker import Faker
+import numpy as np
 import random
-from datetime import datetime, timedelta
+from datetime import date, datetime, time as hora_del_dia, timedelta
+from decimal import Decimal
+import argparse
+import ast
+import bisect
+import csv
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
 import sys
+import time
+
+from formato_copy import valor_copy
+
+try:
+    import resource  # Solo Unix: pico de memoria residente para las métricas
+except ImportError:
+    resource = None
 
 # Configuración
-fake = Faker('es_ES')  # Datos en español
-Faker.seed(42)  # Para reproducibilidad
+SEMILLA = 42
+LOCALE_FAKER = 'es_ES'  # Datos en español
+fake = Faker(LOCALE_FAKER)
+Faker.seed(SEMILLA)  # Para reproducibilidad
+random.seed(SEMILLA)
 
 # ============================================
 # CONFIGURACIÓN DE CONEXIÓN
@@ -44,6 +69,56 @@ CANTIDAD = {
     'historial': 60000
 }
 
+# Volúmenes de SF1; --scale SF los multiplica (SF10, SF100, ...)
+CANTIDAD_BASE = dict(CANTIDAD)
+
+# Catálogos que no crecen con el factor de escala (los servicios vienen de initial_data.sql)
+ENTIDADES_SIN_ESCALA = {'servicios'}
+
+# ============================================
+# MÉTODO DE CARGA POR TABLA
+# ============================================
+# 'copy'   -> COPY FROM STDIN con un buffer en memoria (una sola ida al servidor)
+# 'insert' -> executemany con INSERT ... VALUES (una ida por fila)
+METODO_CARGA = {
+    'Cliente': 'copy',
+    'Mascota': 'copy',
+    'Veterinario': 'copy',
+    'Producto': 'copy',
+    'Cita': 'copy',
+    'Venta': 'copy',
+    'DetalleVenta': 'copy',
+    'DetalleServicio': 'copy',
+    'Tratamiento': 'copy',
+    'Vacuna': 'copy',
+    'Examen': 'copy',
+    'Historial_Medico': 'copy'
+}
+
+# Filas construidas y enviadas por lote: solo un lote vive en memoria a la vez
+TAMANO_LOTE = 10000
+
+# ============================================
+# OPCIONES DE GENERACIÓN (ajustadas desde la línea de comandos)
+# ============================================
+OPCIONES = {
+    'vectorizado': False,  # Columnas numéricas y categóricas con NumPy en lugar de fila a fila
+    'pool_faker': False,   # Muestrear nombres, direcciones y frases de pools pre-generados
+    'cache_pool': None,    # Directorio donde guardar/leer los pools (por locale y semilla)
+    'streaming': False,    # COMMIT tras cada lote en lugar de uno por entidad
+    'formato': None        # 'csv' / 'parquet' al escribir archivos; None = PostgreSQL
+}
+
+# Tamaño de cada pool de valores Faker (memoria acotada por estos tamaños)
+TAMANO_POOL_FAKER = {
+    'first_name': 5000,
+    'last_name': 5000,
+    'phone_number': 20000,
+    'address': 20000,
+    'sentence': 20000,
+    'word': 2000
+}
+
 # ============================================
 # DATOS DE REFERENCIA
 # ============================================
@@ -89,6 +164,47 @@ TIPOS_EXAMEN = [
     'Ecocardiograma', 'Biopsia', 'Electrocardiograma', 'Coprocultivo'
 ]
 
+# Las cuatro primeras vacunas son caninas y las cuatro últimas felinas
+VACUNAS_POR_ESPECIE = {
+    'Perro': NOMBRES_VACUNA[:4],
+    'Gato': NOMBRES_VACUNA[4:]
+}
+
+# (Descripción, medicamento, dosis)
+TRATAMIENTOS = [
+    ('Tratamiento antibiótico por infección', 'Amoxicilina', '250mg'),
+    ('Medicación cardíaca', 'Enalapril', '5mg'),
+    ('Analgésicos post-cirugía', 'Meloxicam', '1.5mg'),
+    ('Antiinflamatorio', 'Prednisona', '10mg'),
+    ('Cicatrizante tópico', 'Pomada antibiótica', 'Aplicar'),
+    ('Suplemento vitamínico', 'Multivitamínico', '5ml'),
+    ('Desparasitante interno', 'Praziquantel', '50mg'),
+    ('Tratamiento antipulgas', 'Fipronil', '1 pipeta'),
+    ('Protector gástrico', 'Omeprazol', '10mg'),
+    ('Tratamiento dermatológico', 'Ketoconazol', '200mg')
+]
+
+FRECUENCIAS_TRATAMIENTO = [
+    'Cada 8 horas', 'Cada 12 horas', 'Cada 24 horas', 'Una vez al día', '2 veces al día', 'Dosis única'
+]
+DURACIONES_TRATAMIENTO = [3, 5, 7, 10, 14, 21, 30]
+ESTADOS_TRATAMIENTO = ['En Progreso', 'Completado', 'Suspendido']
+
+SINTOMAS = [
+    'Ninguno', 'Letargo y pérdida de apetito', 'Picazón y enrojecimiento en piel',
+    'Vómitos ocasionales', 'Diarrea leve', 'Cojera', 'Tos persistente',
+    'Secreción ocular', 'Pérdida de peso', 'Fiebre'
+]
+DIAGNOSTICOS = [
+    'Salud óptima', 'Dermatitis alérgica', 'Gastroenteritis', 'Parasitosis intestinal',
+    'Otitis externa', 'Luxación de rótula', 'Insuficiencia mitral leve',
+    'Infección urinaria', 'Conjuntivitis', 'Obesidad'
+]
+RECOMENDACIONES = [
+    'Mantener vacunaciones al día', 'Dieta blanda por 3 días', 'Control en 6 meses',
+    'Reposo y medicación', 'Cambiar a dieta hipoalergénica', 'Fisioterapia semanal'
+]
+
 # ============================================
 # FUNCIONES AUXILIARES
 # ============================================
@@ -103,55 +219,799 @@ def conectar_db():
         print(f" Error de conexión: {e}")
         sys.exit(1)
 
+class TramosIds:
+    """IDs existentes como tramos contiguos [inicio, fin]: ocupa memoria por hueco, no por fila.
+    
+    Se indexa igual que la lista ordenada de IDs, así que rng.choice(tramos)
+    devuelve lo mismo que rng.choice(lista) con la misma semilla.
+    """
+    
+    def __init__(self, tramos):
+        self.inicios = []
+        self.posiciones = []  # Posición global del primer ID de cada tramo
+        self.total = 0
+        for inicio, fin in tramos:
+            self.inicios.append(inicio)
+            self.posiciones.append(self.total)
+            self.total += fin - inicio + 1
+    
+    def __len__(self):
+        return self.total
+    
+    def __getitem__(self, posicion):
+        if not 0 <= posicion < self.total:
+            raise IndexError(posicion)
+        tramo = bisect.bisect_right(self.posiciones, posicion) - 1
+        return self.inicios[tramo] + posicion - self.posiciones[tramo]
+    
+    def tomar(self, posiciones):
+        """Versión vectorizada de __getitem__ para un arreglo NumPy de posiciones"""
+        inicios = np.asarray(self.inicios)
+        primeras = np.asarray(self.posiciones)
+        tramos = np.searchsorted(primeras, posiciones, side='right') - 1
+        return inicios[tramos] + posiciones - primeras[tramos]
+
 def obtener_ids_existentes(cursor, tabla, columna_id):
-    """Obtiene IDs existentes de una tabla"""
-    cursor.execute(f"SELECT {columna_id} FROM {tabla}")
-    return [row[0] for row in cursor.fetchall()]
+    """Obtiene los IDs existentes de una tabla agrupados en tramos contiguos (islas)"""
+    cursor.execute(f"""
+        SELECT MIN({columna_id}), MAX({columna_id})
+        FROM (
+            SELECT {columna_id},
+                   {columna_id} - ROW_NUMBER() OVER (ORDER BY {columna_id}) AS isla
+            FROM {tabla}
+        ) ids
+        GROUP BY isla
+        ORDER BY 1
+    """)
+    return TramosIds(cursor.fetchall())
 
-def fecha_aleatoria(inicio, fin):
+def obtener_citas_atendidas(cursor, ids_citas):
+    """Detalle de las citas completadas entre ids_citas: ID -> (fecha y hora, mascota, veterinario, especie)"""
+    cursor.execute("""
+        SELECT c.ID_Cita, c.Fecha + c.Hora, c.ID_Mascota, c.ID_Veterinario, m.Especie
+        FROM Cita c
+        JOIN Mascota m ON m.ID_Mascota = c.ID_Mascota
+        WHERE c.ID_Cita = ANY(%s)
+          AND c.Estado = 'Completada'
+    """, (list(ids_citas),))
+    return {
+        id_cita: (momento, id_mascota, id_veterinario, 'Perro' if especie == 'Perro' else 'Gato')
+        for id_cita, momento, id_mascota, id_veterinario, especie in cursor.fetchall()
+    }
+
+# Rondas de sorteo sin ninguna cita completada antes de darse por vencido
+MAX_RONDAS_CITAS = 100
+
+class CitasAtendidas:
+    """Citas completadas a las que se enlaza la actividad clínica, sin cargarlas en memoria.
+    
+    Solo guarda los tramos de IDs de Cita: cada lote sortea IDs sobre los
+    tramos, lee del destino el detalle de esas citas y vuelve a sortear las
+    posiciones que cayeron en una cita no completada. Dentro de un worker
+    consulta siempre con el destino del proceso: con fork el objeto llega
+    sin pasar por pickle y conserva el destino del padre.
+    """
+    
+    def __init__(self, tramos, destino=None):
+        self.tramos = tramos
+        self.destino = destino
+    
+    def __getstate__(self):
+        return {'tramos': self.tramos, 'destino': None}
+    
+    def elegir(self, rng, n):
+        """Sortea n citas atendidas: (ID, fecha y hora, mascota, veterinario, especie)"""
+        destino = _estado_worker.get('destino') or self.destino
+        elegidas = [None] * n
+        pendientes = list(range(n))
+        rondas_vacias = 0
+        while pendientes:
+            candidatas = [rng.choice(self.tramos) for _ in pendientes]
+            detalles = destino.detalle_citas(sorted(set(candidatas)))
+            rondas_vacias = 0 if detalles else rondas_vacias + 1
+            if rondas_vacias == MAX_RONDAS_CITAS:
+                raise ValueError("No se encontraron citas completadas para enlazar la actividad clínica")
+            
+            siguientes = []
+            for posicion, id_cita in zip(pendientes, candidatas):
+                if id_cita in detalles:
+                    elegidas[posicion] = (id_cita,) + detalles[id_cita]
+                else:
+                    siguientes.append(posicion)
+            pendientes = siguientes
+        return elegidas
+
+def obtener_precios(cursor, tabla, columna_id):
+    """Obtiene un diccionario ID -> Precio de una tabla"""
+    cursor.execute(f"SELECT {columna_id}, Precio FROM {tabla}")
+    return dict(cursor.fetchall())
+
+def fecha_aleatoria(inicio, fin, rng=random):
     """Genera fecha aleatoria entre dos fechas"""
     delta = fin - inicio
-    random_days = random.randint(0, delta.days)
+    random_days = rng.randint(0, delta.days)
     return inicio + timedelta(days=random_days)
 
-def hora_aleatoria():
+def hora_aleatoria(rng=random):
     """Genera hora de trabajo aleatoria (8am-6pm)"""
-    hora = random.randint(8, 18)
-    minuto = random.choice([0, 15, 30, 45])
+    hora = rng.randint(8, 18)
+    minuto = rng.choice([0, 15, 30, 45])
     return f"{hora:02d}:{minuto:02d}:00"
 
 # ============================================
-# GENERADORES DE DATOS
+# POOLS DE VALORES FAKER
 # ============================================
 
-def generar_clientes(cursor, cantidad):
-    """Genera clientes"""
-    print(f"\n Generando {cantidad:,} clientes...")
+class PoolFaker:
+    """Sustituto de Faker que muestrea de pools pre-generados en lugar de llamar a los proveedores"""
     
-    clientes = []
-    dnis_usados = set()
-    emails_usados = set()
+    def __init__(self, valores, semilla=SEMILLA):
+        self.valores = valores
+        self.rng = random.Random(semilla)
+    
+    def seed_instance(self, semilla):
+        self.rng.seed(semilla)
+    
+    def muestra(self, campo, indices):
+        """Valores del pool para un arreglo de índices"""
+        pool = self.valores[campo]
+        return [pool[indice] for indice in indices]
+    
+    def _elegir(self, campo):
+        pool = self.valores[campo]
+        return pool[self.rng.randrange(len(pool))]
+    
+    def first_name(self):
+        return self._elegir('first_name')
+    
+    def last_name(self):
+        return self._elegir('last_name')
+    
+    def phone_number(self):
+        return self._elegir('phone_number')
+    
+    def address(self):
+        return self._elegir('address')
+    
+    def sentence(self):
+        return self._elegir('sentence')
+    
+    def word(self):
+        return self._elegir('word')
+
+def construir_pool_faker(tamanos, directorio_cache=None):
+    """Genera (o lee del caché en disco) los pools de valores Faker"""
+    ruta = None
+    if directorio_cache:
+        clave = hashlib.sha256(json.dumps(tamanos, sort_keys=True).encode()).hexdigest()[:12]
+        ruta = os.path.join(directorio_cache, f"faker_pool_{LOCALE_FAKER}_{SEMILLA}_{clave}.json")
+        if os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as archivo:
+                print(f" Pools Faker leídos de {ruta}")
+                return json.load(archivo)
+    
+    inicio = time.perf_counter()
+    generador = Faker(LOCALE_FAKER)
+    generador.seed_instance(SEMILLA)
+    valores = {
+        campo: [getattr(generador, campo)() for _ in range(cantidad)]
+        for campo, cantidad in tamanos.items()
+    }
+    print(f" Pools Faker generados en {time.perf_counter() - inicio:.2f}s "
+          f"({sum(tamanos.values()):,} valores)")
+    
+    if ruta:
+        os.makedirs(directorio_cache, exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            json.dump(valores, archivo, ensure_ascii=False)
+    return valores
+
+# ============================================
+# ESCALA Y MÉTRICAS
+# ============================================
+# Tabla -> {'filas', 'tiempo_generacion', 'tiempo_carga', 'rss_pico_mb'}.
+# El tiempo de generación de una entidad se asigna a su tabla principal
+# (los detalles de venta se construyen junto con la venta).
+METRICAS = {}
+
+def aplicar_escala(factor):
+    """Recalcula CANTIDAD como CANTIDAD_BASE x factor (SF1 = volúmenes originales)"""
+    if factor <= 0:
+        raise ValueError(f"El factor de escala debe ser positivo: {factor}")
+    for entidad, cantidad in CANTIDAD_BASE.items():
+        if entidad in ENTIDADES_SIN_ESCALA:
+            CANTIDAD[entidad] = cantidad
+        else:
+            CANTIDAD[entidad] = max(1, round(cantidad * factor))
+
+def rss_pico_mb():
+    """Pico de memoria residente (MB) del proceso principal o de sus workers, el mayor"""
+    if resource is None:
+        return None
+    propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(propio, hijos) / 1024, 1)  # Linux reporta KB
+
+def registrar_metricas(tabla, filas, tiempo_generacion, tiempo_carga):
+    """Acumula filas y tiempos de una tabla en METRICAS"""
+    metrica = METRICAS.setdefault(tabla, {'filas': 0, 'tiempo_generacion': 0.0, 'tiempo_carga': 0.0})
+    metrica['filas'] += filas
+    metrica['tiempo_generacion'] += tiempo_generacion
+    metrica['tiempo_carga'] += tiempo_carga
+    metrica['rss_pico_mb'] = rss_pico_mb()
+
+# ============================================
+# CARGA MASIVA
+# ============================================
+
+def reportar_carga(tabla, filas, duracion):
+    """Imprime el rendimiento de carga de una tabla"""
+    metodo = OPCIONES['formato'] or METODO_CARGA.get(tabla, 'copy')
+    velocidad = filas / duracion if duracion > 0 else 0
+    print(f"  {tabla}: {filas:,} filas vía {metodo.upper()} "
+          f"en {duracion:.2f}s ({velocidad:,.0f} filas/s)")
+
+def cargar_filas(cursor, tabla, columnas, filas, reportar=True):
+    """Inserta filas con el método configurado en METODO_CARGA y devuelve la duración"""
+    metodo = METODO_CARGA.get(tabla, 'copy')
+    inicio = time.perf_counter()
+    
+    if metodo == 'copy':
+        buffer = io.StringIO()
+        for fila in filas:
+            buffer.write('\t'.join(valor_copy(valor) for valor in fila))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN",
+            buffer
+        )
+    elif metodo == 'insert':
+        marcadores = ', '.join(['%s'] * len(columnas))
+        cursor.executemany(
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})",
+            filas
+        )
+    else:
+        raise ValueError(f"Método de carga desconocido para {tabla}: {metodo}")
+    
+    duracion = time.perf_counter() - inicio
+    if reportar:
+        reportar_carga(tabla, len(filas), duracion)
+    return duracion
+
+def reservar_ids(cursor, tabla, columna_id, cantidad):
+    """Reserva un bloque contiguo de IDs de la secuencia SERIAL y lo devuelve como range"""
+    if cantidad <= 0:
+        return range(0)
+    # nextval + setval en una sola sentencia: avanza la secuencia 'cantidad' posiciones
+    cursor.execute("""
+        SELECT setval(
+            pg_get_serial_sequence(%s, %s),
+            nextval(pg_get_serial_sequence(%s, %s)) + %s - 1
+        )
+    """, (tabla, columna_id.lower(), tabla, columna_id.lower(), cantidad))
+    ultimo = cursor.fetchone()[0]
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+# ============================================
+# DESTINOS DE SALIDA
+# ============================================
+# Los generadores no hablan con PostgreSQL directamente sino con un destino:
+# DestinoPostgres carga en la base (COPY / INSERT) y DestinoArchivos escribe
+# un directorio por tabla con un archivo CSV o Parquet por lote, que después
+# se carga con --cargar-archivos o se lee desde cualquier herramienta.
+
+RUTA_DATOS_INICIALES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '1-Database', 'initial_data.sql'
+)
+
+# Tipos de columna según schema_oltp.sql; el resto es 'int' si empieza por ID_ y 'text' si no
+TIPOS_ARCHIVO = {
+    'Cliente': {'Fecha_Registro': 'timestamp'},
+    'Mascota': {'Fecha_Nacimiento': 'date', 'Peso_Kg': 'decimal'},
+    'Veterinario': {'Fecha_Contratacion': 'timestamp'},
+    'Producto': {'Precio': 'decimal', 'Costo': 'decimal'},
+    'Cita': {
+        'Fecha': 'date', 'Hora': 'time', 'Costo': 'decimal',
+        'Duracion_Minutos': 'int', 'Fecha_Creacion': 'timestamp'
+    },
+    'Venta': {'Fecha': 'timestamp', 'Total': 'decimal'},
+    'DetalleVenta': {'Cantidad': 'int', 'Precio_Unitario': 'decimal', 'Subtotal': 'decimal'},
+    'DetalleServicio': {'Cantidad': 'int', 'Precio_Unitario': 'decimal', 'Subtotal': 'decimal'},
+    'Servicio_Adicional': {'Precio': 'decimal', 'Costo': 'decimal', 'Duracion_Minutos': 'int'},
+    'Tratamiento': {'Fecha_Inicio': 'timestamp', 'Fecha_Fin': 'timestamp', 'Costo': 'decimal'},
+    'Vacuna': {'Fecha_Aplicacion': 'timestamp', 'Fecha_Proxima': 'timestamp', 'Costo': 'decimal'},
+    'Examen': {'Fecha': 'timestamp', 'Costo': 'decimal'},
+    'Historial_Medico': {'Fecha': 'timestamp', 'Peso_Kg': 'decimal', 'Temperatura': 'decimal'}
+}
+
+# Orden de carga de los archivos (respeta las claves foráneas)
+ORDEN_TABLAS = [
+    'Cliente', 'Mascota', 'Veterinario', 'Producto', 'Cita', 'Venta', 'DetalleVenta',
+    'DetalleServicio', 'Tratamiento', 'Vacuna', 'Examen', 'Historial_Medico'
+]
+
+def tipo_columna(tabla, columna):
+    """Tipo lógico de una columna en los archivos de salida"""
+    tipo = TIPOS_ARCHIVO.get(tabla, {}).get(columna)
+    if tipo:
+        return tipo
+    return 'int' if columna.startswith('ID_') else 'text'
+
+def normalizar_valor(tipo, valor):
+    """Convierte un valor de los constructores al tipo fijo de su columna"""
+    if valor is None:
+        return None
+    if tipo == 'timestamp':
+        return valor if isinstance(valor, datetime) else datetime.combine(valor, hora_del_dia())
+    if tipo == 'date':
+        return valor.date() if isinstance(valor, datetime) else valor
+    if tipo == 'time':
+        return hora_del_dia.fromisoformat(valor) if isinstance(valor, str) else valor
+    if tipo == 'decimal':
+        return Decimal(str(round(float(valor), 2)))
+    if tipo == 'int':
+        return int(valor)
+    return str(valor)
+
+def interpretar_valor(tipo, texto):
+    """Inverso de la escritura CSV: texto -> valor del tipo de la columna ('' = NULL)"""
+    if texto is None or texto == '':
+        return None
+    if not isinstance(texto, str):
+        return texto
+    if tipo == 'timestamp':
+        return datetime.fromisoformat(texto)
+    if tipo == 'date':
+        return date.fromisoformat(texto[:10])
+    if tipo == 'time':
+        return hora_del_dia.fromisoformat(texto)
+    if tipo == 'decimal':
+        return Decimal(texto)
+    if tipo == 'int':
+        return int(texto)
+    return texto
+
+def leer_datos_iniciales(ruta):
+    """Lee los INSERT de initial_data.sql: tabla -> (columnas, filas) sin la columna SERIAL"""
+    with open(ruta, encoding='utf-8') as archivo:
+        contenido = archivo.read()
+    datos = {}
+    for tabla, columnas, valores in re.findall(
+        r"INSERT INTO (\w+) \((.*?)\) VALUES\s*(.*?\));\s*$", contenido, re.S | re.M
+    ):
+        columnas = [columna.strip() for columna in columnas.split(',')]
+        datos[tabla] = (columnas, ast.literal_eval('[' + valores + ']'))
+    return datos
+
+def esquema_parquet(tabla, columnas):
+    """Esquema Arrow fijo de una tabla (DECIMAL -> decimal128, TIMESTAMP -> timestamp[us])"""
+    import pyarrow as pa
+    tipos = {
+        'int': pa.int32(), 'text': pa.string(), 'date': pa.date32(), 'time': pa.time64('us'),
+        'timestamp': pa.timestamp('us'), 'decimal': pa.decimal128(10, 2)
+    }
+    return pa.schema([(columna, tipos[tipo_columna(tabla, columna)]) for columna in columnas])
+
+class DestinoPostgres:
+    """Carga las filas en PostgreSQL con el método de METODO_CARGA"""
+    
+    numera_detalles = True  # En paralelo, los detalles de venta llevan ID fijo
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+    
+    def configuracion(self):
+        """Datos para que cada worker abra su propio destino"""
+        return ('postgres', dict(DB_CONFIG))
+    
+    def reservar_ids(self, tabla, columna_id, cantidad):
+        return reservar_ids(self.cursor, tabla, columna_id, cantidad)
+    
+    def escribir(self, tabla, columnas, filas):
+        return cargar_filas(self.cursor, tabla, columnas, filas, reportar=False)
+    
+    def confirmar(self):
+        self.conn.commit()
+    
+    def deshacer(self):
+        self.conn.rollback()
+    
+    def ids_existentes(self, tabla, columna_id):
+        return obtener_ids_existentes(self.cursor, tabla, columna_id)
+    
+    def precios(self, tabla, columna_id):
+        return obtener_precios(self.cursor, tabla, columna_id)
+    
+    def citas_atendidas(self):
+        return CitasAtendidas(self.ids_existentes('Cita', 'ID_Cita'), self)
+    
+    def detalle_citas(self, ids_citas):
+        return obtener_citas_atendidas(self.cursor, ids_citas)
+    
+    def contar(self, tabla):
+        self.cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
+        return self.cursor.fetchone()[0]
+    
+    def cerrar(self):
+        self.cursor.close()
+        self.conn.close()
+
+# Índice en disco de las citas (posición = ID_Cita) para enlazar la actividad clínica
+ARCHIVO_INDICE_CITAS = '_indice_citas.npy'
+ARCHIVO_MASCOTAS_PERRO = '_mascotas_perro.npy'
+TIPO_INDICE_CITAS = np.dtype([
+    ('minuto', np.int64),  # Minutos desde 1970-01-01 (fecha + hora de la cita)
+    ('mascota', np.int32),
+    ('veterinario', np.int32),
+    ('completada', bool),
+    ('es_perro', bool)
+])
+
+class DestinoArchivos:
+    """Escribe cada lote en <directorio>/<Tabla>/parte-<primer ID>.<csv|parquet>.
+    
+    Las filas de initial_data.sql ocupan los primeros IDs de cada tabla, así
+    que los archivos se cargan sin conflictos sobre una base recién creada.
+    """
     
-    for i in range(cantidad):
-        dni = str(random.randint(10000000, 99999999))
-        while dni in dnis_usados:
-            dni = str(random.randint(10000000, 99999999))
-        dnis_usados.add(dni)
+    numera_detalles = False  # Los detalles toman su ID SERIAL al cargarse
+    
+    def __init__(self, directorio, formato='csv', ruta_datos_iniciales=RUTA_DATOS_INICIALES):
+        if formato not in ('csv', 'parquet'):
+            raise ValueError(f"Formato de salida desconocido: {formato}")
+        self.directorio = directorio
+        self.formato = formato
+        self.ruta_datos_iniciales = ruta_datos_iniciales
+        self.iniciales = leer_datos_iniciales(ruta_datos_iniciales)
+        self.siguiente_id = {}
+        self.indice_citas = None
+    
+    def configuracion(self):
+        return ('archivos', self.directorio, self.formato, self.ruta_datos_iniciales)
+    
+    def archivos(self, tabla):
+        """Archivos de una tabla en orden de ID"""
+        return sorted(glob.glob(os.path.join(self.directorio, tabla, f"parte-*.{self.formato}")))
+    
+    def reservar_ids(self, tabla, columna_id, cantidad):
+        if tabla not in self.siguiente_id:
+            self.siguiente_id[tabla] = len(self.iniciales.get(tabla, ([], []))[1]) + 1
+        inicio = self.siguiente_id[tabla]
+        self.siguiente_id[tabla] += max(cantidad, 0)
+        return range(inicio, inicio + max(cantidad, 0))
+    
+    def escribir(self, tabla, columnas, filas):
+        if not filas:
+            return 0.0
+        inicio = time.perf_counter()
+        tipos = [tipo_columna(tabla, columna) for columna in columnas]
+        carpeta = os.path.join(self.directorio, tabla)
+        os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, f"parte-{filas[0][0]:010d}.{self.formato}")
         
+        if self.formato == 'csv':
+            with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+                escritor = csv.writer(archivo)
+                escritor.writerow(columnas)
+                for fila in filas:
+                    escritor.writerow([
+                        '' if valor is None else normalizar_valor(tipo, valor)
+                        for tipo, valor in zip(tipos, fila)
+                    ])
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            columnas_arrow = [
+                [normalizar_valor(tipo, valor) for valor in valores]
+                for tipo, valores in zip(tipos, zip(*filas))
+            ]
+            pq.write_table(
+                pa.Table.from_arrays(
+                    [pa.array(valores, campo.type)
+                     for valores, campo in zip(columnas_arrow, esquema_parquet(tabla, columnas))],
+                    schema=esquema_parquet(tabla, columnas)
+                ),
+                ruta
+            )
+        return time.perf_counter() - inicio
+    
+    def confirmar(self):
+        pass  # Cada archivo queda completo al cerrarse
+    
+    def deshacer(self):
+        pass
+    
+    def leer(self, tabla, columna_id, columnas):
+        """Itera (ID, *columnas) de initial_data.sql y luego de los archivos de la tabla"""
+        columnas_iniciales, filas_iniciales = self.iniciales.get(tabla, ([], []))
+        posiciones = [columnas_iniciales.index(columna) for columna in columnas]
+        tipos = [tipo_columna(tabla, columna) for columna in columnas]
+        for numero, fila in enumerate(filas_iniciales, 1):
+            yield (numero,) + tuple(
+                interpretar_valor(tipo, str(fila[posicion])) for tipo, posicion in zip(tipos, posiciones)
+            )
+        
+        for ruta in self.archivos(tabla):
+            if self.formato == 'csv':
+                with open(ruta, encoding='utf-8', newline='') as archivo:
+                    lector = csv.reader(archivo)
+                    cabecera = next(lector)
+                    indices = [cabecera.index(columna) for columna in [columna_id] + columnas]
+                    tipos_fila = ['int'] + tipos
+                    for fila in lector:
+                        yield tuple(interpretar_valor(tipo, fila[i]) for tipo, i in zip(tipos_fila, indices))
+            else:
+                import pyarrow.parquet as pq
+                for lote in pq.ParquetFile(ruta).iter_batches(columns=[columna_id] + columnas):
+                    yield from zip(*(columna.to_pylist() for columna in lote.columns))
+    
+    def ids_existentes(self, tabla, columna_id):
+        if tabla not in self.siguiente_id:
+            self.reservar_ids(tabla, columna_id, 0)
+        return TramosIds([(1, self.siguiente_id[tabla] - 1)] if self.siguiente_id[tabla] > 1 else [])
+    
+    def precios(self, tabla, columna_id):
+        return dict(self.leer(tabla, columna_id, ['Precio']))
+    
+    def citas_atendidas(self):
+        # Mismo detalle que obtener_citas_atendidas, volcado a un índice en disco
+        # (memmap, posición = ID) para no recorrer los archivos de Cita en cada lote
+        ids_mascotas = self.ids_existentes('Mascota', 'ID_Mascota')
+        ids_citas = self.ids_existentes('Cita', 'ID_Cita')
+        ruta_perros = os.path.join(self.directorio, ARCHIVO_MASCOTAS_PERRO)
+        perros = np.lib.format.open_memmap(ruta_perros, mode='w+', dtype=bool, shape=(len(ids_mascotas) + 1,))
+        for id_mascota, especie in self.leer('Mascota', 'ID_Mascota', ['Especie']):
+            perros[id_mascota] = especie == 'Perro'
+        
+        indice = np.lib.format.open_memmap(
+            os.path.join(self.directorio, ARCHIVO_INDICE_CITAS), mode='w+',
+            dtype=TIPO_INDICE_CITAS, shape=(len(ids_citas) + 1,)
+        )
+        columnas = ['Fecha', 'Hora', 'Estado', 'ID_Mascota', 'ID_Veterinario']
+        for id_cita, fecha, hora, estado, id_mascota, id_veterinario in self.leer('Cita', 'ID_Cita', columnas):
+            momento = datetime.combine(fecha, hora)
+            indice[id_cita] = (
+                int((momento - datetime(1970, 1, 1)).total_seconds()) // 60,
+                id_mascota,
+                id_veterinario,
+                estado == 'Completada',
+                perros[id_mascota]
+            )
+        indice.flush()
+        del indice, perros
+        os.remove(ruta_perros)
+        self.indice_citas = None  # Se reabre en solo lectura al primer detalle_citas
+        return CitasAtendidas(ids_citas, self)
+    
+    def detalle_citas(self, ids_citas):
+        if self.indice_citas is None:
+            self.indice_citas = np.load(os.path.join(self.directorio, ARCHIVO_INDICE_CITAS), mmap_mode='r')
+        filas = self.indice_citas[np.asarray(ids_citas, dtype=np.int64)]
+        return {
+            id_cita: (
+                datetime(1970, 1, 1) + timedelta(minutes=int(fila['minuto'])),
+                int(fila['mascota']),
+                int(fila['veterinario']),
+                'Perro' if fila['es_perro'] else 'Gato'
+            )
+            for id_cita, fila in zip(ids_citas, filas)
+            if fila['completada']
+        }
+    
+    def contar(self, tabla):
+        total = len(self.iniciales.get(tabla, ([], []))[1])
+        for ruta in self.archivos(tabla):
+            if self.formato == 'csv':
+                with open(ruta, encoding='utf-8', newline='') as archivo:
+                    total += sum(1 for _ in csv.reader(archivo)) - 1
+            else:
+                import pyarrow.parquet as pq
+                total += pq.ParquetFile(ruta).metadata.num_rows
+        return total
+    
+    def cerrar(self):
+        # El índice de citas es auxiliar: cargar_archivos solo lee <Tabla>/parte-*
+        self.indice_citas = None
+        ruta = os.path.join(self.directorio, ARCHIVO_INDICE_CITAS)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+def crear_destino(configuracion):
+    """Reconstruye un destino a partir de su configuracion() (en cada worker)"""
+    if configuracion[0] == 'postgres':
+        return DestinoPostgres(psycopg2.connect(**configuracion[1]))
+    return DestinoArchivos(*configuracion[1:])
+
+def cargar_archivos(cursor, directorio):
+    """Carga en PostgreSQL los archivos escritos por DestinoArchivos y ajusta las secuencias"""
+    ids_propios = {tabla: columna_id for tabla, columna_id, _ in ENTIDADES.values()}
+    for tabla in ORDEN_TABLAS:
+        rutas = sorted(glob.glob(os.path.join(directorio, tabla, 'parte-*.*')))
+        if not rutas:
+            continue
+        filas = 0
+        inicio = time.perf_counter()
+        for ruta in rutas:
+            if ruta.endswith('.csv'):
+                with open(ruta, encoding='utf-8') as archivo:
+                    columnas = next(csv.reader([archivo.readline()]))
+                    archivo.seek(0)
+                    cursor.copy_expert(
+                        f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                        archivo
+                    )
+                    filas += cursor.rowcount
+            else:
+                import pyarrow.parquet as pq
+                archivo = pq.ParquetFile(ruta)
+                columnas = archivo.schema_arrow.names
+                for lote in archivo.iter_batches():
+                    filas_lote = list(zip(*(columna.to_pylist() for columna in lote.columns)))
+                    cargar_filas(cursor, tabla, columnas, filas_lote, reportar=False)
+                    filas += len(filas_lote)
+        # Las secuencias siguen a los IDs cargados para que los próximos INSERT no choquen
+        columna_id = columnas[0]
+        if columna_id == ids_propios.get(tabla):
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, %s), (SELECT MAX({columna_id}) FROM {tabla}))",
+                (tabla, columna_id.lower())
+            )
+        reportar_carga(tabla, filas, time.perf_counter() - inicio)
+
+# ============================================
+# CLAVES ÚNICAS
+# ============================================
+# Cada clave única (DNI, colegiatura) es la imagen del ID del registro por una
+# permutación pseudoaleatoria del espacio de claves: sin conjuntos de usados,
+# sin reintentos y sin estado compartido entre procesos.
+
+RANGO_DNI_CLIENTE = (10000000, 99999999)
+RANGO_DNI_VETERINARIO = (20000000, 29999999)
+RANGO_COLEGIATURA = (1000, 9999)
+
+# Entidad -> [(columna, rango)] de las claves derivadas del ID
+ESPACIOS_CLAVE = {
+    'clientes': [('Dni', RANGO_DNI_CLIENTE)],
+    'veterinarios': [('Dni', RANGO_DNI_VETERINARIO), ('Colegiatura', RANGO_COLEGIATURA)]
+}
+
+class PermutacionClaves:
+    """Permutación de [0, espacio) con una red Feistel de 4 rondas y cycle walking"""
+    
+    def __init__(self, espacio, etiqueta):
+        self.espacio = espacio
+        bits = max(2, (espacio - 1).bit_length())
+        self.mitad = (bits + 1) // 2
+        self.mascara = (1 << self.mitad) - 1
+        digest = hashlib.sha256(f"{SEMILLA}:{etiqueta}".encode()).digest()
+        self.llaves = [int.from_bytes(digest[i:i + 4], 'big') for i in range(0, 16, 4)]
+    
+    def _feistel(self, x):
+        izquierda, derecha = x >> self.mitad, x & self.mascara
+        for llave in self.llaves:
+            mezcla = ((derecha ^ llave) * 0x9E3779B1) >> 7
+            izquierda, derecha = derecha, izquierda ^ (mezcla & self.mascara)
+        return (izquierda << self.mitad) | derecha
+    
+    def __getitem__(self, posicion):
+        if not 0 <= posicion < self.espacio:
+            raise IndexError(posicion)
+        # La red permuta [0, 4^mitad); se reaplica hasta caer dentro del espacio
+        # (4^mitad < 4 * espacio, así que bastan pocas vueltas en promedio)
+        clave = self._feistel(posicion)
+        while clave >= self.espacio:
+            clave = self._feistel(clave)
+        return clave
+
+_permutaciones = {}
+
+def clave_unica(id_registro, minimo, maximo):
+    """Asigna a un ID una clave única en [minimo, maximo] en tiempo constante"""
+    espacio = maximo - minimo + 1
+    if id_registro >= espacio:
+        raise ValueError(f"ID {id_registro:,} fuera del espacio de claves [{minimo}, {maximo}]")
+    if (minimo, maximo) not in _permutaciones:
+        _permutaciones[(minimo, maximo)] = PermutacionClaves(espacio, f"{minimo}-{maximo}")
+    return minimo + _permutaciones[(minimo, maximo)][id_registro]
+
+def validar_espacio_claves(entidad, ids):
+    """Falla antes de construir filas si los IDs reservados no caben en algún espacio de claves"""
+    if not ids:
+        return
+    tabla = ENTIDADES[entidad][0]
+    for columna, (minimo, maximo) in ESPACIOS_CLAVE.get(entidad, []):
+        espacio = maximo - minimo + 1
+        if ids[-1] >= espacio:
+            raise ValueError(
+                f"{tabla}.{columna}: el espacio de claves [{minimo}, {maximo}] admite "
+                f"{espacio:,} valores y se necesitan IDs hasta {ids[-1]:,}; "
+                f"reduzca CANTIDAD['{entidad}'] o amplíe el rango"
+            )
+
+# ============================================
+# CONSTRUCTORES DE FILAS
+# ============================================
+# Cada constructor recibe el generador aleatorio, la instancia de Faker y el
+# rango de IDs a construir; no toca la base de datos, por lo que sirve tanto
+# para la generación secuencial como para los shards en paralelo.
+
+NOMBRES_MASCOTA = [
+    'Max', 'Luna', 'Rocky', 'Bella', 'Charlie', 'Lucy', 'Cooper', 'Daisy',
+    'Buddy', 'Molly', 'Zeus', 'Chloe', 'Duke', 'Lola', 'Bear', 'Lily',
+    'Oliver', 'Mia', 'Teddy', 'Sophie', 'Jack', 'Sadie', 'Toby', 'Maggie'
+]
+
+MAX_PRODUCTOS_VENTA = 5
+
+COLUMNAS = {
+    'Cliente': [
+        'ID_Cliente', 'Nombre', 'Apellido', 'Telefono', 'Direccion',
+        'Correo_Electronico', 'Dni', 'Fecha_Registro', 'Estado'
+    ],
+    'Mascota': [
+        'ID_Mascota', 'Nombre', 'Especie', 'Raza', 'Sexo', 'Fecha_Nacimiento',
+        'Color', 'Peso_Kg', 'Estado', 'Observacion', 'ID_Cliente'
+    ],
+    'Veterinario': [
+        'ID_Veterinario', 'Nombre', 'Apellido', 'Especialidad', 'Telefono',
+        'Correo_Electronico', 'Dni', 'Colegiatura', 'ID_Sede', 'Fecha_Contratacion'
+    ],
+    'Producto': [
+        'ID_Producto', 'Nombre', 'Tipo', 'Precio', 'Costo', 'Descripcion',
+        'Unidad_Medida', 'Categoria', 'ID_Proveedor'
+    ],
+    'Cita': [
+        'ID_Cita', 'Fecha', 'Hora', 'Motivo', 'Estado', 'Observacion', 'Costo',
+        'Duracion_Minutos', 'ID_Mascota', 'ID_Veterinario', 'ID_Sede', 'Fecha_Creacion'
+    ],
+    'Venta': [
+        'ID_Venta', 'Fecha', 'Total', 'Tipo_Pago', 'Estado', 'ID_Cliente', 'ID_Sede'
+    ],
+    'DetalleVenta': [
+        'ID_Venta', 'ID_Producto', 'Cantidad', 'Precio_Unitario', 'Subtotal'
+    ],
+    'DetalleServicio': [
+        'ID_Venta', 'ID_Servicio_Adicional', 'Cantidad', 'Precio_Unitario', 'Subtotal'
+    ],
+    'Tratamiento': [
+        'ID_Tratamiento', 'Descripcion', 'Medicamento', 'Dosis', 'Frecuencia', 'Duracion',
+        'Fecha_Inicio', 'Fecha_Fin', 'Estado', 'Costo', 'ID_Cita'
+    ],
+    'Vacuna': [
+        'ID_Vacuna', 'Nombre', 'Dosis', 'Lote', 'Fecha_Aplicacion', 'Fecha_Proxima',
+        'Costo', 'ID_Mascota', 'ID_Veterinario', 'Observacion'
+    ],
+    'Examen': [
+        'ID_Examen', 'Tipo', 'Resultado', 'Fecha', 'Costo', 'ID_Veterinario', 'ID_Mascota', 'Observacion'
+    ],
+    'Historial_Medico': [
+        'ID_Historial', 'Fecha', 'Sintomas', 'Diagnostico', 'Recomendacion', 'Observacion',
+        'Peso_Kg', 'Temperatura', 'ID_Veterinario', 'ID_Mascota', 'ID_Cita'
+    ]
+}
+
+def construir_clientes(rng, fake, ids):
+    """Construye filas de Cliente para los IDs dados"""
+    clientes = []
+    for id_cliente in ids:
         nombre = fake.first_name()
         apellido = fake.last_name()
-        email = f"{nombre.lower()}.{apellido.lower()}{random.randint(1,999)}@email.com"
         
-        while email in emails_usados:
-            email = f"{nombre.lower()}.{apellido.lower()}{random.randint(1,9999)}@email.com"
-        emails_usados.add(email)
+        # DNI y correo derivados del ID: únicos aunque cada shard genere por separado
+        dni = str(clave_unica(id_cliente, *RANGO_DNI_CLIENTE))
+        email = f"{nombre.lower()}.{apellido.lower()}{id_cliente}@email.com"
         
         fecha_registro = fecha_aleatoria(
             datetime(2020, 1, 1),
-            datetime(2024, 12, 1)
+            datetime(2024, 12, 1),
+            rng
         )
         
         clientes.append((
+            id_cliente,
             nombre,
             apellido,
             fake.phone_number()[:15],
@@ -159,284 +1019,832 @@ def generar_clientes(cursor, cantidad):
             email,
             dni,
             fecha_registro,
-            random.choice(['Activo', 'Activo', 'Activo', 'Inactivo'])  # 75% activos
+            rng.choice(['Activo', 'Activo', 'Activo', 'Inactivo'])  # 75% activos
         ))
-        
-        if (i + 1) % 1000 == 0:
-            print(f"  Progreso: {i+1:,}/{cantidad:,}")
-    
-    cursor.executemany("""
-        INSERT INTO Cliente (Nombre, Apellido, Telefono, Direccion, Correo_Electronico, 
-                            Dni, Fecha_Registro, Estado)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    """, clientes)
-    
-    print(f" {cantidad:,} clientes insertados")
+    return clientes
 
-def generar_mascotas(cursor, cantidad, ids_clientes):
-    """Genera mascotas"""
-    print(f"\n Generando {cantidad:,} mascotas...")
-    
-    nombres_mascota = [
-        'Max', 'Luna', 'Rocky', 'Bella', 'Charlie', 'Lucy', 'Cooper', 'Daisy',
-        'Buddy', 'Molly', 'Zeus', 'Chloe', 'Duke', 'Lola', 'Bear', 'Lily',
-        'Oliver', 'Mia', 'Teddy', 'Sophie', 'Jack', 'Sadie', 'Toby', 'Maggie'
-    ]
-    
+def construir_mascotas(rng, fake, ids, ids_clientes):
+    """Construye filas de Mascota para los IDs dados"""
     mascotas = []
-    for i in range(cantidad):
-        especie = random.choice(ESPECIES)
-        raza = random.choice(RAZAS_PERRO if especie == 'Perro' else RAZAS_GATO)
+    for id_mascota in ids:
+        especie = rng.choice(ESPECIES)
+        raza = rng.choice(RAZAS_PERRO if especie == 'Perro' else RAZAS_GATO)
         
         fecha_nac = fecha_aleatoria(
             datetime(2015, 1, 1),
-            datetime(2024, 6, 1)
+            datetime(2024, 6, 1),
+            rng
         )
         
-        peso = round(random.uniform(2.0, 45.0), 2) if especie == 'Perro' else round(random.uniform(2.0, 8.0), 2)
+        peso = round(rng.uniform(2.0, 45.0), 2) if especie == 'Perro' else round(rng.uniform(2.0, 8.0), 2)
         
         mascotas.append((
-            random.choice(nombres_mascota),
+            id_mascota,
+            rng.choice(NOMBRES_MASCOTA),
             especie,
             raza,
-            random.choice(SEXOS),
+            rng.choice(SEXOS),
             fecha_nac,
-            random.choice(COLORES),
+            rng.choice(COLORES),
             peso,
-            random.choice(['Activo', 'Activo', 'Activo', 'Fallecido']),  # 75% activos
-            fake.sentence() if random.random() > 0.7 else None,
-            random.choice(ids_clientes)
+            rng.choice(['Activo', 'Activo', 'Activo', 'Fallecido']),  # 75% activos
+            fake.sentence() if rng.random() > 0.7 else None,
+            rng.choice(ids_clientes)
         ))
-        
-        if (i + 1) % 1000 == 0:
-            print(f"  Progreso: {i+1:,}/{cantidad:,}")
-    
-    cursor.executemany("""
-        INSERT INTO Mascota (Nombre, Especie, Raza, Sexo, Fecha_Nacimiento, Color,
-                            Peso_Kg, Estado, Observacion, ID_Cliente)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """, mascotas)
-    
-    print(f" {cantidad:,} mascotas insertadas")
+    return mascotas
 
-def generar_veterinarios(cursor, cantidad, ids_sedes):
-    """Genera veterinarios"""
-    print(f"\n Generando {cantidad} veterinarios...")
-    
+def construir_veterinarios(rng, fake, ids, ids_sedes):
+    """Construye filas de Veterinario para los IDs dados"""
     veterinarios = []
-    dnis_usados = set()
-    colegiaturas_usadas = set()
-    
-    for i in range(cantidad):
-        dni = str(random.randint(20000000, 29999999))
-        while dni in dnis_usados:
-            dni = str(random.randint(20000000, 29999999))
-        dnis_usados.add(dni)
-        
-        colegiatura = f"VET{random.randint(1000, 9999)}"
-        while colegiatura in colegiaturas_usadas:
-            colegiatura = f"VET{random.randint(1000, 9999)}"
-        colegiaturas_usadas.add(colegiatura)
+    for id_veterinario in ids:
+        dni = str(clave_unica(id_veterinario, *RANGO_DNI_VETERINARIO))
+        colegiatura = f"VET{clave_unica(id_veterinario, *RANGO_COLEGIATURA)}"
         
         nombre = fake.first_name()
         apellido = fake.last_name()
         
         veterinarios.append((
+            id_veterinario,
             nombre,
             apellido,
-            random.choice(ESPECIALIDADES_VET),
+            rng.choice(ESPECIALIDADES_VET),
             fake.phone_number()[:15],
-            f"{nombre.lower()}.{apellido.lower()}@vetclinic.com",
+            f"{nombre.lower()}.{apellido.lower()}{id_veterinario}@vetclinic.com",
             dni,
             colegiatura,
-            random.choice(ids_sedes),
-            fecha_aleatoria(datetime(2015, 1, 1), datetime(2024, 1, 1))
+            rng.choice(ids_sedes),
+            fecha_aleatoria(datetime(2015, 1, 1), datetime(2024, 1, 1), rng)
         ))
-    
-    cursor.executemany("""
-        INSERT INTO Veterinario (Nombre, Apellido, Especialidad, Telefono, 
-                                Correo_Electronico, Dni, Colegiatura, ID_Sede, Fecha_Contratacion)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """, veterinarios)
-    
-    print(f" {cantidad} veterinarios insertados")
+    return veterinarios
 
-def generar_productos(cursor, cantidad, ids_proveedores):
-    """Genera productos"""
-    print(f"\n Generando {cantidad} productos...")
-    
+def construir_productos(rng, fake, ids, ids_proveedores):
+    """Construye filas de Producto para los IDs dados"""
     productos = []
-    for i in range(cantidad):
-        categoria = random.choice(CATEGORIAS_PRODUCTO)
-        precio = round(random.uniform(10.0, 500.0), 2)
-        costo = round(precio * random.uniform(0.5, 0.75), 2)
+    for id_producto in ids:
+        categoria = rng.choice(CATEGORIAS_PRODUCTO)
+        precio = round(rng.uniform(10.0, 500.0), 2)
+        costo = round(precio * rng.uniform(0.5, 0.75), 2)
         
         productos.append((
+            id_producto,
             fake.word().capitalize() + " " + categoria,
             categoria,
             precio,
             costo,
             fake.sentence(),
-            random.choice(['Kg', 'Unidad', 'Ml', 'Gr']),
+            rng.choice(['Kg', 'Unidad', 'Ml', 'Gr']),
             categoria,
-            random.choice(ids_proveedores)
+            rng.choice(ids_proveedores)
         ))
-    
-    cursor.executemany("""
-        INSERT INTO Producto (Nombre, Tipo, Precio, Costo, Descripcion, 
-                             Unidad_Medida, Categoria, ID_Proveedor)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    """, productos)
-    
-    print(f" {cantidad} productos insertados")
+    return productos
 
-def generar_citas(cursor, cantidad, ids_mascotas, ids_veterinarios, ids_sedes):
-    """Genera citas"""
-    print(f"\n Generando {cantidad:,} citas...")
-    
+def construir_citas(rng, fake, ids, ids_mascotas, ids_veterinarios, ids_sedes):
+    """Construye filas de Cita para los IDs dados"""
     citas = []
-    for i in range(cantidad):
-        fecha = fecha_aleatoria(datetime(2022, 1, 1), datetime(2024, 12, 10))
-        estado = random.choice(ESTADOS_CITA)
+    for id_cita in ids:
+        fecha = fecha_aleatoria(datetime(2022, 1, 1), datetime(2024, 12, 10), rng)
+        estado = rng.choice(ESTADOS_CITA)
         
         # Pesos según realismo: más completadas que programadas
-        if random.random() < 0.7:
+        if rng.random() < 0.7:
             estado = 'Completada'
         
         citas.append((
+            id_cita,
             fecha.date(),
-            hora_aleatoria(),
-            random.choice(MOTIVOS_CITA),
+            hora_aleatoria(rng),
+            rng.choice(MOTIVOS_CITA),
             estado,
-            fake.sentence() if random.random() > 0.6 else None,
-            round(random.uniform(30.0, 500.0), 2),
-            random.choice([30, 45, 60, 90, 120]),
-            random.choice(ids_mascotas),
-            random.choice(ids_veterinarios),
-            random.choice(ids_sedes),
+            fake.sentence() if rng.random() > 0.6 else None,
+            round(rng.uniform(30.0, 500.0), 2),
+            rng.choice([30, 45, 60, 90, 120]),
+            rng.choice(ids_mascotas),
+            rng.choice(ids_veterinarios),
+            rng.choice(ids_sedes),
             fecha
         ))
-        
-        if (i + 1) % 5000 == 0:
-            print(f"  Progreso: {i+1:,}/{cantidad:,}")
-    
-    cursor.executemany("""
-        INSERT INTO Cita (Fecha, Hora, Motivo, Estado, Observacion, Costo,
-                         Duracion_Minutos, ID_Mascota, ID_Veterinario, ID_Sede, Fecha_Creacion)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """, citas)
-    
-    print(f" {cantidad:,} citas insertadas")
+    return citas
 
-def generar_ventas(cursor, cantidad, ids_clientes, ids_sedes, ids_productos, ids_servicios):
-    """Genera ventas con detalles"""
-    print(f"\n Generando {cantidad:,} ventas...")
+def construir_ventas(rng, fake, ids, ids_clientes, ids_sedes, ids_productos, ids_servicios,
+                     precios_producto, precios_servicio):
+    """Construye Venta, DetalleVenta y DetalleServicio para los IDs de venta dados"""
+    ventas = []
+    detalles_venta = []
+    detalles_servicio = []
     
-    for i in range(cantidad):
-        fecha = fecha_aleatoria(datetime(2022, 1, 1), datetime(2024, 12, 10))
-        id_cliente = random.choice(ids_clientes)
-        id_sede = random.choice(ids_sedes)
-        tipo_pago = random.choice(TIPOS_PAGO)
-        
-        # Insertar venta
-        cursor.execute("""
-            INSERT INTO Venta (Fecha, Total, Tipo_Pago, Estado, ID_Cliente, ID_Sede)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING ID_Venta
-        """, (fecha, 0, tipo_pago, 'Completada', id_cliente, id_sede))
-        
-        id_venta = cursor.fetchone()[0]
+    for id_venta in ids:
+        fecha = fecha_aleatoria(datetime(2022, 1, 1), datetime(2024, 12, 10), rng)
+        id_cliente = rng.choice(ids_clientes)
+        id_sede = rng.choice(ids_sedes)
+        tipo_pago = rng.choice(TIPOS_PAGO)
         
         # Generar detalles de productos (1-5 productos por venta)
         total = 0
-        num_productos = random.randint(1, 5)
+        num_productos = rng.randint(1, MAX_PRODUCTOS_VENTA)
         
         for _ in range(num_productos):
-            id_producto = random.choice(ids_productos)
-            cursor.execute("SELECT Precio FROM Producto WHERE ID_Producto = %s", (id_producto,))
-            precio = cursor.fetchone()[0]
+            id_producto = rng.choice(ids_productos)
+            precio = precios_producto[id_producto]
             
-            cantidad = random.randint(1, 5)
-            subtotal = precio * cantidad
+            cantidad_item = rng.randint(1, 5)
+            subtotal = precio * cantidad_item
             total += subtotal
             
-            cursor.execute("""
-                INSERT INTO DetalleVenta (ID_Venta, ID_Producto, Cantidad, Precio_Unitario, Subtotal)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (id_venta, id_producto, cantidad, precio, subtotal))
+            detalles_venta.append((id_venta, id_producto, cantidad_item, precio, subtotal))
         
         # Agregar servicios ocasionalmente (30% de las ventas)
-        if random.random() < 0.3:
-            id_servicio = random.choice(ids_servicios)
-            cursor.execute("SELECT Precio FROM Servicio_Adicional WHERE ID_Servicio_Adicional = %s", (id_servicio,))
-            precio_servicio = cursor.fetchone()[0]
+        if rng.random() < 0.3:
+            id_servicio = rng.choice(ids_servicios)
+            precio_servicio = precios_servicio[id_servicio]
             
             total += precio_servicio
             
-            cursor.execute("""
-                INSERT INTO DetalleServicio (ID_Venta, ID_Servicio_Adicional, Cantidad, Precio_Unitario, Subtotal)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (id_venta, id_servicio, 1, precio_servicio, precio_servicio))
+            detalles_servicio.append((id_venta, id_servicio, 1, precio_servicio, precio_servicio))
+        
+        # Total calculado en cliente: sin UPDATE posterior
+        ventas.append((id_venta, fecha, total, tipo_pago, 'Completada', id_cliente, id_sede))
+    
+    return {
+        'Venta': ventas,
+        'DetalleVenta': detalles_venta,
+        'DetalleServicio': detalles_servicio
+    }
+
+# La actividad clínica se cuelga de citas completadas: fecha, mascota y
+# veterinario salen de la cita sorteada, así que las filas son coherentes
+# con la agenda aunque Vacuna y Examen no tengan columna ID_Cita.
+FECHA_CORTE = datetime(2024, 12, 10)
+
+def construir_tratamientos(rng, fake, ids, citas):
+    """Construye filas de Tratamiento para los IDs dados"""
+    tratamientos = []
+    for id_tratamiento, (id_cita, fecha_cita, _, _, _) in zip(ids, citas.elegir(rng, len(ids))):
+        descripcion, medicamento, dosis = rng.choice(TRATAMIENTOS)
+        dias = rng.choice(DURACIONES_TRATAMIENTO)
+        
+        fecha_inicio = fecha_cita + timedelta(minutes=rng.choice([15, 30, 45]))
+        fecha_fin = fecha_inicio + timedelta(days=dias)
+        
+        if rng.random() < 0.05:
+            estado = 'Suspendido'
+        else:
+            estado = 'Completado' if fecha_fin < FECHA_CORTE else 'En Progreso'
         
-        # Actualizar total de venta
-        cursor.execute("UPDATE Venta SET Total = %s WHERE ID_Venta = %s", (total, id_venta))
+        tratamientos.append((
+            id_tratamiento,
+            descripcion,
+            medicamento,
+            dosis,
+            rng.choice(FRECUENCIAS_TRATAMIENTO),
+            f"{dias} días",
+            fecha_inicio,
+            fecha_fin,
+            estado,
+            round(rng.uniform(20.0, 300.0), 2),
+            id_cita
+        ))
+    return tratamientos
+
+def construir_vacunas(rng, fake, ids, citas):
+    """Construye filas de Vacuna para los IDs dados"""
+    vacunas = []
+    for id_vacuna, (_, fecha, id_mascota, id_veterinario, especie) in zip(ids, citas.elegir(rng, len(ids))):
         
-        if (i + 1) % 1000 == 0:
-            print(f"  Progreso: {i+1:,}/{cantidad:,}")
+        vacunas.append((
+            id_vacuna,
+            rng.choice(VACUNAS_POR_ESPECIE[especie]),
+            rng.choice(['0.5ml', '1ml']),
+            f"LOT{fecha.year}{rng.choice('ABCDEFGH')}",
+            fecha,
+            fecha + timedelta(days=365),
+            round(rng.uniform(35.0, 50.0), 2),
+            id_mascota,
+            id_veterinario,
+            fake.sentence() if rng.random() > 0.8 else None
+        ))
+    return vacunas
+
+def construir_examenes(rng, fake, ids, citas):
+    """Construye filas de Examen para los IDs dados"""
+    examenes = []
+    for id_examen, (_, fecha, id_mascota, id_veterinario, _) in zip(ids, citas.elegir(rng, len(ids))):
+        
+        examenes.append((
+            id_examen,
+            rng.choice(TIPOS_EXAMEN),
+            fake.sentence(),
+            fecha + timedelta(minutes=rng.choice([15, 30, 45, 60])),
+            round(rng.uniform(60.0, 300.0), 2),
+            id_veterinario,
+            id_mascota,
+            fake.sentence() if rng.random() > 0.7 else None
+        ))
+    return examenes
+
+def construir_historial(rng, fake, ids, citas):
+    """Construye filas de Historial_Medico para los IDs dados"""
+    historial = []
+    for id_historial, (id_cita, fecha, id_mascota, id_veterinario, especie) in zip(ids, citas.elegir(rng, len(ids))):
+        peso = round(rng.uniform(2.0, 45.0), 2) if especie == 'Perro' else round(rng.uniform(2.0, 8.0), 2)
+        
+        historial.append((
+            id_historial,
+            fecha,
+            rng.choice(SINTOMAS),
+            rng.choice(DIAGNOSTICOS),
+            rng.choice(RECOMENDACIONES),
+            fake.sentence() if rng.random() > 0.5 else None,
+            peso,
+            round(rng.uniform(37.5, 39.5), 2),
+            id_veterinario,
+            id_mascota,
+            id_cita if rng.random() < 0.9 else None  # ID_Cita admite NULL: anotaciones fuera de agenda
+        ))
+    return historial
+
+# ============================================
+# CONSTRUCTORES VECTORIZADOS (NumPy)
+# ============================================
+# Misma forma de filas que los constructores anteriores, pero cada columna
+# numérica o categórica se sortea de una vez como arreglo con un
+# numpy.random.Generator. Faker solo se usa para los campos de texto libre
+# y las filas se arman al final columna a columna con zip.
+
+def elegir_np(gen, opciones, n):
+    """Versión vectorizada de random.choice: n elementos de opciones"""
+    if isinstance(opciones, TramosIds):
+        return opciones.tomar(gen.integers(0, len(opciones), n))
+    opciones = np.asarray(opciones)
+    return opciones[gen.integers(0, len(opciones), n)]
+
+def fechas_aleatorias_np(gen, inicio, fin, n):
+    """Versión vectorizada de fecha_aleatoria: n fechas datetime64[D]"""
+    dias = gen.integers(0, (fin - inicio).days + 1, n)
+    return np.datetime64(inicio.date(), 'D') + dias
+
+def horas_aleatorias_np(gen, n):
+    """Versión vectorizada de hora_aleatoria: n horas 'HH:MM:00'"""
+    horas = gen.integers(8, 19, n)
+    minutos = elegir_np(gen, [0, 15, 30, 45], n)
+    return [f"{hora:02d}:{minuto:02d}:00" for hora, minuto in zip(horas.tolist(), minutos.tolist())]
+
+def textos_faker(gen, fake, campo, n):
+    """n valores de un campo Faker; con pools se muestrean con un arreglo de índices"""
+    if isinstance(fake, PoolFaker):
+        return fake.muestra(campo, gen.integers(0, len(fake.valores[campo]), n).tolist())
+    return [getattr(fake, campo)() for _ in range(n)]
+
+def textos_opcionales(gen, fake, probabilidad, n):
+    """fake.sentence() solo para la fracción de filas que lleva texto, None en el resto"""
+    con_texto = gen.random(n) > probabilidad
+    textos = iter(textos_faker(gen, fake, 'sentence', int(con_texto.sum())))
+    return [next(textos) if marcado else None for marcado in con_texto.tolist()]
+
+def construir_mascotas_vectorizado(gen, fake, ids, ids_clientes):
+    """Construye filas de Mascota con columnas NumPy"""
+    n = len(ids)
+    especies = elegir_np(gen, ESPECIES, n)
+    es_perro = especies == 'Perro'
+    razas = np.where(es_perro, elegir_np(gen, RAZAS_PERRO, n), elegir_np(gen, RAZAS_GATO, n))
+    fechas_nac = fechas_aleatorias_np(gen, datetime(2015, 1, 1), datetime(2024, 6, 1), n)
+    pesos = np.round(gen.uniform(2.0, np.where(es_perro, 45.0, 8.0)), 2)
+    
+    return list(zip(
+        ids,
+        elegir_np(gen, NOMBRES_MASCOTA, n).tolist(),
+        especies.tolist(),
+        razas.tolist(),
+        elegir_np(gen, SEXOS, n).tolist(),
+        fechas_nac.tolist(),
+        elegir_np(gen, COLORES, n).tolist(),
+        pesos.tolist(),
+        elegir_np(gen, ['Activo', 'Activo', 'Activo', 'Fallecido'], n).tolist(),  # 75% activos
+        textos_opcionales(gen, fake, 0.7, n),
+        elegir_np(gen, ids_clientes, n).tolist()
+    ))
+
+def construir_productos_vectorizado(gen, fake, ids, ids_proveedores):
+    """Construye filas de Producto con columnas NumPy"""
+    n = len(ids)
+    categorias = elegir_np(gen, CATEGORIAS_PRODUCTO, n).tolist()
+    precios = np.round(gen.uniform(10.0, 500.0, n), 2)
+    costos = np.round(precios * gen.uniform(0.5, 0.75, n), 2)
+    
+    return list(zip(
+        ids,
+        [palabra.capitalize() + " " + categoria
+         for palabra, categoria in zip(textos_faker(gen, fake, 'word', n), categorias)],
+        categorias,
+        precios.tolist(),
+        costos.tolist(),
+        textos_faker(gen, fake, 'sentence', n),
+        elegir_np(gen, ['Kg', 'Unidad', 'Ml', 'Gr'], n).tolist(),
+        categorias,
+        elegir_np(gen, ids_proveedores, n).tolist()
+    ))
+
+def construir_citas_vectorizado(gen, fake, ids, ids_mascotas, ids_veterinarios, ids_sedes):
+    """Construye filas de Cita con columnas NumPy"""
+    n = len(ids)
+    fechas = fechas_aleatorias_np(gen, datetime(2022, 1, 1), datetime(2024, 12, 10), n).tolist()
+    
+    # Pesos según realismo: más completadas que programadas
+    estados = elegir_np(gen, ESTADOS_CITA, n)
+    estados[gen.random(n) < 0.7] = 'Completada'
+    
+    return list(zip(
+        ids,
+        fechas,
+        horas_aleatorias_np(gen, n),
+        elegir_np(gen, MOTIVOS_CITA, n).tolist(),
+        estados.tolist(),
+        textos_opcionales(gen, fake, 0.6, n),
+        np.round(gen.uniform(30.0, 500.0, n), 2).tolist(),
+        elegir_np(gen, [30, 45, 60, 90, 120], n).tolist(),
+        elegir_np(gen, ids_mascotas, n).tolist(),
+        elegir_np(gen, ids_veterinarios, n).tolist(),
+        elegir_np(gen, ids_sedes, n).tolist(),
+        fechas
+    ))
+
+# Entidad -> (tabla, columna ID, constructor)
+ENTIDADES = {
+    'clientes': ('Cliente', 'ID_Cliente', construir_clientes),
+    'mascotas': ('Mascota', 'ID_Mascota', construir_mascotas),
+    'veterinarios': ('Veterinario', 'ID_Veterinario', construir_veterinarios),
+    'productos': ('Producto', 'ID_Producto', construir_productos),
+    'citas': ('Cita', 'ID_Cita', construir_citas),
+    'ventas': ('Venta', 'ID_Venta', construir_ventas),
+    'tratamientos': ('Tratamiento', 'ID_Tratamiento', construir_tratamientos),
+    'vacunas': ('Vacuna', 'ID_Vacuna', construir_vacunas),
+    'examenes': ('Examen', 'ID_Examen', construir_examenes),
+    'historial': ('Historial_Medico', 'ID_Historial', construir_historial)
+}
+
+CONSTRUCTORES_VECTORIZADOS = {
+    'mascotas': construir_mascotas_vectorizado,
+    'productos': construir_productos_vectorizado,
+    'citas': construir_citas_vectorizado
+}
+
+_pool_faker = {}
+
+def fake_activo():
+    """Instancia de texto para la generación secuencial: Faker o PoolFaker según OPCIONES"""
+    if not OPCIONES['pool_faker']:
+        return fake
+    if 'instancia' not in _pool_faker:
+        valores = construir_pool_faker(TAMANO_POOL_FAKER, OPCIONES['cache_pool'])
+        _pool_faker['instancia'] = PoolFaker(valores)
+    return _pool_faker['instancia']
+
+def seleccionar_constructor(entidad):
+    """Devuelve (constructor, usa_numpy) según el backend activo en OPCIONES"""
+    if OPCIONES['vectorizado'] and entidad in CONSTRUCTORES_VECTORIZADOS:
+        return CONSTRUCTORES_VECTORIZADOS[entidad], True
+    return ENTIDADES[entidad][2], False
+
+# ============================================
+# GENERADORES DE DATOS
+# ============================================
+
+def generar_por_lotes(destino, entidad, ids, bases=None, **contexto):
+    """Construye y carga una entidad en este proceso, en lotes de TAMANO_LOTE filas
+    
+    Cada lote es un shard de construir_shard (semilla propia por número de
+    lote), así que el resultado es el mismo que con --workers N.
+    """
+    validar_espacio_claves(entidad, ids)
+    generador_texto = fake_activo()
+    
+    tabla_principal = ENTIDADES[entidad][0]
+    tiempo_generacion = 0.0
+    tiempos = {}
+    filas_cargadas = {}
+    for numero_shard, inicio in enumerate(range(0, len(ids), TAMANO_LOTE)):
+        inicio_lote = time.perf_counter()
+        cargas = construir_shard(
+            entidad, numero_shard, ids[inicio:inicio + TAMANO_LOTE], generador_texto, contexto, bases
+        )
+        tiempo_generacion += time.perf_counter() - inicio_lote
+        
+        for tabla, (columnas, filas_tabla) in cargas.items():
+            duracion = destino.escribir(tabla, columnas, filas_tabla)
+            tiempos[tabla] = tiempos.get(tabla, 0.0) + duracion
+            filas_cargadas[tabla] = filas_cargadas.get(tabla, 0) + len(filas_tabla)
+        
+        # En modo streaming cada lote queda confirmado: la transacción no crece con CANTIDAD
+        if OPCIONES['streaming']:
+            destino.confirmar()
+        
+        if len(ids) > TAMANO_LOTE:
+            print(f"  Progreso: {min(inicio + TAMANO_LOTE, len(ids)):,}/{len(ids):,}")
+    
+    for tabla, duracion in tiempos.items():
+        reportar_carga(tabla, filas_cargadas[tabla], duracion)
+        registrar_metricas(
+            tabla, filas_cargadas[tabla],
+            tiempo_generacion if tabla == tabla_principal else 0.0, duracion
+        )
+
+def generar_clientes(destino, cantidad):
+    """Genera clientes"""
+    print(f"\n Generando {cantidad:,} clientes...")
+    
+    ids = destino.reservar_ids('Cliente', 'ID_Cliente', cantidad)
+    generar_por_lotes(destino, 'clientes', ids)
+    
+    print(f" {cantidad:,} clientes insertados")
+
+def generar_mascotas(destino, cantidad, ids_clientes):
+    """Genera mascotas"""
+    print(f"\n Generando {cantidad:,} mascotas...")
+    
+    ids = destino.reservar_ids('Mascota', 'ID_Mascota', cantidad)
+    generar_por_lotes(destino, 'mascotas', ids, ids_clientes=ids_clientes)
+    
+    print(f" {cantidad:,} mascotas insertadas")
+
+def generar_veterinarios(destino, cantidad, ids_sedes):
+    """Genera veterinarios"""
+    print(f"\n Generando {cantidad} veterinarios...")
+    
+    ids = destino.reservar_ids('Veterinario', 'ID_Veterinario', cantidad)
+    generar_por_lotes(destino, 'veterinarios', ids, ids_sedes=ids_sedes)
+    
+    print(f" {cantidad} veterinarios insertados")
+
+def generar_productos(destino, cantidad, ids_proveedores):
+    """Genera productos"""
+    print(f"\n Generando {cantidad} productos...")
+    
+    ids = destino.reservar_ids('Producto', 'ID_Producto', cantidad)
+    generar_por_lotes(destino, 'productos', ids, ids_proveedores=ids_proveedores)
+    
+    print(f" {cantidad} productos insertados")
+
+def generar_citas(destino, cantidad, ids_mascotas, ids_veterinarios, ids_sedes):
+    """Genera citas"""
+    print(f"\n Generando {cantidad:,} citas...")
+    
+    ids = destino.reservar_ids('Cita', 'ID_Cita', cantidad)
+    generar_por_lotes(
+        destino, 'citas', ids,
+        ids_mascotas=ids_mascotas,
+        ids_veterinarios=ids_veterinarios,
+        ids_sedes=ids_sedes
+    )
+    
+    print(f" {cantidad:,} citas insertadas")
+
+def generar_ventas(destino, cantidad, ids_clientes, ids_sedes, ids_productos, ids_servicios):
+    """Genera ventas con detalles en lotes (precios en memoria, IDs pre-reservados)"""
+    print(f"\n Generando {cantidad:,} ventas...")
+    
+    ids = destino.reservar_ids('Venta', 'ID_Venta', cantidad)
+    bases = reservar_detalles(destino, 'ventas', ids)
+    destino.confirmar()
+    
+    # Precios cargados una sola vez en lugar de un SELECT por línea;
+    # el orden de llamadas a random es el de la versión fila a fila
+    generar_por_lotes(
+        destino, 'ventas', ids, bases,
+        ids_clientes=ids_clientes,
+        ids_sedes=ids_sedes,
+        ids_productos=ids_productos,
+        ids_servicios=ids_servicios,
+        precios_producto=destino.precios('Producto', 'ID_Producto'),
+        precios_servicio=destino.precios('Servicio_Adicional', 'ID_Servicio_Adicional')
+    )
     
     print(f" {cantidad:,} ventas insertadas")
 
+def generar_clinicos(destino, citas):
+    """Genera tratamientos, vacunas, exámenes e historial enlazados a citas atendidas"""
+    for entidad in ['tratamientos', 'vacunas', 'examenes', 'historial']:
+        tabla, columna_id, _ = ENTIDADES[entidad]
+        print(f"\n Generando {CANTIDAD[entidad]:,} {entidad}...")
+        
+        ids = destino.reservar_ids(tabla, columna_id, CANTIDAD[entidad])
+        generar_por_lotes(destino, entidad, ids, citas=citas)
+        destino.confirmar()
+        
+        print(f" {CANTIDAD[entidad]:,} {entidad} insertados")
+
+# ============================================
+# GENERACIÓN PARALELA POR SHARDS
+# ============================================
+# Cada entidad se divide en shards de TAMANO_LOTE filas. La semilla de cada
+# shard depende solo de SEMILLA, la entidad y el número de shard, y los IDs
+# se reservan antes de repartir el trabajo, así que el resultado es el mismo
+# con cualquier número de procesos, también con la generación secuencial
+# (generar_por_lotes construye los mismos shards en orden).
+
+# Estado por proceso: conexión propia, instancia de Faker y contexto de FKs
+_estado_worker = {}
+
+def semilla_shard(entidad, numero_shard):
+    """Deriva la semilla de un shard a partir de SEMILLA"""
+    digest = hashlib.sha256(f"{SEMILLA}:{entidad}:{numero_shard}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def numerar_detalles(filas, id_venta_base, id_detalle_base, maximo_por_venta):
+    """Antepone a cada detalle un ID derivado de su venta y su posición en ella"""
+    numeradas = []
+    id_venta_anterior = None
+    linea = 0
+    for fila in filas:
+        linea = linea + 1 if fila[0] == id_venta_anterior else 0
+        id_venta_anterior = fila[0]
+        id_detalle = id_detalle_base + (fila[0] - id_venta_base) * maximo_por_venta + linea
+        numeradas.append((id_detalle,) + fila)
+    return numeradas
+
+def _iniciar_worker(configuracion, contexto, bases, opciones, valores_pool):
+    """Inicializa un proceso del pool con su propio destino (conexión o directorio)"""
+    OPCIONES.update(opciones)
+    _estado_worker['destino'] = crear_destino(configuracion)
+    _estado_worker['fake'] = PoolFaker(valores_pool) if valores_pool else Faker(LOCALE_FAKER)
+    _estado_worker['contexto'] = contexto
+    _estado_worker['bases'] = bases
+
+def construir_shard(entidad, numero_shard, ids, fake_shard, contexto, bases=None):
+    """Construye las filas de un shard con su semilla; devuelve {tabla: (columnas, filas)}
+    
+    Con bases (IDs fijos de detalles en la base) numera DetalleVenta y
+    DetalleServicio con numerar_detalles.
+    """
+    constructor, usa_numpy = seleccionar_constructor(entidad)
+    semilla = semilla_shard(entidad, numero_shard)
+    rng = np.random.default_rng(semilla) if usa_numpy else random.Random(semilla)
+    fake_shard.seed_instance(semilla)
+    
+    filas = constructor(rng, fake_shard, ids, **contexto)
+    cargas = filas if isinstance(filas, dict) else {ENTIDADES[entidad][0]: filas}
+    
+    resultado = {}
+    for tabla_carga, filas_carga in cargas.items():
+        columnas = COLUMNAS[tabla_carga]
+        if bases and tabla_carga == 'DetalleVenta':
+            filas_carga = numerar_detalles(
+                filas_carga, bases['base_venta'], bases['base_detalle_venta'], MAX_PRODUCTOS_VENTA
+            )
+            columnas = ['ID_Detalle'] + columnas
+        elif bases and tabla_carga == 'DetalleServicio':
+            filas_carga = numerar_detalles(
+                filas_carga, bases['base_venta'], bases['base_detalle_servicio'], 1
+            )
+            columnas = ['ID_Detalle_Servicio'] + columnas
+        resultado[tabla_carga] = (columnas, filas_carga)
+    return resultado
+
+def _procesar_shard(tarea):
+    """Genera y carga un shard; devuelve (filas, tiempo de generación, tiempo de carga) por tabla"""
+    entidad, numero_shard, ids = tarea
+    tabla = ENTIDADES[entidad][0]
+    destino = _estado_worker['destino']
+    
+    inicio = time.perf_counter()
+    cargas = construir_shard(
+        entidad, numero_shard, ids, _estado_worker['fake'], _estado_worker['contexto'], _estado_worker['bases']
+    )
+    tiempo_generacion = time.perf_counter() - inicio
+    
+    tiempos_carga = {}
+    try:
+        for tabla_carga, (columnas, filas_carga) in cargas.items():
+            tiempos_carga[tabla_carga] = destino.escribir(tabla_carga, columnas, filas_carga)
+        destino.confirmar()
+    except Exception:
+        destino.deshacer()
+        raise
+    
+    return {
+        tabla_carga: (
+            len(filas_carga),
+            tiempo_generacion if tabla_carga == tabla else 0.0,
+            tiempos_carga[tabla_carga]
+        )
+        for tabla_carga, (_, filas_carga) in cargas.items()
+    }
+
+def reservar_detalles(destino, entidad, ids):
+    """En la base, los detalles de venta también llevan IDs fijos: base + posición de la venta"""
+    bases = {}
+    if entidad == 'ventas' and destino.numera_detalles:
+        bases['base_venta'] = ids.start
+        bases['base_detalle_venta'] = destino.reservar_ids(
+            'DetalleVenta', 'ID_Detalle', len(ids) * MAX_PRODUCTOS_VENTA
+        ).start
+        bases['base_detalle_servicio'] = destino.reservar_ids(
+            'DetalleServicio', 'ID_Detalle_Servicio', len(ids)
+        ).start
+    return bases
+
+def generar_en_paralelo(destino, entidad, cantidad, workers, **contexto):
+    """Genera una entidad repartiendo sus shards en un pool de procesos"""
+    tabla, columna_id, _ = ENTIDADES[entidad]
+    print(f"\n Generando {cantidad:,} {entidad} con {workers} procesos...")
+    
+    ids = destino.reservar_ids(tabla, columna_id, cantidad)
+    validar_espacio_claves(entidad, ids)
+    
+    bases = reservar_detalles(destino, entidad, ids)
+    destino.confirmar()
+    
+    tareas = [
+        (entidad, numero_shard, ids[inicio:inicio + TAMANO_LOTE])
+        for numero_shard, inicio in enumerate(range(0, cantidad, TAMANO_LOTE))
+    ]
+    
+    # Los pools Faker se construyen una vez en el proceso principal y se envían a cada worker
+    valores_pool = fake_activo().valores if OPCIONES['pool_faker'] else None
+    
+    # Tiempos de generación y carga sumados entre shards (tiempo de CPU de los workers)
+    totales = {}
+    inicio = time.perf_counter()
+    initargs = (destino.configuracion(), contexto, bases, dict(OPCIONES), valores_pool)
+    with multiprocessing.Pool(workers, initializer=_iniciar_worker, initargs=initargs) as pool:
+        for completados, resultado in enumerate(pool.imap_unordered(_procesar_shard, tareas), 1):
+            for tabla_carga, medidas in resultado.items():
+                acumulado = totales.get(tabla_carga, (0, 0.0, 0.0))
+                totales[tabla_carga] = tuple(a + m for a, m in zip(acumulado, medidas))
+            print(f"  Shards: {completados}/{len(tareas)}")
+    duracion = time.perf_counter() - inicio
+    
+    for tabla_carga, (filas, tiempo_generacion, tiempo_carga) in totales.items():
+        reportar_carga(tabla_carga, filas, duracion)
+        registrar_metricas(tabla_carga, filas, tiempo_generacion, tiempo_carga)
+    
+    print(f" {cantidad:,} {entidad} insertados")
+
+def generar_todo_secuencial(destino, ids_sedes, ids_proveedores):
+    """Genera todas las entidades en este proceso"""
+    generar_clientes(destino, CANTIDAD['clientes'])
+    destino.confirmar()
+    
+    ids_clientes = destino.ids_existentes('Cliente', 'ID_Cliente')
+    
+    generar_mascotas(destino, CANTIDAD['mascotas'], ids_clientes)
+    destino.confirmar()
+    
+    ids_mascotas = destino.ids_existentes('Mascota', 'ID_Mascota')
+    
+    generar_veterinarios(destino, CANTIDAD['veterinarios'], ids_sedes)
+    destino.confirmar()
+    
+    ids_veterinarios = destino.ids_existentes('Veterinario', 'ID_Veterinario')
+    
+    generar_productos(destino, CANTIDAD['productos'], ids_proveedores)
+    destino.confirmar()
+    
+    ids_productos = destino.ids_existentes('Producto', 'ID_Producto')
+    ids_servicios = destino.ids_existentes('Servicio_Adicional', 'ID_Servicio_Adicional')
+    
+    generar_citas(destino, CANTIDAD['citas'], ids_mascotas, ids_veterinarios, ids_sedes)
+    destino.confirmar()
+    
+    generar_ventas(destino, CANTIDAD['ventas'], ids_clientes, ids_sedes, ids_productos, ids_servicios)
+    destino.confirmar()
+    
+    generar_clinicos(destino, destino.citas_atendidas())
+
+def generar_todo_en_paralelo(destino, workers, ids_sedes, ids_proveedores):
+    """Genera todas las entidades repartiendo cada una en shards entre procesos"""
+    generar_en_paralelo(destino, 'clientes', CANTIDAD['clientes'], workers)
+    ids_clientes = destino.ids_existentes('Cliente', 'ID_Cliente')
+    
+    generar_en_paralelo(destino, 'mascotas', CANTIDAD['mascotas'], workers,
+                        ids_clientes=ids_clientes)
+    ids_mascotas = destino.ids_existentes('Mascota', 'ID_Mascota')
+    
+    generar_en_paralelo(destino, 'veterinarios', CANTIDAD['veterinarios'], workers,
+                        ids_sedes=ids_sedes)
+    ids_veterinarios = destino.ids_existentes('Veterinario', 'ID_Veterinario')
+    
+    generar_en_paralelo(destino, 'productos', CANTIDAD['productos'], workers,
+                        ids_proveedores=ids_proveedores)
+    ids_productos = destino.ids_existentes('Producto', 'ID_Producto')
+    ids_servicios = destino.ids_existentes('Servicio_Adicional', 'ID_Servicio_Adicional')
+    
+    generar_en_paralelo(destino, 'citas', CANTIDAD['citas'], workers,
+                        ids_mascotas=ids_mascotas,
+                        ids_veterinarios=ids_veterinarios,
+                        ids_sedes=ids_sedes)
+    
+    generar_en_paralelo(destino, 'ventas', CANTIDAD['ventas'], workers,
+                        ids_clientes=ids_clientes,
+                        ids_sedes=ids_sedes,
+                        ids_productos=ids_productos,
+                        ids_servicios=ids_servicios,
+                        precios_producto=destino.precios('Producto', 'ID_Producto'),
+                        precios_servicio=destino.precios('Servicio_Adicional', 'ID_Servicio_Adicional'))
+    
+    citas = destino.citas_atendidas()
+    for entidad in ['tratamientos', 'vacunas', 'examenes', 'historial']:
+        generar_en_paralelo(destino, entidad, CANTIDAD[entidad], workers, citas=citas)
+
 # ============================================
 # FUNCIÓN PRINCIPAL
 # ============================================
 
-def main():
+def parsear_argumentos(argv=None):
+    """Lee las opciones de línea de comandos"""
+    parser = argparse.ArgumentParser(description='Generador de datos masivos - Veterinaria')
+    parser.add_argument(
+        '--scale', type=float, default=None, metavar='SF',
+        help='Factor de escala sobre los volúmenes base (1 = CANTIDAD original, 10, 100, ...)'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=0,
+        help='Procesos en paralelo (0 = generación secuencial en un solo proceso; '
+             'los datos son los mismos con cualquier valor)'
+    )
+    parser.add_argument(
+        '--vectorizado', action='store_true',
+        help='Genera mascotas, productos y citas con arreglos NumPy'
+    )
+    parser.add_argument(
+        '--pool-faker', action='store_true',
+        help='Muestrea nombres, teléfonos, direcciones y frases de pools pre-generados (TAMANO_POOL_FAKER)'
+    )
+    parser.add_argument(
+        '--cache-pool', metavar='DIR',
+        help='Directorio para guardar/reutilizar los pools Faker entre ejecuciones'
+    )
+    parser.add_argument(
+        '--streaming', action='store_true',
+        help='Confirma cada lote de TAMANO_LOTE filas (memoria y transacción constantes)'
+    )
+    parser.add_argument(
+        '--salida', metavar='DIR',
+        help='Escribe archivos por tabla en DIR en lugar de cargar en PostgreSQL'
+    )
+    parser.add_argument(
+        '--formato', choices=['csv', 'parquet'], default='csv',
+        help='Formato de los archivos de --salida'
+    )
+    parser.add_argument(
+        '--datos-iniciales', metavar='RUTA', default=RUTA_DATOS_INICIALES,
+        help='initial_data.sql de referencia para --salida (sedes, proveedores, servicios)'
+    )
+    parser.add_argument(
+        '--cargar-archivos', metavar='DIR',
+        help='Carga en PostgreSQL los archivos generados con --salida y termina'
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parsear_argumentos(argv)
+    if args.scale is not None:
+        aplicar_escala(args.scale)
+    OPCIONES['vectorizado'] = args.vectorizado
+    OPCIONES['pool_faker'] = args.pool_faker
+    OPCIONES['cache_pool'] = args.cache_pool
+    OPCIONES['streaming'] = args.streaming
+    OPCIONES['formato'] = args.formato if args.salida else None
+    
     print("""
     ═══════════════════════════════════════════
     GENERADOR DE DATOS MASIVOS - VETERINARIA
     ═══════════════════════════════════════════
     """)
     
-    # Conectar
-    conn = conectar_db()
-    cursor = conn.cursor()
+    if args.cargar_archivos:
+        conn = conectar_db()
+        cursor = conn.cursor()
+        try:
+            print(f"\n Cargando archivos de {args.cargar_archivos}...")
+            cargar_archivos(cursor, args.cargar_archivos)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        return
+    
+    # Conectar (o preparar el directorio de salida)
+    if args.salida:
+        destino = DestinoArchivos(args.salida, args.formato, args.datos_iniciales)
+        print(f" Escribiendo archivos {args.formato.upper()} en {args.salida}")
+    else:
+        destino = DestinoPostgres(conectar_db())
     
     try:
         # Obtener IDs existentes
         print("\n Obteniendo IDs existentes...")
-        ids_sedes = obtener_ids_existentes(cursor, 'Sede', 'ID_Sede')
-        ids_proveedores = obtener_ids_existentes(cursor, 'Proveedor', 'ID_Proveedor')
+        ids_sedes = destino.ids_existentes('Sede', 'ID_Sede')
+        ids_proveedores = destino.ids_existentes('Proveedor', 'ID_Proveedor')
         
         print(f"  - {len(ids_sedes)} sedes encontradas")
         print(f"  - {len(ids_proveedores)} proveedores encontrados")
         
-        # Generar datos
-        generar_clientes(cursor, CANTIDAD['clientes'])
-        conn.commit()
-        
-        ids_clientes = obtener_ids_existentes(cursor, 'Cliente', 'ID_Cliente')
-        
-        generar_mascotas(cursor, CANTIDAD['mascotas'], ids_clientes)
-        conn.commit()
-        
-        ids_mascotas = obtener_ids_existentes(cursor, 'Mascota', 'ID_Mascota')
-        
-        generar_veterinarios(cursor, CANTIDAD['veterinarios'], ids_sedes)
-        conn.commit()
-        
-        ids_veterinarios = obtener_ids_existentes(cursor, 'Veterinario', 'ID_Veterinario')
-        
-        generar_productos(cursor, CANTIDAD['productos'], ids_proveedores)
-        conn.commit()
-        
-        ids_productos = obtener_ids_existentes(cursor, 'Producto', 'ID_Producto')
-        ids_servicios = obtener_ids_existentes(cursor, 'Servicio_Adicional', 'ID_Servicio_Adicional')
-        
-        generar_citas(cursor, CANTIDAD['citas'], ids_mascotas, ids_veterinarios, ids_sedes)
-        conn.commit()
-        
-        generar_ventas(cursor, CANTIDAD['ventas'], ids_clientes, ids_sedes, ids_productos, ids_servicios)
-        conn.commit()
+        if args.workers > 0:
+            generar_todo_en_paralelo(destino, args.workers, ids_sedes, ids_proveedores)
+        else:
+            generar_todo_secuencial(destino, ids_sedes, ids_proveedores)
         
         print("\n" + "="*50)
         print(" GENERACIÓN COMPLETADA EXITOSAMENTE ")
@@ -446,22 +1854,21 @@ def main():
         print("\n RESUMEN FINAL:")
         tablas = [
             'Cliente', 'Mascota', 'Veterinario', 'Producto', 
-            'Cita', 'Venta', 'DetalleVenta'
+            'Cita', 'Venta', 'DetalleVenta',
+            'Tratamiento', 'Vacuna', 'Examen', 'Historial_Medico'
         ]
         
         for tabla in tablas:
-            cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
-            count = cursor.fetchone()[0]
+            count = destino.contar(tabla)
             print(f"  {tabla}: {count:,} registros")
         
     except Exception as e:
-        conn.rollback()
+        destino.deshacer()
         print(f"\n ERROR: {e}")
         raise
     
     finally:
-        cursor.close()
-        conn.close()
+        destino.cerrar()
         print("\n Conexión cerrada")
 
 if __name__ == "__main__":
@@ -6,8 +6,23 @@ Extrae datos del OLTP y carga al Data Warehouse
 """
 
 import psycopg2
+from psycopg2 import pool as pool_pg
+from psycopg2.extras import Json
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime, date
+import argparse
+import io
+import json
+import os
+import re
+import shutil
 import sys
+import threading
+import time
+
+from formato_copy import valor_copy
 
 # ============================================
 # CONFIGURACIÓN
@@ -20,6 +35,32 @@ DB_CONFIG = {
     'port': 5432
 }
 
+# Conexiones del pool para las cargas en paralelo (dimensiones y hechos)
+ETL_WORKERS = 4
+
+# Meses por delante del actual con partición ya creada en las tablas de hechos
+MESES_PARTICION_ADELANTO = 3
+
+# IDs de origen bajo el máximo leído que la corrida siguiente vuelve a leer: con
+# inserciones concurrentes en el OLTP, un ID SERIAL menor puede confirmarse después
+MARGEN_MARCA_AGUA = 1000
+
+# Opciones de la corrida (las fija ejecutar_etl)
+OPCIONES = {
+    'explain': False  # Capturar EXPLAIN (ANALYZE, BUFFERS) de cada sentencia de carga
+}
+
+# Pasos medidos de la corrida en curso (ver INSTRUMENTACIÓN)
+PASOS_ETL = []
+
+# Serializa los logs y los pasos de las cargas que corren en hilos del pool
+_LOCK_LOG = threading.Lock()
+
+# Definición del Data Warehouse: el ETL crea desde aquí las tablas que falten
+RUTA_ESQUEMA_DW = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '1-Database', 'schema_datawarehouse.sql'
+)
+
 # ============================================
 # FUNCIONES AUXILIARES
 # ============================================
@@ -37,42 +78,326 @@ def conectar_db():
 def log_proceso(mensaje):
     """Imprime log con timestamp"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {mensaje}")
+    with _LOCK_LOG:
+        print(f"[{timestamp}] {mensaje}")
+
+def sentencias_esquema(objetos):
+    """Sentencias CREATE de schema_datawarehouse.sql para los objetos dados, en el orden del script
+    
+    objetos: nombres sin esquema de tablas (con sus índices), secuencias y
+    funciones de dw. Se omiten los DROP, así que no borran nada existente.
+    """
+    with open(RUTA_ESQUEMA_DW, encoding='utf-8') as archivo:
+        script = archivo.read().replace('\r\n', '\n')
+    
+    patron = re.compile(r"""
+        ^CREATE\ TABLE\ dw\.(?P<tabla>\w+)\ \(\n.*?\n\)[^\n]*;$
+        | ^CREATE\ SEQUENCE\ dw\.(?P<secuencia>\w+);$
+        | ^CREATE\ (?:UNIQUE\ )?INDEX\ \w+\ ON\ dw\.(?P<indexada>\w+)\(.*?;
+        | ^CREATE\ OR\ REPLACE\ FUNCTION\ dw\.(?P<funcion>\w+)\(.*?\n\$\$[^\n]*;$
+    """, re.S | re.M | re.X)
+    sentencias = []
+    definidos = set()
+    for sentencia in patron.finditer(script):
+        objeto = next(nombre for nombre in sentencia.groups() if nombre)
+        if objeto in objetos:
+            sentencias.append(sentencia.group(0))
+            if not sentencia.group('indexada'):
+                definidos.add(objeto)
+    
+    faltantes = sorted(set(objetos) - definidos)
+    if faltantes:
+        raise RuntimeError(f"{RUTA_ESQUEMA_DW} no define: {', '.join(faltantes)}")
+    return sentencias
+
+def crear_pool(workers):
+    """Crea un pool acotado de conexiones para las cargas en paralelo"""
+    return pool_pg.ThreadedConnectionPool(1, workers, **DB_CONFIG)
+
+def ejecutar_en_transaccion(pool, carga):
+    """Ejecuta una carga en su propia conexión del pool y en su propia transacción"""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            resultado = carga(cursor)
+        conn.commit()
+        return resultado
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+def ejecutar_en_paralelo(pool, workers, fase, cargas):
+    """Ejecuta cargas independientes en paralelo y espera a todas (barrera)
+    
+    cargas: lista de (nombre, función que recibe un cursor). Cada carga confirma
+    su propia transacción; si alguna falla se levanta un error al terminar
+    todas, para no pasar a la fase siguiente. Devuelve {nombre: resultado}.
+    """
+    inicio = datetime.now()
+    reloj = time.perf_counter()
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=workers) as ejecutor:
+        futuros = {ejecutor.submit(ejecutar_en_transaccion, pool, carga): nombre for nombre, carga in cargas}
+        fallidas = []
+        for futuro, nombre in futuros.items():
+            try:
+                resultados[nombre] = futuro.result()
+            except Exception as e:
+                log_proceso(f" Error en {nombre}: {e}")
+                fallidas.append(nombre)
+    
+    error = f"fallaron {', '.join(fallidas)}" if fallidas else None
+    registrar_paso(fase, None, 'FASE', inicio, time.perf_counter() - reloj, error=error)
+    if fallidas:
+        raise RuntimeError(f"{fase}: fallaron {', '.join(fallidas)}")
+    return resultados
+
+# ============================================
+# INSTRUMENTACIÓN
+# ============================================
+# Cada sentencia de carga se registra como un paso (tiempo, filas, filas/s y,
+# con --explain, su plan de EXPLAIN (ANALYZE, BUFFERS)). Al terminar la
+# corrida los pasos se guardan en dw.etl_run_log y, con --json, en un reporte.
+
+def registrar_paso(paso, tabla, operacion, inicio, duracion, filas=None, plan=None, error=None):
+    """Agrega un paso medido a PASOS_ETL (se llama también desde los hilos del pool)"""
+    with _LOCK_LOG:
+        PASOS_ETL.append({
+            'paso': paso,
+            'tabla': tabla,
+            'operacion': operacion,
+            'estado': 'error' if error else 'ok',
+            'inicio': inicio,
+            'duracion_segundos': round(duracion, 3),
+            'filas': filas,
+            'filas_por_segundo': round(filas / duracion, 1) if filas is not None and duracion > 0 else None,
+            'plan': plan,
+            'error': error
+        })
+
+def filas_del_plan(plan):
+    """Filas escritas según el plan JSON de EXPLAIN ANALYZE de un INSERT/UPDATE/DELETE"""
+    nodo = plan['Plan']
+    if 'Tuples Inserted' in nodo:  # INSERT ... ON CONFLICT
+        return int(nodo['Tuples Inserted'])
+    origen = next(hijo for hijo in nodo['Plans'] if hijo.get('Parent Relationship') == 'Outer')
+    return int(origen['Actual Rows'] * origen['Actual Loops'])
+
+def ejecutar_medido(cursor, paso, tabla, operacion, sql, parametros=None):
+    """Ejecuta una sentencia de carga, la registra como paso y devuelve las filas afectadas
+    
+    Con OPCIONES['explain'] la ejecuta con EXPLAIN (ANALYZE, BUFFERS), que
+    también escribe las filas, y guarda el plan en el paso.
+    """
+    inicio = datetime.now()
+    reloj = time.perf_counter()
+    plan = None
+    try:
+        if OPCIONES['explain']:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", parametros)
+            plan = cursor.fetchone()[0][0]
+            filas = filas_del_plan(plan)
+        else:
+            cursor.execute(sql, parametros)
+            filas = cursor.rowcount  # Sin las filas ya cargadas
+    except Exception as e:
+        registrar_paso(paso, tabla, operacion, inicio, time.perf_counter() - reloj, error=str(e).strip())
+        raise
+    
+    registrar_paso(paso, tabla, operacion, inicio, time.perf_counter() - reloj, filas, plan)
+    return filas
+
+def actualizar_estadisticas(cursor, paso, tablas):
+    """ANALYZE de las tablas o particiones cargadas: mantiene al día reltuples y los planes"""
+    if not tablas:
+        return
+    inicio = datetime.now()
+    reloj = time.perf_counter()
+    cursor.execute(f"ANALYZE {', '.join(sorted(tablas))};")
+    registrar_paso(paso, None, 'ANALYZE', inicio, time.perf_counter() - reloj)
+
+def estimar_filas(cursor, tablas):
+    """Filas por tabla de dw según pg_class.reltuples (sumando particiones), sin recorrerlas"""
+    cursor.execute("""
+        SELECT t.relname,
+               CASE WHEN t.relkind = 'p' THEN (
+                   SELECT SUM(GREATEST(p.reltuples, 0))
+                   FROM pg_inherits i
+                   INNER JOIN pg_class p ON i.inhrelid = p.oid
+                   WHERE i.inhparent = t.oid
+               ) ELSE GREATEST(t.reltuples, 0) END::BIGINT
+        FROM pg_class t
+        INNER JOIN pg_namespace n ON t.relnamespace = n.oid
+        WHERE n.nspname = 'dw' AND t.relname = ANY(%s);
+    """, (list(tablas),))
+    return dict(cursor.fetchall())
+
+def filas_cargadas_por_tabla():
+    """Filas insertadas en la corrida por tabla, según los pasos registrados"""
+    filas = {}
+    for paso in PASOS_ETL:
+        if paso['operacion'] in ('INSERT', 'COPY') and paso['filas']:
+            tabla = paso['tabla'].split('.')[-1]
+            filas[tabla] = filas.get(tabla, 0) + paso['filas']
+    return filas
+
+def guardar_pasos(cursor, id_corrida):
+    """Guarda los pasos de la corrida en dw.etl_run_log"""
+    cursor.executemany("""
+        INSERT INTO dw.etl_run_log (
+            id_corrida, paso, tabla, operacion, estado, inicio, duracion_segundos,
+            filas, filas_por_segundo, plan, error
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+    """, [
+        (id_corrida, p['paso'], p['tabla'], p['operacion'], p['estado'], p['inicio'],
+         p['duracion_segundos'], p['filas'], p['filas_por_segundo'],
+         Json(p['plan']) if p['plan'] is not None else None, p['error'])
+        for p in PASOS_ETL
+    ])
+
+def escribir_reporte_json(ruta, resumen):
+    """Escribe el resumen y los pasos de la corrida como JSON"""
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump({'resumen': resumen, 'pasos': PASOS_ETL}, archivo, ensure_ascii=False, indent=2, default=str)
 
 # ============================================
 # CARGA DE DIMENSIONES
 # ============================================
+# SCD Type 2 por hash: cada fila guarda el md5 de sus atributos rastreados y
+# solo se versionan (cerrar fila actual, insertar version + 1) las claves cuyo
+# hash cambió. Las columnas derivadas (ciudad, tamano, margen, ...) dependen de
+# estos atributos; las que dependen de la fecha de carga (edad, antigüedad) no
+# generan versiones y se recalculan cuando la clave se versiona.
 
-def cargar_dim_cliente(cursor):
-    """Carga dimensión Cliente (SCD Type 2)"""
-    log_proceso("Cargando dim_cliente...")
+# Dimensión -> (clave natural, atributos rastreados)
+ATRIBUTOS_SCD2 = {
+    'dim_cliente': ('id_cliente', [
+        'nombre', 'apellido', 'dni', 'telefono', 'correo_electronico',
+        'direccion', 'estado', 'fecha_registro'
+    ]),
+    'dim_mascota': ('id_mascota', [
+        'nombre', 'especie', 'raza', 'sexo', 'color', 'peso_kg',
+        'estado', 'fecha_nacimiento', 'id_cliente'
+    ]),
+    'dim_veterinario': ('id_veterinario', [
+        'nombre', 'apellido', 'dni', 'colegiatura', 'especialidad', 'telefono',
+        'correo_electronico', 'fecha_contratacion', 'id_sede', 'estado'
+    ]),
+    'dim_sede': ('id_sede', [
+        'nombre', 'direccion', 'ciudad', 'telefono', 'estado'
+    ]),
+    'dim_producto': ('id_producto', [
+        'nombre', 'descripcion', 'tipo', 'categoria', 'unidad_medida',
+        'precio_actual', 'costo_actual', 'id_proveedor', 'nombre_proveedor', 'estado'
+    ]),
+    'dim_servicio': ('id_servicio', [
+        'nombre', 'descripcion', 'categoria', 'duracion_minutos',
+        'precio_actual', 'costo_actual', 'estado'
+    ])
+}
+
+def expresion_hash(dimension, alias):
+    """md5 de los atributos rastreados de una dimensión (misma expresión en fuente y DW)"""
+    _, atributos = ATRIBUTOS_SCD2[dimension]
+    return "md5(ROW({})::TEXT)".format(', '.join(f"{alias}.{a}" for a in atributos))
+
+def asegurar_hash_dimensiones(cursor):
+    """Agrega hash_atributos a dimensiones de Data Warehouses anteriores y calcula el de sus filas
     
-    # Cerrar registros antiguos que ya no están en la fuente
+    Migración de una sola vez: solo toca las dimensiones a las que les falta
+    la columna, así que las corridas normales no toman el bloqueo del ALTER
+    TABLE ni recorren la dimensión.
+    """
     cursor.execute("""
-        UPDATE dw.dim_cliente dc
+        SELECT t.table_name
+        FROM information_schema.tables t
+        WHERE t.table_schema = 'dw' AND t.table_name = ANY(%s)
+        AND NOT EXISTS (
+            SELECT 1 FROM information_schema.columns c
+            WHERE c.table_schema = 'dw' AND c.table_name = t.table_name AND c.column_name = 'hash_atributos'
+        );
+    """, (list(ATRIBUTOS_SCD2),))
+    for (dimension,) in cursor.fetchall():
+        log_proceso(f" Agregando dw.{dimension}.hash_atributos (esquema anterior al SCD2 por hash)...")
+        cursor.execute(f"ALTER TABLE dw.{dimension} ADD COLUMN hash_atributos CHAR(32);")
+        cursor.execute(f"""
+            UPDATE dw.{dimension} d
+            SET hash_atributos = {expresion_hash(dimension, 'd')};
+        """)
+
+def aplicar_scd2(cursor, dimension, columnas, seleccion):
+    """Versiona las claves nuevas, cambiadas o eliminadas de la fuente (en la transacción de la carga)
+    
+    seleccion: SELECT de la fuente con sus columnas nombradas como en la dimensión.
+    Primero cierra y después inserta: el índice único parcial (clave WHERE
+    es_actual) no admite la versión nueva mientras la anterior siga actual.
+    Devuelve (versiones insertadas, versiones cerradas).
+    """
+    clave, _ = ATRIBUTOS_SCD2[dimension]
+    fuente = f"""
+        WITH fuente AS (
+            SELECT s.*, {expresion_hash(dimension, 's')} AS hash_atributos
+            FROM ({seleccion}) s
+        )
+    """
+    
+    # Filas actuales cuya clave desapareció o cuyos atributos cambiaron
+    cerradas = ejecutar_medido(cursor, f"{dimension} cerrar", f"dw.{dimension}", 'UPDATE', f"""
+        {fuente}
+        UPDATE dw.{dimension} d
         SET fecha_fin = CURRENT_DATE - 1, es_actual = FALSE
-        WHERE dc.es_actual = TRUE
+        WHERE d.es_actual = TRUE
         AND NOT EXISTS (
-            SELECT 1 FROM Cliente c WHERE c.ID_Cliente = dc.id_cliente
+            SELECT 1 FROM fuente f
+            WHERE f.{clave} = d.{clave} AND f.hash_atributos = d.hash_atributos
         );
     """)
     
-    # Insertar nuevos clientes o versiones actualizadas
-    cursor.execute("""
-        INSERT INTO dw.dim_cliente (
-            id_cliente, nombre_completo, nombre, apellido, dni, telefono,
-            correo_electronico, direccion, ciudad, segmento_cliente,
-            antiguedad_anios, estado, fecha_registro, fecha_inicio, version, es_actual
+    # Claves sin versión actual: nuevas o recién cerradas
+    insertadas = ejecutar_medido(cursor, f"{dimension} insertar", f"dw.{dimension}", 'INSERT', f"""
+        {fuente}
+        INSERT INTO dw.{dimension} (
+            {', '.join(columnas)},
+            hash_atributos, fecha_inicio, version, es_actual
         )
         SELECT 
-            c.ID_Cliente,
+            {', '.join(f'f.{c}' for c in columnas)},
+            f.hash_atributos,
+            CURRENT_DATE,
+            COALESCE((
+                SELECT MAX(d.version) FROM dw.{dimension} d WHERE d.{clave} = f.{clave}
+            ), 0) + 1,
+            TRUE
+        FROM fuente f
+        WHERE NOT EXISTS (
+            SELECT 1 FROM dw.{dimension} d
+            WHERE d.{clave} = f.{clave} AND d.es_actual = TRUE
+        );
+    """)
+    
+    log_proceso(f" {dimension}: {insertadas} versiones nuevas, {cerradas} cerradas")
+    return insertadas, cerradas
+
+def cargar_dim_cliente(cursor):
+    """Carga dimensión Cliente (SCD Type 2)"""
+    log_proceso("Cargando dim_cliente...")
+    
+    aplicar_scd2(cursor, 'dim_cliente', [
+        'id_cliente', 'nombre_completo', 'nombre', 'apellido', 'dni', 'telefono',
+        'correo_electronico', 'direccion', 'ciudad', 'segmento_cliente',
+        'antiguedad_anios', 'estado', 'fecha_registro'
+    ], """
+        SELECT 
+            c.ID_Cliente AS id_cliente,
             c.Nombre || ' ' || c.Apellido AS nombre_completo,
-            c.Nombre,
-            c.Apellido,
-            c.Dni,
-            c.Telefono,
-            c.Correo_Electronico,
-            c.Direccion,
+            c.Nombre AS nombre,
+            c.Apellido AS apellido,
+            c.Dni AS dni,
+            c.Telefono AS telefono,
+            c.Correo_Electronico AS correo_electronico,
+            c.Direccion AS direccion,
             CASE 
                 WHEN c.Direccion LIKE '%Lima%' THEN 'Lima'
                 WHEN c.Direccion LIKE '%Arequipa%' THEN 'Arequipa'
@@ -84,49 +409,28 @@ def cargar_dim_cliente(cursor):
                 ELSE 'Nuevo'
             END AS segmento_cliente,
             DATE_PART('year', AGE(CURRENT_DATE, c.Fecha_Registro))::INTEGER AS antiguedad_anios,
-            c.Estado,
-            c.Fecha_Registro::DATE,
-            CURRENT_DATE AS fecha_inicio,
-            1 AS version,
-            TRUE AS es_actual
+            c.Estado AS estado,
+            c.Fecha_Registro::DATE AS fecha_registro
         FROM Cliente c
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.dim_cliente dc 
-            WHERE dc.id_cliente = c.ID_Cliente 
-            AND dc.es_actual = TRUE
-        );
     """)
-    
-    registros = cursor.rowcount
-    log_proceso(f" dim_cliente: {registros} registros procesados")
 
 def cargar_dim_mascota(cursor):
     """Carga dimensión Mascota (SCD Type 2)"""
     log_proceso("Cargando dim_mascota...")
     
-    cursor.execute("""
-        UPDATE dw.dim_mascota dm
-        SET fecha_fin = CURRENT_DATE - 1, es_actual = FALSE
-        WHERE dm.es_actual = TRUE
-        AND NOT EXISTS (
-            SELECT 1 FROM Mascota m WHERE m.ID_Mascota = dm.id_mascota
-        );
-    """)
-    
-    cursor.execute("""
-        INSERT INTO dw.dim_mascota (
-            id_mascota, nombre, especie, raza, sexo, color, peso_kg,
-            edad_anios, grupo_edad, tamano, categoria_raza, estado,
-            fecha_nacimiento, id_cliente, fecha_inicio, version, es_actual
-        )
+    aplicar_scd2(cursor, 'dim_mascota', [
+        'id_mascota', 'nombre', 'especie', 'raza', 'sexo', 'color', 'peso_kg',
+        'edad_anios', 'grupo_edad', 'tamano', 'categoria_raza', 'estado',
+        'fecha_nacimiento', 'id_cliente'
+    ], """
         SELECT 
-            m.ID_Mascota,
-            m.Nombre,
-            m.Especie,
-            m.Raza,
-            m.Sexo,
-            m.Color,
-            m.Peso_Kg,
+            m.ID_Mascota AS id_mascota,
+            m.Nombre AS nombre,
+            m.Especie AS especie,
+            m.Raza AS raza,
+            m.Sexo AS sexo,
+            m.Color AS color,
+            m.Peso_Kg AS peso_kg,
             DATE_PART('year', AGE(CURRENT_DATE, m.Fecha_Nacimiento))::INTEGER AS edad_anios,
             CASE 
                 WHEN DATE_PART('year', AGE(CURRENT_DATE, m.Fecha_Nacimiento)) < 1 THEN 'Cachorro'
@@ -143,98 +447,55 @@ def cargar_dim_mascota(cursor):
                 WHEN m.Raza LIKE '%Mestizo%' THEN 'Mestizo'
                 ELSE 'Pura Raza'
             END AS categoria_raza,
-            m.Estado,
-            m.Fecha_Nacimiento,
-            m.ID_Cliente,
-            CURRENT_DATE AS fecha_inicio,
-            1 AS version,
-            TRUE AS es_actual
+            m.Estado AS estado,
+            m.Fecha_Nacimiento AS fecha_nacimiento,
+            m.ID_Cliente AS id_cliente
         FROM Mascota m
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.dim_mascota dm 
-            WHERE dm.id_mascota = m.ID_Mascota 
-            AND dm.es_actual = TRUE
-        );
     """)
-    
-    registros = cursor.rowcount
-    log_proceso(f" dim_mascota: {registros} registros procesados")
 
 def cargar_dim_veterinario(cursor):
     """Carga dimensión Veterinario (SCD Type 2)"""
     log_proceso("Cargando dim_veterinario...")
     
-    cursor.execute("""
-        UPDATE dw.dim_veterinario dv
-        SET fecha_fin = CURRENT_DATE - 1, es_actual = FALSE
-        WHERE dv.es_actual = TRUE
-        AND NOT EXISTS (
-            SELECT 1 FROM Veterinario v WHERE v.ID_Veterinario = dv.id_veterinario
-        );
-    """)
-    
-    cursor.execute("""
-        INSERT INTO dw.dim_veterinario (
-            id_veterinario, nombre_completo, nombre, apellido, dni, colegiatura,
-            especialidad, categoria_especialidad, telefono, correo_electronico,
-            fecha_contratacion, anios_experiencia, id_sede, estado,
-            fecha_inicio, version, es_actual
-        )
+    aplicar_scd2(cursor, 'dim_veterinario', [
+        'id_veterinario', 'nombre_completo', 'nombre', 'apellido', 'dni', 'colegiatura',
+        'especialidad', 'categoria_especialidad', 'telefono', 'correo_electronico',
+        'fecha_contratacion', 'anios_experiencia', 'id_sede', 'estado'
+    ], """
         SELECT 
-            v.ID_Veterinario,
+            v.ID_Veterinario AS id_veterinario,
             v.Nombre || ' ' || v.Apellido AS nombre_completo,
-            v.Nombre,
-            v.Apellido,
-            v.Dni,
-            v.Colegiatura,
-            v.Especialidad,
+            v.Nombre AS nombre,
+            v.Apellido AS apellido,
+            v.Dni AS dni,
+            v.Colegiatura AS colegiatura,
+            v.Especialidad AS especialidad,
             CASE 
                 WHEN v.Especialidad = 'Medicina General' THEN 'General'
                 ELSE 'Especialista'
             END AS categoria_especialidad,
-            v.Telefono,
-            v.Correo_Electronico,
-            v.Fecha_Contratacion::DATE,
+            v.Telefono AS telefono,
+            v.Correo_Electronico AS correo_electronico,
+            v.Fecha_Contratacion::DATE AS fecha_contratacion,
             DATE_PART('year', AGE(CURRENT_DATE, v.Fecha_Contratacion))::INTEGER AS anios_experiencia,
-            v.ID_Sede,
-            v.Estado,
-            CURRENT_DATE AS fecha_inicio,
-            1 AS version,
-            TRUE AS es_actual
+            v.ID_Sede AS id_sede,
+            v.Estado AS estado
         FROM Veterinario v
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.dim_veterinario dv 
-            WHERE dv.id_veterinario = v.ID_Veterinario 
-            AND dv.es_actual = TRUE
-        );
     """)
-    
-    registros = cursor.rowcount
-    log_proceso(f" dim_veterinario: {registros} registros procesados")
 
 def cargar_dim_sede(cursor):
     """Carga dimensión Sede (SCD Type 2)"""
     log_proceso("Cargando dim_sede...")
     
-    cursor.execute("""
-        UPDATE dw.dim_sede ds
-        SET fecha_fin = CURRENT_DATE - 1, es_actual = FALSE
-        WHERE ds.es_actual = TRUE
-        AND NOT EXISTS (
-            SELECT 1 FROM Sede s WHERE s.ID_Sede = ds.id_sede
-        );
-    """)
-    
-    cursor.execute("""
-        INSERT INTO dw.dim_sede (
-            id_sede, nombre, direccion, ciudad, region, zona,
-            tipo_sede, telefono, estado, fecha_inicio, version, es_actual
-        )
+    aplicar_scd2(cursor, 'dim_sede', [
+        'id_sede', 'nombre', 'direccion', 'ciudad', 'region', 'zona',
+        'tipo_sede', 'telefono', 'estado'
+    ], """
         SELECT 
-            s.ID_Sede,
-            s.Nombre,
-            s.Direccion,
-            s.Ciudad,
+            s.ID_Sede AS id_sede,
+            s.Nombre AS nombre,
+            s.Direccion AS direccion,
+            s.Ciudad AS ciudad,
             CASE 
                 WHEN s.Ciudad IN ('Lima') THEN 'Lima Metropolitana'
                 WHEN s.Ciudad IN ('Arequipa', 'Cusco') THEN 'Sur'
@@ -250,232 +511,454 @@ def cargar_dim_sede(cursor):
                 WHEN s.Nombre LIKE '%Central%' THEN 'Central'
                 ELSE 'Sucursal'
             END AS tipo_sede,
-            s.Telefono,
-            s.Estado,
-            CURRENT_DATE AS fecha_inicio,
-            1 AS version,
-            TRUE AS es_actual
+            s.Telefono AS telefono,
+            s.Estado AS estado
         FROM Sede s
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.dim_sede ds 
-            WHERE ds.id_sede = s.ID_Sede 
-            AND ds.es_actual = TRUE
-        );
     """)
-    
-    registros = cursor.rowcount
-    log_proceso(f" dim_sede: {registros} registros procesados")
 
 def cargar_dim_producto(cursor):
     """Carga dimensión Producto (SCD Type 2)"""
     log_proceso("Cargando dim_producto...")
     
-    cursor.execute("""
-        UPDATE dw.dim_producto dp
-        SET fecha_fin = CURRENT_DATE - 1, es_actual = FALSE
-        WHERE dp.es_actual = TRUE
-        AND NOT EXISTS (
-            SELECT 1 FROM Producto p WHERE p.ID_Producto = dp.id_producto
-        );
-    """)
-    
-    cursor.execute("""
-        INSERT INTO dw.dim_producto (
-            id_producto, nombre, descripcion, tipo, categoria, unidad_medida,
-            precio_actual, costo_actual, margen_actual, id_proveedor,
-            nombre_proveedor, estado, fecha_inicio, version, es_actual
-        )
+    aplicar_scd2(cursor, 'dim_producto', [
+        'id_producto', 'nombre', 'descripcion', 'tipo', 'categoria', 'unidad_medida',
+        'precio_actual', 'costo_actual', 'margen_actual', 'id_proveedor',
+        'nombre_proveedor', 'estado'
+    ], """
         SELECT 
-            p.ID_Producto,
-            p.Nombre,
-            p.Descripcion,
-            p.Tipo,
-            p.Categoria,
-            p.Unidad_Medida,
-            p.Precio,
-            p.Costo,
+            p.ID_Producto AS id_producto,
+            p.Nombre AS nombre,
+            p.Descripcion AS descripcion,
+            p.Tipo AS tipo,
+            p.Categoria AS categoria,
+            p.Unidad_Medida AS unidad_medida,
+            p.Precio AS precio_actual,
+            p.Costo AS costo_actual,
             COALESCE(p.Precio - p.Costo, 0) AS margen_actual,
-            p.ID_Proveedor,
+            p.ID_Proveedor AS id_proveedor,
             prov.Nombre AS nombre_proveedor,
-            p.Estado,
-            CURRENT_DATE AS fecha_inicio,
-            1 AS version,
-            TRUE AS es_actual
+            p.Estado AS estado
         FROM Producto p
         LEFT JOIN Proveedor prov ON p.ID_Proveedor = prov.ID_Proveedor
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.dim_producto dp 
-            WHERE dp.id_producto = p.ID_Producto 
-            AND dp.es_actual = TRUE
-        );
     """)
-    
-    registros = cursor.rowcount
-    log_proceso(f" dim_producto: {registros} registros procesados")
 
 def cargar_dim_servicio(cursor):
     """Carga dimensión Servicio (SCD Type 2)"""
     log_proceso("Cargando dim_servicio...")
     
+    aplicar_scd2(cursor, 'dim_servicio', [
+        'id_servicio', 'nombre', 'descripcion', 'categoria', 'duracion_minutos',
+        'precio_actual', 'costo_actual', 'margen_actual', 'estado'
+    ], """
+        SELECT 
+            s.ID_Servicio_Adicional AS id_servicio,
+            s.Nombre AS nombre,
+            s.Descripcion AS descripcion,
+            s.Categoria AS categoria,
+            s.Duracion_Minutos AS duracion_minutos,
+            s.Precio AS precio_actual,
+            s.Costo AS costo_actual,
+            COALESCE(s.Precio - s.Costo, 0) AS margen_actual,
+            s.Estado AS estado
+        FROM Servicio_Adicional s
+    """)
+
+# ============================================
+# CONTROL DE CARGA INCREMENTAL
+# ============================================
+# Cada hecho guarda en dw.etl_control el último ID de origen extraído; cada
+# corrida lee solo el rango (marca de agua, MAX(ID) actual] por la clave
+# primaria de origen, sin anti-joins contra todo el histórico del hecho.
+# Cada corrida relee además los últimos MARGEN_MARCA_AGUA IDs bajo la marca
+# (ON CONFLICT omite los ya cargados), y las filas del rango que no llegaron
+# al hecho (mes fuera de dw.dim_tiempo o sin versión actual en una
+# dimensión) quedan en dw.etl_pendientes y se vuelven a intentar en cada corrida.
+#
+# El rango de la corrida se fija en etl_control.id_en_curso y se divide en
+# lotes por mes (dw.dim_tiempo). Cada lote se confirma en su propia
+# transacción y queda registrado en dw.etl_control_lotes: si la corrida falla,
+# la siguiente retoma el mismo rango saltando los meses ya cargados, y la marca
+# de agua solo avanza cuando terminaron todos los lotes.
+
+# Proceso -> tabla/ID/fecha de origen, tabla de hechos, clave degenerada,
+# filtro de las filas del proceso dentro del hecho, condición que une una fila
+# de origen (o) con su fila del hecho (f) y fase de carga. Las mitades
+# de productos y servicios de fact_ventas se cargan por separado y llevan
+# marcas propias sobre el ID de sus líneas de detalle (la fecha sale de la
+# venta): una línea agregada después a una venta ya cargada también se
+# extrae. fact_tratamientos va en la fase 2 porque busca sk_cita en
+# fact_citas.
+HECHOS_INCREMENTALES = {
+    'fact_citas': {
+        'origen': 'Cita', 'id_origen': 'ID_Cita', 'fecha_origen': 'o.Fecha',
+        'hecho': 'dw.fact_citas', 'id_hecho': 'id_cita', 'filtro': 'TRUE',
+        'enlace_hecho': 'f.id_cita = o.ID_Cita AND f.fecha = o.Fecha', 'fase': 1
+    },
+    'fact_ventas_productos': {
+        'origen': 'DetalleVenta', 'id_origen': 'ID_Detalle', 'fecha_origen': 'v.Fecha',
+        'union_origen': 'INNER JOIN Venta v ON v.ID_Venta = o.ID_Venta',
+        'hecho': 'dw.fact_ventas', 'id_hecho': 'numero_linea', 'filtro': "tipo_venta = 'Producto'",
+        'enlace_hecho': "f.id_venta = o.ID_Venta AND f.tipo_venta = 'Producto' "
+                        "AND f.numero_linea = o.ID_Detalle AND f.fecha = v.Fecha::DATE",
+        'fase': 1
+    },
+    'fact_ventas_servicios': {
+        'origen': 'DetalleServicio', 'id_origen': 'ID_Detalle_Servicio', 'fecha_origen': 'v.Fecha',
+        'union_origen': 'INNER JOIN Venta v ON v.ID_Venta = o.ID_Venta',
+        'hecho': 'dw.fact_ventas', 'id_hecho': 'numero_linea', 'filtro': "tipo_venta = 'Servicio'",
+        'enlace_hecho': "f.id_venta = o.ID_Venta AND f.tipo_venta = 'Servicio' "
+                        "AND f.numero_linea = o.ID_Detalle_Servicio AND f.fecha = v.Fecha::DATE",
+        'fase': 1
+    },
+    'fact_tratamientos': {
+        'origen': 'Tratamiento', 'id_origen': 'ID_Tratamiento', 'fecha_origen': 'o.Fecha_Inicio',
+        'hecho': 'dw.fact_tratamientos', 'id_hecho': 'id_tratamiento', 'filtro': 'TRUE',
+        'enlace_hecho': 'f.id_tratamiento = o.ID_Tratamiento AND f.fecha = o.Fecha_Inicio::DATE', 'fase': 2
+    }
+}
+
+# Tablas de control y secuencia de corridas (definidas en schema_datawarehouse.sql)
+OBJETOS_CONTROL_ETL = ['etl_control', 'etl_control_lotes', 'etl_pendientes', 'etl_corrida_seq', 'etl_run_log']
+
+def asegurar_control_etl(cursor):
+    """Crea las tablas de control (y el historial de corridas) que falten en Data Warehouses anteriores"""
+    cursor.execute(
+        "SELECT t FROM UNNEST(%s::TEXT[]) AS t WHERE to_regclass('dw.' || t) IS NULL;", (OBJETOS_CONTROL_ETL,)
+    )
+    faltantes = [fila[0] for fila in cursor.fetchall()]
+    if faltantes:
+        log_proceso(f" Creando {', '.join(faltantes)} desde schema_datawarehouse.sql...")
+        cursor.execute('\n'.join(sentencias_esquema(faltantes)))
+    
+    # etl_control anterior a la reanudación de corridas
     cursor.execute("""
-        UPDATE dw.dim_servicio ds
-        SET fecha_fin = CURRENT_DATE - 1, es_actual = FALSE
-        WHERE ds.es_actual = TRUE
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'dw' AND table_name = 'etl_control' AND column_name = 'id_en_curso';
+    """)
+    if cursor.fetchone() is None:
+        log_proceso(" Agregando dw.etl_control.id_en_curso (esquema anterior a la reanudación)...")
+        cursor.execute("ALTER TABLE dw.etl_control ADD COLUMN id_en_curso BIGINT;")
+
+def asegurar_fecha_hechos(cursor):
+    """Agrega la columna fecha a hechos de Data Warehouses anteriores al particionado"""
+    cursor.execute("""
+        SELECT t.table_name
+        FROM information_schema.tables t
+        WHERE t.table_schema = 'dw' AND t.table_name IN ('fact_citas', 'fact_ventas', 'fact_tratamientos')
         AND NOT EXISTS (
-            SELECT 1 FROM Servicio_Adicional s WHERE s.ID_Servicio_Adicional = ds.id_servicio
+            SELECT 1 FROM information_schema.columns c
+            WHERE c.table_schema = 'dw' AND c.table_name = t.table_name AND c.column_name = 'fecha'
         );
     """)
+    for (tabla,) in cursor.fetchall():
+        log_proceso(f" Agregando dw.{tabla}.fecha (esquema anterior al particionado)...")
+        cursor.execute(f"ALTER TABLE dw.{tabla} ADD COLUMN fecha DATE;")
+        cursor.execute(f"""
+            UPDATE dw.{tabla} f SET fecha = t.fecha
+            FROM dw.dim_tiempo t
+            WHERE f.sk_tiempo = t.sk_tiempo;
+        """)
+
+# Índices únicos de los que dependen las cargas -> (tabla, columnas, condición):
+# una versión actual por clave natural en cada dimensión (SCD2) y una fila por
+# clave degenerada en cada hecho (ON CONFLICT DO NOTHING)
+INDICES_UNICOS = {
+    'idx_dim_cliente_id_actual': ('dim_cliente', 'id_cliente', 'es_actual = TRUE'),
+    'idx_dim_mascota_id_actual': ('dim_mascota', 'id_mascota', 'es_actual = TRUE'),
+    'idx_dim_veterinario_id_actual': ('dim_veterinario', 'id_veterinario', 'es_actual = TRUE'),
+    'idx_dim_sede_id_actual': ('dim_sede', 'id_sede', 'es_actual = TRUE'),
+    'idx_dim_producto_id_actual': ('dim_producto', 'id_producto', 'es_actual = TRUE'),
+    'idx_dim_servicio_id_actual': ('dim_servicio', 'id_servicio', 'es_actual = TRUE'),
+    'idx_fact_citas_clave': ('fact_citas', 'id_cita, fecha', None),
+    'idx_fact_ventas_clave': ('fact_ventas', 'id_venta, tipo_venta, numero_linea, fecha', None),
+    'idx_fact_trat_clave': ('fact_tratamientos', 'id_tratamiento, fecha', None)
+}
+
+def asegurar_indices_unicos(cursor):
+    """Crea los índices únicos en Data Warehouses anteriores y verifica que existan y sean válidos
+    
+    La creación falla si una dimensión tiene dos versiones actuales de una clave
+    o un hecho filas repetidas: hay que depurarlas antes de cargar.
+    """
+    for nombre, (tabla, columnas, condicion) in INDICES_UNICOS.items():
+        cursor.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS {nombre} ON dw.{tabla}({columnas})
+            {f'WHERE {condicion}' if condicion else ''};
+        """)
     
     cursor.execute("""
-        INSERT INTO dw.dim_servicio (
-            id_servicio, nombre, descripcion, categoria, duracion_minutos,
-            precio_actual, costo_actual, margen_actual, estado,
-            fecha_inicio, version, es_actual
+        SELECT c.relname
+        FROM pg_index i
+        INNER JOIN pg_class c ON i.indexrelid = c.oid
+        INNER JOIN pg_namespace n ON c.relnamespace = n.oid
+        WHERE n.nspname = 'dw' AND i.indisunique AND i.indisvalid
+        AND c.relname = ANY(%s);
+    """, (list(INDICES_UNICOS),))
+    faltantes = sorted(set(INDICES_UNICOS) - {fila[0] for fila in cursor.fetchall()})
+    if faltantes:
+        raise RuntimeError(f"Índices únicos faltantes o inválidos en dw: {', '.join(faltantes)}")
+
+def particiones_de_lotes(cursor, lotes):
+    """Particiones que escribieron los lotes (o el hecho, si no está particionado)"""
+    tablas = set()
+    for lote in lotes:
+        hecho = HECHOS_INCREMENTALES[lote['proceso']]['hecho']
+        cursor.execute(
+            "SELECT COALESCE(to_regclass(%s), to_regclass(%s))::TEXT;",
+            (f"{hecho}_{lote['inicio']:%Y_%m}", hecho)
         )
-        SELECT 
-            s.ID_Servicio_Adicional,
-            s.Nombre,
-            s.Descripcion,
-            s.Categoria,
-            s.Duracion_Minutos,
-            s.Precio,
-            s.Costo,
-            COALESCE(s.Precio - s.Costo, 0) AS margen_actual,
-            s.Estado,
-            CURRENT_DATE AS fecha_inicio,
-            1 AS version,
-            TRUE AS es_actual
-        FROM Servicio_Adicional s
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.dim_servicio ds 
-            WHERE ds.id_servicio = s.ID_Servicio_Adicional 
-            AND ds.es_actual = TRUE
-        );
+        tablas.add(cursor.fetchone()[0])
+    return tablas
+
+def asegurar_particiones(cursor, lotes):
+    """Crea las particiones mensuales de los lotes a cargar y de los próximos meses
+    
+    Se ejecuta en la conexión principal antes de la carga en paralelo, para que
+    dos lotes del mismo mes no intenten crear la misma partición a la vez.
+    """
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_partitioned_table p
+        INNER JOIN pg_class c ON p.partrelid = c.oid
+        INNER JOIN pg_namespace n ON c.relnamespace = n.oid
+        WHERE n.nspname = 'dw';
     """)
+    particionadas = {fila[0] for fila in cursor.fetchall()}
+    
+    meses = {(HECHOS_INCREMENTALES[lote['proceso']]['hecho'].split('.')[-1], lote['inicio']) for lote in lotes}
+    for tabla, inicio in sorted(meses):
+        if tabla in particionadas:
+            cursor.execute("SELECT dw.asegurar_particion_mensual(%s, %s);", (tabla, inicio))
     
-    registros = cursor.rowcount
-    log_proceso(f" dim_servicio: {registros} registros procesados")
+    for tabla in sorted(particionadas):
+        cursor.execute("""
+            SELECT dw.asegurar_particion_mensual(%s, (DATE_TRUNC('month', CURRENT_DATE) + n * INTERVAL '1 month')::DATE)
+            FROM generate_series(0, %s) AS n;
+        """, (tabla, MESES_PARTICION_ADELANTO))
+
+def extender_dim_tiempo(cursor):
+    """Extiende dw.dim_tiempo hasta el último mes con partición creada por adelantado
+    
+    Los lotes se planifican por los meses de dim_tiempo: sin esta extensión, las
+    filas de origen posteriores a su última fecha quedarían pendientes.
+    """
+    cursor.execute("SELECT to_regprocedure('dw.extender_dim_tiempo(date)') IS NULL;")
+    if cursor.fetchone()[0]:
+        log_proceso(" Creando dw.extender_dim_tiempo desde schema_datawarehouse.sql...")
+        cursor.execute('\n'.join(sentencias_esquema(['extender_dim_tiempo'])))
+    
+    cursor.execute("""
+        SELECT dw.extender_dim_tiempo(
+            (DATE_TRUNC('month', CURRENT_DATE) + (%s + 1) * INTERVAL '1 month')::DATE - 1
+        );
+    """, (MESES_PARTICION_ADELANTO,))
+    agregados = cursor.fetchone()[0]
+    if agregados:
+        log_proceso(f" dw.dim_tiempo extendida en {agregados:,} días")
+
+def obtener_rango_pendiente(cursor, proceso):
+    """Fija el rango (desde, hasta] de IDs de origen de la corrida; retoma una corrida interrumpida
+    
+    desde queda MARGEN_MARCA_AGUA IDs por debajo de la marca de agua. Devuelve
+    también los IDs pendientes de corridas anteriores (dw.etl_pendientes).
+    """
+    hecho = HECHOS_INCREMENTALES[proceso]
+    
+    cursor.execute("SELECT id_origen FROM dw.etl_pendientes WHERE proceso = %s ORDER BY id_origen", (proceso,))
+    pendientes = [fila[0] for fila in cursor.fetchall()]
+    
+    cursor.execute("SELECT ultimo_id, id_en_curso FROM dw.etl_control WHERE proceso = %s", (proceso,))
+    fila = cursor.fetchone()
+    if fila and fila[1] is not None:
+        log_proceso(f" {proceso}: retomando corrida interrumpida")
+        return max(fila[0] - MARGEN_MARCA_AGUA, 0), fila[1], pendientes
+    
+    if fila:
+        ultimo_id = fila[0]
+    else:
+        # Primera corrida incremental: se parte de lo que ya contenga el hecho
+        cursor.execute(f"SELECT COALESCE(MAX({hecho['id_hecho']}), 0) FROM {hecho['hecho']} WHERE {hecho['filtro']}")
+        ultimo_id = cursor.fetchone()[0]
+    
+    cursor.execute(f"SELECT COALESCE(MAX({hecho['id_origen']}), 0) FROM {hecho['origen']}")
+    hasta = max(cursor.fetchone()[0], ultimo_id)
+    
+    cursor.execute("""
+        INSERT INTO dw.etl_control (proceso, tabla_origen, ultimo_id, id_en_curso)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (proceso) DO UPDATE SET id_en_curso = EXCLUDED.id_en_curso;
+    """, (proceso, hecho['origen'], ultimo_id, hasta))
+    cursor.execute("DELETE FROM dw.etl_control_lotes WHERE proceso = %s;", (proceso,))
+    return max(ultimo_id - MARGEN_MARCA_AGUA, 0), hasta, pendientes
+
+def planificar_lotes(cursor, proceso, desde, hasta, pendientes):
+    """Divide el rango y los pendientes en lotes por mes, omitiendo los meses ya confirmados en esta corrida"""
+    hecho = HECHOS_INCREMENTALES[proceso]
+    
+    cursor.execute(f"""
+        SELECT t.mes_anio, MIN(t.fecha), MAX(t.fecha) + 1
+        FROM dw.dim_tiempo t
+        WHERE t.mes_anio IN (
+            SELECT DISTINCT TO_CHAR({hecho['fecha_origen']}, 'YYYY-MM')
+            FROM {hecho['origen']} o
+            {hecho.get('union_origen', '')}
+            WHERE {filas_del_rango(f"o.{hecho['id_origen']}")}
+        )
+        AND t.mes_anio NOT IN (
+            SELECT mes_anio FROM dw.etl_control_lotes WHERE proceso = %(proceso)s
+        )
+        GROUP BY t.mes_anio
+        ORDER BY t.mes_anio;
+    """, {'desde': desde, 'hasta': hasta, 'pendientes': pendientes, 'proceso': proceso})
+    
+    return [
+        {'proceso': proceso, 'mes': mes, 'inicio': inicio, 'fin': fin,
+         'desde': desde, 'hasta': hasta, 'pendientes': pendientes}
+        for mes, inicio, fin in cursor.fetchall()
+    ]
+
+def guardar_marca_agua(cursor, proceso, desde, hasta, pendientes):
+    """Cierra la corrida de un hecho: guarda sus pendientes, avanza la marca de agua y limpia sus lotes
+    
+    Pendientes son las filas del rango (y las pendientes que se reintentaron)
+    que no están en el hecho.
+    """
+    hecho = HECHOS_INCREMENTALES[proceso]
+    cursor.execute(f"""
+        DELETE FROM dw.etl_pendientes WHERE proceso = %(proceso)s;
+        
+        INSERT INTO dw.etl_pendientes (proceso, id_origen)
+        SELECT %(proceso)s, o.{hecho['id_origen']}
+        FROM {hecho['origen']} o
+        {hecho.get('union_origen', '')}
+        WHERE {filas_del_rango(f"o.{hecho['id_origen']}")}
+        AND NOT EXISTS (SELECT 1 FROM {hecho['hecho']} f WHERE {hecho['enlace_hecho']});
+    """, {'proceso': proceso, 'desde': desde, 'hasta': hasta, 'pendientes': pendientes})
+    if cursor.rowcount:
+        log_proceso(f" {proceso}: {cursor.rowcount} filas sin cargar quedan pendientes para la próxima corrida")
+    
+    cursor.execute("""
+        UPDATE dw.etl_control SET
+            ultimo_id = %(ultimo_id)s,
+            id_en_curso = NULL,
+            filas_ultima_carga = (
+                SELECT COALESCE(SUM(filas), 0) FROM dw.etl_control_lotes WHERE proceso = %(proceso)s
+            ),
+            fecha_ultima_carga = CURRENT_TIMESTAMP
+        WHERE proceso = %(proceso)s;
+        
+        DELETE FROM dw.etl_control_lotes WHERE proceso = %(proceso)s;
+    """, {'proceso': proceso, 'ultimo_id': hasta})
+
+def reiniciar_hechos(cursor):
+    """Recarga completa (backfill): vacía los hechos incrementales y sus marcas de agua"""
+    log_proceso("Recarga completa: vaciando hechos y marcas de agua...")
+    
+    # CASCADE: en esquemas anteriores dw.fact_tratamientos tiene FK a dw.fact_citas
+    cursor.execute("TRUNCATE dw.fact_citas, dw.fact_ventas, dw.fact_tratamientos RESTART IDENTITY CASCADE;")
+    cursor.execute(f"TRUNCATE {', '.join(TABLAS_AGREGADOS)};")
+    cursor.execute(
+        "DELETE FROM dw.etl_control WHERE proceso = ANY(%(procesos)s);"
+        "DELETE FROM dw.etl_control_lotes WHERE proceso = ANY(%(procesos)s);"
+        "DELETE FROM dw.etl_pendientes WHERE proceso = ANY(%(procesos)s);",
+        {'procesos': list(HECHOS_INCREMENTALES)}
+    )
 
 # ============================================
 # CARGA DE HECHOS
 # ============================================
+# Cada función carga un lote: las filas de origen con ID en (desde, hasta] o
+# entre los pendientes, y fecha en [inicio, fin) (un mes de dw.dim_tiempo).
+#
+# Citas y ventas se extraen solo del OLTP, con la clave natural (id_<dimensión>)
+# de cada dimensión, y las claves sustitutas se resuelven después contra las
+# versiones actuales: en SQL por defecto, o en memoria con --claves-en-memoria.
+#
+# Los INSERT llevan ON CONFLICT DO NOTHING sobre la clave degenerada única
+# (INDICES_UNICOS): repetir un lote ya cargado no duplica filas.
 
-def cargar_fact_citas(cursor):
-    """Carga tabla de hechos de Citas"""
-    log_proceso("Cargando fact_citas...")
-    
-    cursor.execute("""
-        INSERT INTO dw.fact_citas (
-            sk_tiempo, sk_cliente, sk_mascota, sk_veterinario, sk_sede,
-            id_cita, hora_cita, motivo, estado, duracion_minutos, costo_cita,
-            es_primera_cita, es_emergencia, es_control, asistio
+def filas_del_rango(columna):
+    """Condición SQL de las filas de origen de un lote: ID en (desde, hasta] o pendiente"""
+    return f"({columna} > %(desde)s AND {columna} <= %(hasta)s OR {columna} = ANY(%(pendientes)s))"
+
+EXTRACCION_CITAS = f"""
+        WITH primera_visita AS (
+            -- Primera fecha de visita de cada mascota con citas en el lote
+            -- (un MIN agrupado por mascota en vez de un COUNT correlacionado por cita)
+            SELECT c2.ID_Mascota, MIN(c2.Fecha) AS fecha_primera
+            FROM Cita c2
+            WHERE c2.ID_Mascota IN (
+                SELECT ID_Mascota FROM Cita
+                WHERE {filas_del_rango('ID_Cita')}
+                AND Fecha >= %(inicio)s AND Fecha < %(fin)s
+            )
+            GROUP BY c2.ID_Mascota
         )
         SELECT 
-            t.sk_tiempo,
-            dc.sk_cliente,
-            dm.sk_mascota,
-            dv.sk_veterinario,
-            ds.sk_sede,
-            c.ID_Cita,
-            c.Hora,
-            c.Motivo,
-            c.Estado,
-            c.Duracion_Minutos,
-            c.Costo,
+            c.Fecha AS fecha,
+            m.ID_Cliente AS id_cliente,
+            c.ID_Mascota AS id_mascota,
+            c.ID_Veterinario AS id_veterinario,
+            c.ID_Sede AS id_sede,
+            c.ID_Cita AS id_cita,
+            c.Hora AS hora_cita,
+            c.Motivo AS motivo,
+            c.Estado AS estado,
+            c.Duracion_Minutos AS duracion_minutos,
+            c.Costo AS costo_cita,
             -- Flags analíticos
-            (SELECT COUNT(*) FROM Cita c2 
-             WHERE c2.ID_Mascota = c.ID_Mascota 
-             AND c2.Fecha < c.Fecha) = 0 AS es_primera_cita,
-            c.Motivo LIKE '%mergencia%' AS es_emergencia,
-            c.Motivo LIKE '%ontrol%' AS es_control,
+            c.Fecha = pv.fecha_primera AS es_primera_cita,
+            c.Motivo LIKE '%%mergencia%%' AS es_emergencia,
+            c.Motivo LIKE '%%ontrol%%' AS es_control,
             c.Estado = 'Completada' AS asistio
         FROM Cita c
-        INNER JOIN dw.dim_tiempo t ON c.Fecha = t.fecha
+        INNER JOIN primera_visita pv ON c.ID_Mascota = pv.ID_Mascota
         INNER JOIN Mascota m ON c.ID_Mascota = m.ID_Mascota
-        INNER JOIN dw.dim_mascota dm ON m.ID_Mascota = dm.id_mascota AND dm.es_actual = TRUE
-        INNER JOIN Cliente cl ON m.ID_Cliente = cl.ID_Cliente
-        INNER JOIN dw.dim_cliente dc ON cl.ID_Cliente = dc.id_cliente AND dc.es_actual = TRUE
-        INNER JOIN dw.dim_veterinario dv ON c.ID_Veterinario = dv.id_veterinario AND dv.es_actual = TRUE
-        INNER JOIN dw.dim_sede ds ON c.ID_Sede = ds.id_sede AND ds.es_actual = TRUE
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.fact_citas fc WHERE fc.id_cita = c.ID_Cita
-        );
-    """)
-    
-    registros = cursor.rowcount
-    log_proceso(f" fact_citas: {registros} registros procesados")
+        WHERE {filas_del_rango('c.ID_Cita')}
+        AND c.Fecha >= %(inicio)s AND c.Fecha < %(fin)s
+"""
 
-def cargar_fact_ventas(cursor):
-    """Carga tabla de hechos de Ventas"""
-    log_proceso("Cargando fact_ventas...")
-    
-    # Ventas de productos
-    cursor.execute("""
-        INSERT INTO dw.fact_ventas (
-            sk_tiempo, sk_cliente, sk_sede, sk_producto, sk_servicio,
-            id_venta, numero_linea, tipo_venta, tipo_pago, estado,
-            cantidad, precio_unitario, costo_unitario, subtotal, descuento, total,
-            margen_unitario, margen_total
-        )
+EXTRACCION_VENTAS_PRODUCTOS = f"""
         SELECT 
-            t.sk_tiempo,
-            dc.sk_cliente,
-            ds.sk_sede,
-            dp.sk_producto,
-            NULL AS sk_servicio,
-            v.ID_Venta,
+            v.Fecha::DATE AS fecha,
+            v.ID_Cliente AS id_cliente,
+            v.ID_Sede AS id_sede,
+            p.ID_Producto AS id_producto,
+            v.ID_Venta AS id_venta,
             dv.ID_Detalle AS numero_linea,
             'Producto' AS tipo_venta,
-            v.Tipo_Pago,
-            v.Estado,
-            dv.Cantidad,
-            dv.Precio_Unitario,
+            v.Tipo_Pago AS tipo_pago,
+            v.Estado AS estado,
+            dv.Cantidad AS cantidad,
+            dv.Precio_Unitario AS precio_unitario,
             COALESCE(p.Costo, 0) AS costo_unitario,
-            dv.Subtotal,
-            COALESCE(dv.Descuento, 0),
+            dv.Subtotal AS subtotal,
+            COALESCE(dv.Descuento, 0) AS descuento,
             dv.Subtotal - COALESCE(dv.Descuento, 0) AS total,
             dv.Precio_Unitario - COALESCE(p.Costo, 0) AS margen_unitario,
             (dv.Precio_Unitario - COALESCE(p.Costo, 0)) * dv.Cantidad AS margen_total
         FROM Venta v
         INNER JOIN DetalleVenta dv ON v.ID_Venta = dv.ID_Venta
         INNER JOIN Producto p ON dv.ID_Producto = p.ID_Producto
-        INNER JOIN dw.dim_tiempo t ON v.Fecha::DATE = t.fecha
-        INNER JOIN dw.dim_cliente dc ON v.ID_Cliente = dc.id_cliente AND dc.es_actual = TRUE
-        INNER JOIN dw.dim_sede ds ON v.ID_Sede = ds.id_sede AND ds.es_actual = TRUE
-        INNER JOIN dw.dim_producto dp ON p.ID_Producto = dp.id_producto AND dp.es_actual = TRUE
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.fact_ventas fv 
-            WHERE fv.id_venta = v.ID_Venta 
-            AND fv.numero_linea = dv.ID_Detalle
-            AND fv.tipo_venta = 'Producto'
-        );
-    """)
-    
-    registros_productos = cursor.rowcount
-    
-    # Ventas de servicios
-    cursor.execute("""
-        INSERT INTO dw.fact_ventas (
-            sk_tiempo, sk_cliente, sk_sede, sk_producto, sk_servicio,
-            id_venta, numero_linea, tipo_venta, tipo_pago, estado,
-            cantidad, precio_unitario, costo_unitario, subtotal, descuento, total,
-            margen_unitario, margen_total
-        )
+        WHERE {filas_del_rango('dv.ID_Detalle')}
+        AND v.Fecha >= %(inicio)s AND v.Fecha < %(fin)s
+"""
+
+EXTRACCION_VENTAS_SERVICIOS = f"""
         SELECT 
-            t.sk_tiempo,
-            dc.sk_cliente,
-            ds.sk_sede,
-            NULL AS sk_producto,
-            dsv.sk_servicio,
-            v.ID_Venta,
+            v.Fecha::DATE AS fecha,
+            v.ID_Cliente AS id_cliente,
+            v.ID_Sede AS id_sede,
+            s.ID_Servicio_Adicional AS id_servicio,
+            v.ID_Venta AS id_venta,
             dsrv.ID_Detalle_Servicio AS numero_linea,
             'Servicio' AS tipo_venta,
-            v.Tipo_Pago,
-            v.Estado,
-            dsrv.Cantidad,
-            dsrv.Precio_Unitario,
+            v.Tipo_Pago AS tipo_pago,
+            v.Estado AS estado,
+            dsrv.Cantidad AS cantidad,
+            dsrv.Precio_Unitario AS precio_unitario,
             COALESCE(s.Costo, 0) AS costo_unitario,
-            dsrv.Subtotal,
+            dsrv.Subtotal AS subtotal,
             0 AS descuento,
             dsrv.Subtotal AS total,
             dsrv.Precio_Unitario - COALESCE(s.Costo, 0) AS margen_unitario,
@@ -483,29 +966,864 @@ def cargar_fact_ventas(cursor):
         FROM Venta v
         INNER JOIN DetalleServicio dsrv ON v.ID_Venta = dsrv.ID_Venta
         INNER JOIN Servicio_Adicional s ON dsrv.ID_Servicio_Adicional = s.ID_Servicio_Adicional
-        INNER JOIN dw.dim_tiempo t ON v.Fecha::DATE = t.fecha
-        INNER JOIN dw.dim_cliente dc ON v.ID_Cliente = dc.id_cliente AND dc.es_actual = TRUE
-        INNER JOIN dw.dim_sede ds ON v.ID_Sede = ds.id_sede AND ds.es_actual = TRUE
-        INNER JOIN dw.dim_servicio dsv ON s.ID_Servicio_Adicional = dsv.id_servicio AND dsv.es_actual = TRUE
-        WHERE NOT EXISTS (
-            SELECT 1 FROM dw.fact_ventas fv 
-            WHERE fv.id_venta = v.ID_Venta 
-            AND fv.numero_linea = dsrv.ID_Detalle_Servicio
-            AND fv.tipo_venta = 'Servicio'
-        );
+        WHERE {filas_del_rango('dsrv.ID_Detalle_Servicio')}
+        AND v.Fecha >= %(inicio)s AND v.Fecha < %(fin)s
+"""
+
+# Proceso -> consulta de extracción, dimensiones cuyas claves naturales siguen a
+# la fecha (en ese orden) y columnas restantes, que pasan tal cual al hecho
+EXTRACCION_HECHOS = {
+    'fact_citas': {
+        'consulta': EXTRACCION_CITAS,
+        'dimensiones': ['cliente', 'mascota', 'veterinario', 'sede'],
+        'columnas': [
+            'id_cita', 'hora_cita', 'motivo', 'estado', 'duracion_minutos', 'costo_cita',
+            'es_primera_cita', 'es_emergencia', 'es_control', 'asistio'
+        ]
+    },
+    'fact_ventas_productos': {
+        'consulta': EXTRACCION_VENTAS_PRODUCTOS,
+        'dimensiones': ['cliente', 'sede', 'producto'],
+        'columnas': [
+            'id_venta', 'numero_linea', 'tipo_venta', 'tipo_pago', 'estado',
+            'cantidad', 'precio_unitario', 'costo_unitario', 'subtotal', 'descuento', 'total',
+            'margen_unitario', 'margen_total'
+        ]
+    },
+    'fact_ventas_servicios': {
+        'consulta': EXTRACCION_VENTAS_SERVICIOS,
+        'dimensiones': ['cliente', 'sede', 'servicio'],
+        'columnas': [
+            'id_venta', 'numero_linea', 'tipo_venta', 'tipo_pago', 'estado',
+            'cantidad', 'precio_unitario', 'costo_unitario', 'subtotal', 'descuento', 'total',
+            'margen_unitario', 'margen_total'
+        ]
+    }
+}
+
+def columnas_hecho(proceso):
+    """Columnas que carga un proceso: fecha, claves sustitutas y atributos"""
+    extraccion = EXTRACCION_HECHOS[proceso]
+    return (['fecha', 'sk_tiempo'] + [f"sk_{dim}" for dim in extraccion['dimensiones']]
+            + extraccion['columnas'])
+
+def cargar_lote_extraido(cursor, lote):
+    """Carga un lote de citas o ventas resolviendo las claves sustitutas en SQL"""
+    proceso = lote['proceso']
+    extraccion = EXTRACCION_HECHOS[proceso]
+    
+    seleccion = (['e.fecha', 't.sk_tiempo'] + [f"d_{dim}.sk_{dim}" for dim in extraccion['dimensiones']]
+                 + [f"e.{columna}" for columna in extraccion['columnas']])
+    uniones = "\n        ".join(
+        f"INNER JOIN dw.dim_{dim} d_{dim} ON e.id_{dim} = d_{dim}.id_{dim} AND d_{dim}.es_actual = TRUE"
+        for dim in extraccion['dimensiones']
+    )
+    hecho = HECHOS_INCREMENTALES[proceso]['hecho']
+    return ejecutar_medido(cursor, f"{proceso} {lote['mes']}", hecho, 'INSERT', f"""
+        INSERT INTO {hecho} ({', '.join(columnas_hecho(proceso))})
+        SELECT {', '.join(seleccion)}
+        FROM ({extraccion['consulta']}) e
+        INNER JOIN dw.dim_tiempo t ON e.fecha = t.fecha
+        {uniones}
+        ON CONFLICT DO NOTHING;
+    """, lote)
+
+def cargar_lote_tratamientos(cursor, lote):
+    """Carga un lote mensual de la tabla de hechos de Tratamientos"""
+    return ejecutar_medido(cursor, f"fact_tratamientos {lote['mes']}", 'dw.fact_tratamientos', 'INSERT', f"""
+        WITH tratamientos AS (
+            SELECT 
+                tr.*,
+                COALESCE(
+                    tr.Fecha_Fin::DATE - tr.Fecha_Inicio::DATE,
+                    NULLIF(REGEXP_REPLACE(tr.Duracion, '[^0-9]', '', 'g'), '')::INTEGER
+                ) AS duracion_dias
+            FROM Tratamiento tr
+            WHERE {filas_del_rango('tr.ID_Tratamiento')}
+            AND tr.Fecha_Inicio >= %(inicio)s AND tr.Fecha_Inicio < %(fin)s
+        ),
+        diagnosticos AS (
+            -- Último diagnóstico del historial de cada cita del lote
+            SELECT DISTINCT ON (h.ID_Cita) h.ID_Cita, h.Diagnostico
+            FROM Historial_Medico h
+            WHERE h.ID_Cita IN (SELECT ID_Cita FROM tratamientos)
+            ORDER BY h.ID_Cita, h.Fecha DESC
+        )
+        INSERT INTO dw.fact_tratamientos (
+            fecha, sk_tiempo, sk_mascota, sk_veterinario, sk_cita,
+            id_tratamiento, descripcion, medicamento, diagnostico, estado,
+            duracion_dias, costo_tratamiento, es_cronico, requiere_seguimiento
+        )
+        SELECT 
+            tr.Fecha_Inicio::DATE,
+            t.sk_tiempo,
+            dm.sk_mascota,
+            dv.sk_veterinario,
+            fc.sk_cita,
+            tr.ID_Tratamiento,
+            tr.Descripcion,
+            tr.Medicamento,
+            LEFT(dg.Diagnostico, 200),
+            tr.Estado,
+            tr.duracion_dias,
+            tr.Costo,
+            -- Flags: crónico si dura 30 días o más; seguimiento si no se completó
+            tr.duracion_dias >= 30 AS es_cronico,
+            tr.Estado <> 'Completado' AS requiere_seguimiento
+        FROM tratamientos tr
+        INNER JOIN Cita c ON tr.ID_Cita = c.ID_Cita
+        INNER JOIN dw.dim_tiempo t ON tr.Fecha_Inicio::DATE = t.fecha
+        INNER JOIN dw.dim_mascota dm ON c.ID_Mascota = dm.id_mascota AND dm.es_actual = TRUE
+        INNER JOIN dw.dim_veterinario dv ON c.ID_Veterinario = dv.id_veterinario AND dv.es_actual = TRUE
+        -- sk_cita por la clave degenerada (y la fecha, que poda las particiones)
+        LEFT JOIN dw.fact_citas fc ON fc.id_cita = c.ID_Cita AND fc.fecha = c.Fecha
+        LEFT JOIN diagnosticos dg ON tr.ID_Cita = dg.ID_Cita
+        ON CONFLICT DO NOTHING;
+    """, lote)
+
+CARGAS_LOTE = {
+    'fact_citas': cargar_lote_extraido,
+    'fact_ventas_productos': cargar_lote_extraido,
+    'fact_ventas_servicios': cargar_lote_extraido,
+    'fact_tratamientos': cargar_lote_tratamientos
+}
+
+# ============================================
+# RESOLUCIÓN DE CLAVES EN MEMORIA
+# ============================================
+# Con --claves-en-memoria los mapas clave natural -> clave sustituta de cada
+# dimensión se leen una vez por corrida; cada lote de citas o ventas se extrae
+# solo del OLTP, se resuelve en el cliente y se carga con COPY (a una tabla
+# temporal, que pasa al hecho con ON CONFLICT DO NOTHING), sin unir con las
+# dimensiones en cada lote. sk_tiempo se calcula desde la fecha.
+# fact_tratamientos se sigue cargando en SQL: su sk_cita sale de fact_citas.
+
+# Un mapa usa array si el ID máximo no supera este múltiplo de las filas (IDs densos)
+DENSIDAD_MINIMA_ARRAY = 4
+
+class MapaClaves:
+    """Clave natural entera -> clave sustituta de la versión actual de una dimensión
+    
+    Con IDs densos (SERIAL) es un array indexado por el ID (4 bytes por ID,
+    0 = sin versión actual); con IDs dispersos, un dict.
+    """
+    
+    def __init__(self, pares):
+        maximo = max((natural for natural, _ in pares), default=0)
+        if maximo <= DENSIDAD_MINIMA_ARRAY * len(pares):
+            self.claves = array('i', bytes(4 * (maximo + 1)))
+            for natural, sustituta in pares:
+                self.claves[natural] = sustituta
+        else:
+            self.claves = dict(pares)
+    
+    def get(self, natural):
+        if isinstance(self.claves, dict):
+            return self.claves.get(natural)
+        if natural is None or not 0 <= natural < len(self.claves):
+            return None
+        return self.claves[natural] or None
+
+class CalendarioClaves:
+    """Fecha -> sk_tiempo calculado: sk_base + días desde la primera fecha de dw.dim_tiempo
+    
+    Solo si dim_tiempo es un rango de fechas sin huecos numerado en orden
+    (como lo crea schema_datawarehouse.sql); si no, usa un dict fecha -> sk.
+    """
+    
+    def __init__(self, cursor):
+        cursor.execute("""
+            SELECT MIN(fecha), MAX(fecha), MIN(sk_tiempo), COUNT(*),
+                   COUNT(*) FILTER (WHERE sk_tiempo - (SELECT MIN(sk_tiempo) FROM dw.dim_tiempo)
+                                    <> fecha - (SELECT MIN(fecha) FROM dw.dim_tiempo))
+            FROM dw.dim_tiempo
+        """)
+        self.inicio, self.final, self.sk_base, total, desfasadas = cursor.fetchone()
+        self.aritmetico = (
+            self.inicio is not None and desfasadas == 0
+            and total == (self.final - self.inicio).days + 1
+        )
+        if not self.aritmetico:
+            cursor.execute("SELECT fecha, sk_tiempo FROM dw.dim_tiempo")
+            self.claves = dict(cursor.fetchall())
+    
+    def get(self, fecha):
+        if not self.aritmetico:
+            return self.claves.get(fecha)
+        if fecha is None or not self.inicio <= fecha <= self.final:
+            return None
+        return self.sk_base + (fecha - self.inicio).days
+
+def cargar_mapas_claves(cursor):
+    """Lee los mapas de claves de las dimensiones (versiones actuales) y de dim_tiempo"""
+    inicio = time.perf_counter()
+    dimensiones = {dim for extraccion in EXTRACCION_HECHOS.values() for dim in extraccion['dimensiones']}
+    
+    mapas = {}
+    for dim in sorted(dimensiones):
+        cursor.execute(f"SELECT id_{dim}, sk_{dim} FROM dw.dim_{dim} WHERE es_actual = TRUE")
+        mapas[dim] = MapaClaves(cursor.fetchall())
+    mapas['tiempo'] = CalendarioClaves(cursor)
+    
+    tipos = ', '.join(
+        f"{dim}: {'array' if isinstance(mapa.claves, array) else 'dict'}"
+        for dim, mapa in mapas.items() if dim != 'tiempo'
+    )
+    log_proceso(f" Mapas de claves en memoria ({tipos}; tiempo: "
+                f"{'aritmético' if mapas['tiempo'].aritmetico else 'dict'}) "
+                f"en {time.perf_counter() - inicio:.2f}s")
+    return mapas
+
+def cargar_lote_en_memoria(cursor, lote, mapas):
+    """Carga un lote de citas o ventas resolviendo las claves en el cliente y con COPY
+    
+    Descarta las filas sin versión actual en alguna dimensión o fuera de
+    dim_tiempo, igual que los INNER JOIN de cargar_lote_extraido. COPY no admite
+    ON CONFLICT: el lote se copia a una tabla temporal y de ahí pasa al hecho
+    con INSERT ... ON CONFLICT DO NOTHING, así que reintentar un lote ya
+    cargado no falla.
+    """
+    proceso = lote['proceso']
+    hecho = HECHOS_INCREMENTALES[proceso]['hecho']
+    extraccion = EXTRACCION_HECHOS[proceso]
+    tiempo = mapas['tiempo']
+    mapas_lote = [mapas[dim] for dim in extraccion['dimensiones']]
+    n_claves = len(mapas_lote)
+    inicio = datetime.now()
+    reloj = time.perf_counter()
+    
+    cursor.execute(extraccion['consulta'], lote)
+    buffer = io.StringIO()
+    for fila in cursor.fetchall():
+        sk_tiempo = tiempo.get(fila[0])
+        claves = [mapa.get(natural) for mapa, natural in zip(mapas_lote, fila[1:n_claves + 1])]
+        if sk_tiempo is None or None in claves:
+            continue
+        valores = (fila[0], sk_tiempo, *claves, *fila[n_claves + 1:])
+        buffer.write('\t'.join(valor_copy(valor) for valor in valores))
+        buffer.write('\n')
+    
+    buffer.seek(0)
+    columnas = ', '.join(columnas_hecho(proceso))
+    try:
+        # Solo los tipos de las columnas: sin restricciones ni defaults (no consume sk_*)
+        cursor.execute(f"""
+            CREATE TEMP TABLE copia_lote ON COMMIT DROP AS
+            SELECT {columnas} FROM {hecho} WITH NO DATA;
+        """)
+        cursor.copy_expert(f"COPY copia_lote ({columnas}) FROM STDIN", buffer)
+        cursor.execute(f"""
+            INSERT INTO {hecho} ({columnas})
+            SELECT {columnas} FROM copia_lote
+            ON CONFLICT DO NOTHING;
+        """)
+        filas = cursor.rowcount
+    except Exception as e:
+        registrar_paso(f"{proceso} {lote['mes']}", hecho, 'COPY', inicio, time.perf_counter() - reloj, error=str(e).strip())
+        raise
+    
+    registrar_paso(f"{proceso} {lote['mes']}", hecho, 'COPY', inicio, time.perf_counter() - reloj, filas)
+    return filas
+
+def cargar_lote(cursor, lote, mapas=None):
+    """Carga un lote (proceso, mes) y lo registra en la misma transacción
+    
+    Con lote['reemplazar'] (backfill de un mes) primero borra las filas del mes
+    ya cargadas y no registra el lote en la corrida incremental. Con mapas
+    (cargar_mapas_claves) citas y ventas resuelven sus claves en memoria.
+    """
+    hecho = HECHOS_INCREMENTALES[lote['proceso']]
+    
+    if lote.get('reemplazar'):
+        ejecutar_medido(cursor, f"{lote['proceso']} {lote['mes']} borrar", hecho['hecho'], 'DELETE', f"""
+            DELETE FROM {hecho['hecho']} f
+            WHERE f.fecha >= %(inicio)s AND f.fecha < %(fin)s
+            AND {hecho['filtro']}
+            AND f.{hecho['id_hecho']} <= %(hasta)s;
+        """, lote)
+    
+    inicio = time.perf_counter()
+    if mapas is not None and lote['proceso'] in EXTRACCION_HECHOS:
+        filas = cargar_lote_en_memoria(cursor, lote, mapas)
+    else:
+        filas = CARGAS_LOTE[lote['proceso']](cursor, lote)
+    duracion = time.perf_counter() - inicio
+    
+    if not lote.get('reemplazar'):
+        cursor.execute(
+            "INSERT INTO dw.etl_control_lotes (proceso, mes_anio, filas) VALUES (%s, %s, %s);",
+            (lote['proceso'], lote['mes'], filas)
+        )
+    log_proceso(f" {lote['proceso']} {lote['mes']}: {filas} registros procesados ({filas / max(duracion, 1e-6):,.0f} filas/s)")
+    return filas
+
+def ejecutar_lotes(pool, workers, fase, lotes, mapas=None):
+    """Carga los lotes en paralelo por fases (cada lote en su transacción) y reporta filas/s"""
+    for numero in sorted({HECHOS_INCREMENTALES[lote['proceso']]['fase'] for lote in lotes}):
+        lotes_fase = {
+            f"{lote['proceso']} {lote['mes']}": lote
+            for lote in lotes if HECHOS_INCREMENTALES[lote['proceso']]['fase'] == numero
+        }
+        
+        inicio_fase = datetime.now()
+        inicio = time.perf_counter()
+        resultados = ejecutar_en_paralelo(pool, workers, f"{fase} (fase {numero})", [
+            (nombre, partial(cargar_lote, lote=lote, mapas=mapas)) for nombre, lote in lotes_fase.items()
+        ])
+        duracion = max(time.perf_counter() - inicio, 1e-6)
+        
+        filas_por_proceso = {}
+        for nombre, filas in resultados.items():
+            proceso = lotes_fase[nombre]['proceso']
+            filas_por_proceso[proceso] = filas_por_proceso.get(proceso, 0) + filas
+        for proceso, filas in filas_por_proceso.items():
+            log_proceso(f" {proceso}: {filas} registros en {duracion:.2f}s ({filas / duracion:,.0f} filas/s)")
+            registrar_paso(proceso, HECHOS_INCREMENTALES[proceso]['hecho'], 'TOTAL', inicio_fase, duracion, filas)
+
+def cargar_hechos(conn, cursor, pool, workers, mapas=None):
+    """Planifica los lotes mensuales de cada hecho, los carga y avanza las marcas de agua
+    
+    Devuelve los meses cargados por hecho ({hecho: {(inicio, fin)}}).
+    """
+    rangos = {}
+    lotes = []
+    for proceso in HECHOS_INCREMENTALES:
+        desde, hasta, pendientes = obtener_rango_pendiente(cursor, proceso)
+        lotes_proceso = planificar_lotes(cursor, proceso, desde, hasta, pendientes)
+        log_proceso(f"Cargando {proceso} (ID {desde + 1} a {hasta} y {len(pendientes)} pendientes): "
+                    f"{len(lotes_proceso)} lotes mensuales")
+        rangos[proceso] = (desde, hasta, pendientes)
+        lotes.extend(lotes_proceso)
+    
+    # Los rangos y particiones quedan fijados antes de cargar (para retomar tras un fallo)
+    asegurar_particiones(cursor, lotes)
+    conn.commit()
+    ejecutar_lotes(pool, workers, "Carga de hechos", lotes, mapas)
+    
+    actualizar_estadisticas(cursor, "estadisticas hechos", particiones_de_lotes(cursor, lotes))
+    # Antes de la marca de agua: si falla, la siguiente corrida vuelve a refrescar estos meses
+    meses = meses_confirmados(cursor)
+    refrescar_agregados(cursor, meses)
+    for proceso, (desde, hasta, pendientes) in rangos.items():
+        guardar_marca_agua(cursor, proceso, desde, hasta, pendientes)
+    conn.commit()
+    return meses
+
+def reenlazar_tratamientos(cursor, mes, inicio, fin):
+    """Vuelve a resolver sk_cita en los tratamientos de cualquier mes cuya cita es de [inicio, fin)
+    
+    La recarga de un mes reinserta sus filas de fact_citas con sk_cita nuevos:
+    los tratamientos del mes ya se recargaron en la fase 2, pero los que
+    empezaron en otro mes conservan la clave de la fila borrada.
+    """
+    return ejecutar_medido(cursor, f"fact_tratamientos {mes} sk_cita", 'dw.fact_tratamientos', 'UPDATE', """
+        UPDATE dw.fact_tratamientos ft
+        SET sk_cita = fc.sk_cita
+        FROM Tratamiento tr
+        INNER JOIN Cita c ON tr.ID_Cita = c.ID_Cita
+        LEFT JOIN dw.fact_citas fc ON fc.id_cita = c.ID_Cita AND fc.fecha = c.Fecha
+        WHERE ft.id_tratamiento = tr.ID_Tratamiento
+        AND c.Fecha >= %(inicio)s AND c.Fecha < %(fin)s
+        AND ft.sk_cita IS DISTINCT FROM fc.sk_cita;
+    """, {'inicio': inicio, 'fin': fin})
+
+def meses_tratamientos_de_citas(cursor, inicio, fin):
+    """Meses (inicio, fin) de fact_tratamientos con filas cuya cita es de [inicio, fin)
+    
+    Son los que reenlazar_tratamientos puede cambiar: la exportación incremental
+    debe reescribirlos aunque sean de otro mes que el recargado.
+    """
+    cursor.execute("""
+        SELECT DISTINCT
+            DATE_TRUNC('month', ft.fecha)::DATE,
+            (DATE_TRUNC('month', ft.fecha) + INTERVAL '1 month')::DATE
+        FROM dw.fact_tratamientos ft
+        INNER JOIN Tratamiento tr ON ft.id_tratamiento = tr.ID_Tratamiento
+        INNER JOIN Cita c ON tr.ID_Cita = c.ID_Cita
+        WHERE c.Fecha >= %s AND c.Fecha < %s;
+    """, (inicio, fin))
+    return set(cursor.fetchall())
+
+def recargar_mes(conn, cursor, pool, workers, mes, mapas=None):
+    """Backfill de un mes ('YYYY-MM'): reemplaza en cada hecho sus filas ya cargadas y devuelve los meses que cambió"""
+    cursor.execute("SELECT MIN(fecha), MAX(fecha) + 1 FROM dw.dim_tiempo WHERE mes_anio = %s", (mes,))
+    inicio, fin = cursor.fetchone()
+    if inicio is None:
+        raise ValueError(f"El mes {mes} no está en dw.dim_tiempo (formato YYYY-MM)")
+    
+    lotes = []
+    for proceso in HECHOS_INCREMENTALES:
+        # Solo hasta la marca de agua: lo posterior lo carga la corrida incremental
+        cursor.execute("SELECT ultimo_id FROM dw.etl_control WHERE proceso = %s", (proceso,))
+        fila = cursor.fetchone()
+        if fila:
+            lotes.append({
+                'proceso': proceso, 'mes': mes, 'inicio': inicio, 'fin': fin,
+                'desde': 0, 'hasta': fila[0], 'pendientes': [], 'reemplazar': True
+            })
+    
+    log_proceso(f"Recargando el mes {mes} en {len(lotes)} procesos...")
+    asegurar_particiones(cursor, lotes)
+    conn.commit()
+    ejecutar_lotes(pool, workers, f"Recarga del mes {mes}", lotes, mapas)
+    meses = meses_de_lotes(lotes)
+    if any(lote['proceso'] == 'fact_citas' for lote in lotes):
+        reenlazar_tratamientos(cursor, mes, inicio, fin)
+        meses.setdefault('dw.fact_tratamientos', set()).update(meses_tratamientos_de_citas(cursor, inicio, fin))
+    actualizar_estadisticas(cursor, "estadisticas hechos", particiones_de_lotes(cursor, lotes))
+    refrescar_agregados(cursor, meses)
+    conn.commit()
+    return meses
+
+# ============================================
+# AGREGADOS PARA TABLEAU
+# ============================================
+# Las vistas v_tableau_* agregadas leen tablas resumen (dw.agg_*) en vez de
+# reagregar todo el histórico de los hechos. Al final de cada corrida se
+# recalculan solo los meses cargados (agregados mensuales) y las mascotas y
+# clientes con hechos en esos meses (agregados por clave, con todo su
+# historial). Los agregados guardan claves sustitutas y las vistas unen las
+# dimensiones actuales al consultar, así que un cambio de dimensión no obliga a
+# recalcularlos.
+#
+# El RFM de clientes (v_tableau_rfm_clientes) lee el estado por cliente de
+# dw.rfm_clientes y los cortes de quintil de dw.rfm_cortes, que se recalculan
+# en cada corrida sobre ese estado (una fila por cliente, no por venta).
+
+# Hecho -> agregados mensuales: tabla -> INSERT del mes [inicio, fin) en fecha_mes = inicio
+AGREGADOS_MENSUALES = {
+    'dw.fact_ventas': {
+        'dw.agg_ventas_sede_mes': """
+            INSERT INTO dw.agg_ventas_sede_mes (
+                fecha_mes, sk_sede, num_ventas, unidades_vendidas,
+                ingresos_ventas, margen_ventas, clientes_unicos
+            )
+            SELECT
+                %(inicio)s, fv.sk_sede, COUNT(DISTINCT fv.id_venta), SUM(fv.cantidad),
+                SUM(fv.total), SUM(fv.margen_total), COUNT(DISTINCT fv.sk_cliente)
+            FROM dw.fact_ventas fv
+            WHERE fv.fecha >= %(inicio)s AND fv.fecha < %(fin)s
+            AND fv.sk_sede IS NOT NULL
+            GROUP BY fv.sk_sede;
+        """,
+        'dw.agg_productos_mes': """
+            INSERT INTO dw.agg_productos_mes (
+                fecha_mes, sk_producto, veces_vendido, unidades, ingresos, margen,
+                suma_precio_unitario, lineas_con_precio, suma_margen_unitario, lineas_con_margen,
+                ultima_venta
+            )
+            SELECT
+                %(inicio)s, fv.sk_producto, COUNT(*), SUM(fv.cantidad), SUM(fv.total), SUM(fv.margen_total),
+                SUM(fv.precio_unitario), COUNT(fv.precio_unitario),
+                SUM(fv.margen_unitario), COUNT(fv.margen_unitario),
+                MAX(fv.fecha)
+            FROM dw.fact_ventas fv
+            WHERE fv.fecha >= %(inicio)s AND fv.fecha < %(fin)s
+            AND fv.tipo_venta = 'Producto' AND fv.sk_producto IS NOT NULL
+            GROUP BY fv.sk_producto;
+        """
+    },
+    'dw.fact_citas': {
+        'dw.agg_citas_veterinario_mes': """
+            INSERT INTO dw.agg_citas_veterinario_mes (
+                fecha_mes, sk_veterinario, sk_sede, total_citas, citas_completadas, citas_no_asistidas,
+                minutos_totales, citas_con_duracion, ingresos_citas, citas_con_costo,
+                consultas_emergencia, consultas_control, primeras_consultas, primera_cita, ultima_cita
+            )
+            SELECT
+                %(inicio)s, fc.sk_veterinario, fc.sk_sede, COUNT(*),
+                SUM(CASE WHEN fc.asistio THEN 1 ELSE 0 END),
+                SUM(CASE WHEN NOT fc.asistio THEN 1 ELSE 0 END),
+                SUM(fc.duracion_minutos), COUNT(fc.duracion_minutos),
+                SUM(fc.costo_cita), COUNT(fc.costo_cita),
+                SUM(CASE WHEN fc.es_emergencia THEN 1 ELSE 0 END),
+                SUM(CASE WHEN fc.es_control THEN 1 ELSE 0 END),
+                SUM(CASE WHEN fc.es_primera_cita THEN 1 ELSE 0 END),
+                MIN(fc.fecha), MAX(fc.fecha)
+            FROM dw.fact_citas fc
+            WHERE fc.fecha >= %(inicio)s AND fc.fecha < %(fin)s
+            AND fc.sk_veterinario IS NOT NULL AND fc.sk_sede IS NOT NULL
+            GROUP BY fc.sk_veterinario, fc.sk_sede;
+        """
+    }
+}
+
+# Hecho -> agregados por clave: (clave, {tabla: INSERT de las claves de la tabla temporal claves_refresco})
+AGREGADOS_POR_CLAVE = {
+    'dw.fact_citas': ('sk_mascota', {
+        'dw.agg_citas_mascota': """
+            INSERT INTO dw.agg_citas_mascota (
+                sk_mascota, total_citas, gasto_total, citas_con_costo, primera_visita, ultima_visita
+            )
+            SELECT fc.sk_mascota, COUNT(*), SUM(fc.costo_cita), COUNT(fc.costo_cita), MIN(fc.fecha), MAX(fc.fecha)
+            FROM dw.fact_citas fc
+            INNER JOIN claves_refresco r ON fc.sk_mascota = r.clave
+            GROUP BY fc.sk_mascota;
+        """,
+        'dw.agg_mascotas_veterinario': """
+            INSERT INTO dw.agg_mascotas_veterinario (sk_veterinario, sk_sede, sk_mascota)
+            SELECT DISTINCT fc.sk_veterinario, fc.sk_sede, fc.sk_mascota
+            FROM dw.fact_citas fc
+            INNER JOIN claves_refresco r ON fc.sk_mascota = r.clave
+            WHERE fc.sk_veterinario IS NOT NULL AND fc.sk_sede IS NOT NULL;
+        """
+    }),
+    'dw.fact_ventas': ('sk_cliente', {
+        # Recalcular el historial del cliente (y no sumar solo lo nuevo) mantiene
+        # exacto COUNT(DISTINCT id_venta) cuando las líneas de productos y
+        # servicios de una venta llegan en corridas distintas, y con --mes
+        'dw.rfm_clientes': """
+            INSERT INTO dw.rfm_clientes (sk_cliente, num_compras, gasto_total, ultima_compra)
+            SELECT fv.sk_cliente, COUNT(DISTINCT fv.id_venta), SUM(fv.total), MAX(fv.fecha)
+            FROM dw.fact_ventas fv
+            INNER JOIN claves_refresco r ON fv.sk_cliente = r.clave
+            GROUP BY fv.sk_cliente;
+        """
+    })
+}
+
+# Cortes de quintil (20/40/60/80 %) del RFM sobre los clientes actuales con compras.
+# Mismo orden que los NTILE(5) originales: recencia ascendente, frecuencia y monto descendentes
+CORTES_RFM = """
+    INSERT INTO dw.rfm_cortes (clientes, cortes_ultima_compra, cortes_num_compras, cortes_gasto_total)
+    SELECT
+        COUNT(*),
+        percentile_disc(ARRAY[0.2, 0.4, 0.6, 0.8]) WITHIN GROUP (ORDER BY r.ultima_compra DESC),
+        percentile_disc(ARRAY[0.2, 0.4, 0.6, 0.8]) WITHIN GROUP (ORDER BY r.num_compras DESC),
+        percentile_disc(ARRAY[0.2, 0.4, 0.6, 0.8]) WITHIN GROUP (ORDER BY r.gasto_total DESC)
+    FROM dw.rfm_clientes r
+    INNER JOIN dw.dim_cliente c ON r.sk_cliente = c.sk_cliente AND c.es_actual = TRUE;
+"""
+
+TABLAS_AGREGADOS = [
+    *(tabla for agregados in AGREGADOS_MENSUALES.values() for tabla in agregados),
+    *(tabla for _, agregados in AGREGADOS_POR_CLAVE.values() for tabla in agregados),
+    'dw.rfm_cortes'
+]
+
+def asegurar_agregados(cursor):
+    """Crea las tablas de agregados en Data Warehouses anteriores y las llena con todo el histórico"""
+    cursor.execute("SELECT t FROM UNNEST(%s::TEXT[]) AS t WHERE to_regclass(t) IS NULL;", (TABLAS_AGREGADOS,))
+    faltantes = [fila[0] for fila in cursor.fetchall()]
+    if not faltantes:
+        return
+    
+    log_proceso("Creando los agregados de Tableau desde schema_datawarehouse.sql...")
+    cursor.execute('\n'.join(sentencias_esquema([tabla.split('.', 1)[1] for tabla in faltantes] + ['quintil_rfm'])))
+    cursor.execute(f"TRUNCATE {', '.join(TABLAS_AGREGADOS)};")
+    
+    # Todos los meses de dw.dim_tiempo para ambos hechos
+    cursor.execute("SELECT MIN(fecha), MAX(fecha) + 1 FROM dw.dim_tiempo GROUP BY mes_anio;")
+    meses = set(cursor.fetchall())
+    refrescar_agregados(cursor, {hecho: meses for hecho in AGREGADOS_MENSUALES})
+
+def meses_de_lotes(lotes):
+    """Meses (inicio, fin) que tocaron los lotes, por tabla de hechos"""
+    meses = {}
+    for lote in lotes:
+        hecho = HECHOS_INCREMENTALES[lote['proceso']]['hecho']
+        meses.setdefault(hecho, set()).add((lote['inicio'], lote['fin']))
+    return meses
+
+def meses_confirmados(cursor):
+    """Meses de todos los lotes confirmados de la corrida en curso (incluye los de un intento anterior)"""
+    cursor.execute("""
+        SELECT l.proceso, l.mes_anio, MIN(t.fecha), MAX(t.fecha) + 1
+        FROM dw.etl_control_lotes l
+        INNER JOIN dw.dim_tiempo t ON t.mes_anio = l.mes_anio
+        GROUP BY l.proceso, l.mes_anio;
     """)
+    return meses_de_lotes([
+        {'proceso': proceso, 'mes': mes, 'inicio': inicio, 'fin': fin}
+        for proceso, mes, inicio, fin in cursor.fetchall()
+    ])
+
+def refrescar_agregados(cursor, meses):
+    """Recalcula los agregados de los meses dados ({hecho: {(inicio, fin)}}) en la transacción del cursor"""
+    for hecho, agregados in AGREGADOS_MENSUALES.items():
+        for inicio, fin in sorted(meses.get(hecho, ())):
+            for tabla, insercion in agregados.items():
+                cursor.execute(f"DELETE FROM {tabla} WHERE fecha_mes = %s;", (inicio,))
+                ejecutar_medido(cursor, f"{tabla} {inicio:%Y-%m}", tabla, 'INSERT', insercion,
+                                {'inicio': inicio, 'fin': fin})
+    
+    # Claves con hechos en los meses cargados: se recalcula todo su historial
+    for hecho, (clave, agregados) in AGREGADOS_POR_CLAVE.items():
+        meses_hecho = sorted(meses.get(hecho, ()))
+        if not meses_hecho:
+            continue
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS claves_refresco (clave INTEGER PRIMARY KEY) ON COMMIT DELETE ROWS;
+            TRUNCATE claves_refresco;
+        """)
+        for inicio, fin in meses_hecho:
+            cursor.execute(f"""
+                INSERT INTO claves_refresco
+                SELECT DISTINCT {clave} FROM {hecho}
+                WHERE fecha >= %s AND fecha < %s AND {clave} IS NOT NULL
+                ON CONFLICT DO NOTHING;
+            """, (inicio, fin))
+        cursor.execute("ANALYZE claves_refresco;")
+        
+        for tabla, insercion in agregados.items():
+            cursor.execute(f"DELETE FROM {tabla} a USING claves_refresco r WHERE a.{clave} = r.clave;")
+            ejecutar_medido(cursor, tabla, tabla, 'INSERT', insercion)
+    
+    # Los cortes dependen de todos los clientes actuales: se recalculan en cada corrida
+    cursor.execute("DELETE FROM dw.rfm_cortes;")
+    ejecutar_medido(cursor, 'dw.rfm_cortes', 'dw.rfm_cortes', 'INSERT', CORTES_RFM)
+    
+    actualizar_estadisticas(cursor, "estadisticas agregados", TABLAS_AGREGADOS)
+
+
+# ============================================
+# LECTURA EN FLUJO
+# ============================================
+# Los resultados grandes (meses de hechos, vistas v_tableau_* completas) se
+# leen con un cursor con nombre: el resultado queda en el servidor y cada
+# FETCH trae itersize filas, así que la memoria del proceso no depende del
+# tamaño del resultado. Los cursores con nombre viven dentro de la transacción
+# de su conexión (no admiten autocommit). Para CSV se usa COPY ... TO STDOUT,
+# que PostgreSQL ya envía en flujo.
+
+# Filas por viaje de los cursores del lado del servidor (y por grupo de filas de Parquet)
+ITERSIZE_EXPORTACION = 100_000
+
+def tipo_arrow(tipo_pg):
+    """Tipo Arrow de un tipo de columna de PostgreSQL (según format_type)"""
+    import pyarrow as pa
+    if tipo_pg.endswith('[]'):
+        return pa.list_(tipo_arrow(tipo_pg[:-2]))
+    decimal = re.match(r'numeric\((\d+),(\d+)\)$', tipo_pg)
+    if decimal:
+        return pa.decimal128(int(decimal.group(1)), int(decimal.group(2)))
+    return {
+        'smallint': pa.int16(), 'integer': pa.int32(), 'bigint': pa.int64(), 'boolean': pa.bool_(),
+        'real': pa.float32(), 'double precision': pa.float64(),
+        'numeric': pa.float64(),  # Sin precisión (cocientes y promedios de las vistas): escala variable
+        'date': pa.date32(), 'time without time zone': pa.time64('us'),
+        'timestamp without time zone': pa.timestamp('us')
+    }.get(tipo_pg.split('(')[0], pa.string())  # varchar, char(n) y text
+
+def esquema_resultado(cursor, description):
+    """Esquema Arrow de las columnas de un resultado (cursor.description de cualquier consulta)"""
+    import pyarrow as pa
+    tipos = []
+    for columna in description:
+        # psycopg2 expone precisión y escala solo de NUMERIC: se rearma el typmod de format_type
+        # (un NUMERIC sin precisión llega con 65535, fuera del máximo de 1000 dígitos)
+        typmod = -1
+        if columna.precision is not None and columna.scale is not None and columna.precision <= 1000:
+            typmod = (columna.precision << 16 | columna.scale) + 4
+        cursor.execute("SELECT format_type(%s, %s);", (columna.type_code, typmod))
+        tipos.append(cursor.fetchone()[0])
+    return pa.schema([(columna.name, tipo_arrow(tipo)) for columna, tipo in zip(description, tipos)])
+
+def lotes_en_servidor(conn, sql, parametros=None, itersize=ITERSIZE_EXPORTACION):
+    """Itera (description, lote) de una consulta con un cursor del lado del servidor
     
-    registros_servicios = cursor.rowcount
-    total_registros = registros_productos + registros_servicios
+    Cada lote tiene hasta itersize filas; con un resultado vacío se produce un
+    único lote vacío para que el llamador reciba igual las columnas.
+    """
+    with conn.cursor(name='lectura_en_flujo') as cursor:
+        cursor.itersize = itersize
+        cursor.execute(sql, parametros)
+        lote = cursor.fetchmany(itersize)
+        yield cursor.description, lote  # description está disponible tras el primer FETCH
+        while len(lote) == itersize:
+            lote = cursor.fetchmany(itersize)
+            if lote:
+                yield cursor.description, lote
+
+def descartar_temporal(temporal):
+    """Borra el <ruta>.tmp de una escritura fallida (si llegó a crearse)"""
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+def arreglo_arrow(valores, tipo):
+    """Arreglo Arrow de una columna de un lote (un NUMERIC sin precisión llega como Decimal y va a double)"""
+    import pyarrow as pa
+    if pa.types.is_floating(tipo):
+        valores = [None if valor is None else float(valor) for valor in valores]
+    return pa.array(valores, tipo)
+
+def escribir_parquet(cursor, sql, parametros, ruta, esquema=None, itersize=ITERSIZE_EXPORTACION):
+    """Escribe el resultado de una consulta en un archivo Parquet y devuelve sus filas
     
-    log_proceso(f" fact_ventas: {total_registros} registros procesados ({registros_productos} productos, {registros_servicios} servicios)")
+    Lee en flujo (un grupo de filas por lote) en la conexión del cursor. Sin
+    esquema, se deduce de las columnas del resultado. Se escribe en <ruta>.tmp
+    y se renombra al terminar: un lector nunca ve un archivo a medias.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    temporal = f"{ruta}.tmp"
+    filas = 0
+    escritor = None
+    try:
+        try:
+            for description, lote in lotes_en_servidor(cursor.connection, sql, parametros, itersize):
+                if escritor is None:
+                    esquema = esquema or esquema_resultado(cursor, description)
+                    escritor = pq.ParquetWriter(temporal, esquema, compression='zstd')
+                if not lote:
+                    continue
+                columnas = zip(*lote)
+                escritor.write_table(pa.Table.from_arrays(
+                    [arreglo_arrow(valores, campo.type) for valores, campo in zip(columnas, esquema)], schema=esquema
+                ))
+                filas += len(lote)
+        finally:
+            if escritor is not None:
+                escritor.close()
+        os.replace(temporal, ruta)
+    except Exception:
+        descartar_temporal(temporal)
+        raise
+    return filas
+
+def escribir_csv(cursor, sql, parametros, ruta):
+    """Escribe el resultado de una consulta en CSV con cabecera (COPY ... TO STDOUT) y devuelve sus filas"""
+    consulta = cursor.mogrify(sql.strip().rstrip(';'), parametros).decode()
+    temporal = f"{ruta}.tmp"
+    try:
+        with open(temporal, 'w', encoding='utf-8', newline='') as archivo:
+            cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT csv, HEADER true)", archivo)
+        os.replace(temporal, ruta)
+    except Exception:
+        descartar_temporal(temporal)
+        raise
+    return cursor.rowcount
+
+# ============================================
+# EXPORTACIÓN A PARQUET
+# ============================================
+# Con --exportar-parquet DIR, al terminar la carga el esquema estrella
+# (dimensiones, hechos y agregados de Tableau) se escribe en Parquet para
+# consultarlo con un motor columnar embebido (consultas_columnar.py) sin
+# cargar la base de producción:
+#   DIR/<tabla>/parte.parquet                    dimensiones y agregados (completos)
+#   DIR/<hecho>/mes_anio=YYYY-MM/parte.parquet   hechos, una carpeta por mes
+# Las dimensiones y agregados se reescriben enteros en cada corrida; de los
+# hechos solo los meses que cargó la corrida, salvo en la primera exportación,
+# tras una recarga completa o si la anterior no terminó (sin manifiesto).
+# Todo se lee en una transacción REPEATABLE READ: una sola instantánea.
+
+HECHOS_EXPORTACION = ['dw.fact_citas', 'dw.fact_ventas', 'dw.fact_tratamientos']
+
+TABLAS_EXPORTACION = [
+    'dw.dim_tiempo', *(f"dw.{dim}" for dim in ATRIBUTOS_SCD2), *HECHOS_EXPORTACION, *TABLAS_AGREGADOS
+]
+
+# Se escribe al final de una exportación completa; consultas_columnar.py lo exige
+ARCHIVO_MANIFIESTO = '_exportacion.json'
+
+def esquema_exportacion(cursor, tabla):
+    """Esquema Arrow de una tabla de dw, con sus columnas en el orden de la tabla"""
+    import pyarrow as pa
+    cursor.execute("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::REGCLASS AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum;
+    """, (tabla,))
+    return pa.schema([(columna, tipo_arrow(tipo)) for columna, tipo in cursor.fetchall()])
+
+def exportar_tabla(cursor, directorio, tabla):
+    """Reescribe una dimensión o agregado completo en DIR/<tabla>/parte.parquet"""
+    carpeta = os.path.join(directorio, tabla.split('.')[-1])
+    os.makedirs(carpeta, exist_ok=True)
+    return escribir_parquet(cursor, f"SELECT * FROM {tabla}", None, os.path.join(carpeta, 'parte.parquet'),
+                            esquema_exportacion(cursor, tabla))
+
+def exportar_meses_hecho(cursor, directorio, hecho, meses, completa):
+    """Reescribe los meses dados ({(inicio, fin)}) de un hecho, una carpeta por mes
+    
+    completa borra antes la carpeta del hecho; los meses sin filas no dejan carpeta.
+    """
+    carpeta_hecho = os.path.join(directorio, hecho.split('.')[-1])
+    if completa:
+        shutil.rmtree(carpeta_hecho, ignore_errors=True)
+    esquema = esquema_exportacion(cursor, hecho)
+    
+    filas = 0
+    for inicio, fin in sorted(meses):
+        carpeta = os.path.join(carpeta_hecho, f"mes_anio={inicio:%Y-%m}")
+        os.makedirs(carpeta, exist_ok=True)
+        # Ordenado por fecha: estadísticas mín/máx útiles para descartar grupos de filas
+        filas_mes = escribir_parquet(
+            cursor, f"SELECT * FROM {hecho} WHERE fecha >= %s AND fecha < %s ORDER BY fecha",
+            (inicio, fin), os.path.join(carpeta, 'parte.parquet'), esquema
+        )
+        if filas_mes == 0:
+            shutil.rmtree(carpeta)
+        filas += filas_mes
+    return filas
+
+def exportar_parquet(conn, cursor, directorio, id_corrida, meses, completa=False):
+    """Exporta el esquema estrella a Parquet en DIR (ver EXPORTACIÓN A PARQUET)
+    
+    meses: {hecho: {(inicio, fin)}} cargados en la corrida. Con completa, o si
+    DIR no tiene el manifiesto de una exportación terminada, se reescriben
+    todos los meses de dw.dim_tiempo.
+    """
+    ruta_manifiesto = os.path.join(directorio, ARCHIVO_MANIFIESTO)
+    completa = completa or not os.path.exists(ruta_manifiesto)
+    os.makedirs(directorio, exist_ok=True)
+    if not completa:
+        os.remove(ruta_manifiesto)  # Si la exportación falla, la siguiente será completa
+    
+    log_proceso(f"\n=== EXPORTACIÓN A PARQUET ({'completa' if completa else 'meses cargados'}) -> {directorio} ===")
+    conn.commit()
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+    try:
+        if completa:
+            cursor.execute("SELECT MIN(fecha), MAX(fecha) + 1 FROM dw.dim_tiempo GROUP BY mes_anio;")
+            todos = set(cursor.fetchall())
+            meses = {hecho: todos for hecho in HECHOS_EXPORTACION}
+        
+        tablas = {}
+        for tabla in TABLAS_EXPORTACION:
+            inicio = datetime.now()
+            reloj = time.perf_counter()
+            if tabla in HECHOS_EXPORTACION:
+                meses_tabla = meses.get(tabla, set())
+                filas = exportar_meses_hecho(cursor, directorio, tabla, meses_tabla, completa)
+                tablas[tabla.split('.')[-1]] = {'particionada': True, 'filas_escritas': filas,
+                                                'meses_escritos': len(meses_tabla)}
+            else:
+                filas = exportar_tabla(cursor, directorio, tabla)
+                tablas[tabla.split('.')[-1]] = {'particionada': False, 'filas_escritas': filas}
+            registrar_paso(f"parquet {tabla}", tabla, 'EXPORT', inicio, time.perf_counter() - reloj, filas)
+            log_proceso(f" {tabla}: {filas:,} filas exportadas")
+    finally:
+        conn.rollback()  # Transacción de solo lectura
+    
+    temporal = f"{ruta_manifiesto}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump({
+            'id_corrida': id_corrida,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'completa': completa,
+            'tablas': tablas
+        }, archivo, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta_manifiesto)
+
 
 # ============================================
 # FUNCIÓN PRINCIPAL
 # ============================================
 
-def ejecutar_etl():
-    """Ejecuta el proceso ETL completo"""
+def ejecutar_etl(recarga_completa=False, workers=ETL_WORKERS, mes=None, claves_en_memoria=False,
+                 explain=False, ruta_json=None, directorio_parquet=None):
+    """Ejecuta el proceso ETL
+    
+    Incremental por defecto; recarga_completa reconstruye los hechos y mes
+    ('YYYY-MM') solo vuelve a cargar ese mes en los hechos. claves_en_memoria
+    resuelve las claves sustitutas de citas y ventas en el cliente y carga con COPY.
+    Los pasos medidos quedan en dw.etl_run_log; explain agrega sus planes y
+    ruta_json escribe además un reporte JSON de la corrida. directorio_parquet
+    exporta al final el esquema estrella a Parquet (ver EXPORTACIÓN A PARQUET).
+    """
     print("""
     ═══════════════════════════════════════════
     ETL - SISTEMA VETERINARIA
@@ -514,64 +1832,159 @@ def ejecutar_etl():
     """)
     
     inicio = datetime.now()
+    reloj = time.perf_counter()
     log_proceso("Iniciando proceso ETL...")
+    PASOS_ETL.clear()
+    OPCIONES['explain'] = explain
+    id_corrida = None
+    error = None
     
-    # Conectar
+    # Conectar (conexión principal para DDL y resumen; pool para las cargas)
     conn = conectar_db()
     cursor = conn.cursor()
+    pool = crear_pool(workers)
     
     try:
-        # FASE 1: Cargar Dimensiones
+        # Esquema: columnas, tablas de control, índices únicos de los que dependen las cargas, agregados
+        # y los días de dw.dim_tiempo hasta el último mes con partición
+        asegurar_hash_dimensiones(cursor)
+        asegurar_control_etl(cursor)
+        asegurar_fecha_hechos(cursor)
+        asegurar_indices_unicos(cursor)
+        asegurar_agregados(cursor)
+        extender_dim_tiempo(cursor)
+        cursor.execute("SELECT nextval('dw.etl_corrida_seq');")
+        id_corrida = cursor.fetchone()[0]
+        conn.commit()
+        log_proceso(f"Corrida {id_corrida}")
+        
+        # FASE 1: Cargar Dimensiones (tablas disjuntas: una transacción por dimensión)
         log_proceso("\n=== FASE 1: CARGA DE DIMENSIONES ===")
-        cargar_dim_cliente(cursor)
-        cargar_dim_mascota(cursor)
-        cargar_dim_veterinario(cursor)
-        cargar_dim_sede(cursor)
-        cargar_dim_producto(cursor)
-        cargar_dim_servicio(cursor)
+        ejecutar_en_paralelo(pool, workers, "Carga de dimensiones", [
+            (carga.__name__, carga) for carga in (
+                cargar_dim_cliente, cargar_dim_mascota, cargar_dim_veterinario,
+                cargar_dim_sede, cargar_dim_producto, cargar_dim_servicio
+            )
+        ])
+        actualizar_estadisticas(cursor, "estadisticas dimensiones", [f"dw.{dim}" for dim in ATRIBUTOS_SCD2])
         conn.commit()
         log_proceso(" Dimensiones cargadas exitosamente")
         
         # FASE 2: Cargar Hechos
         log_proceso("\n=== FASE 2: CARGA DE HECHOS ===")
-        cargar_fact_citas(cursor)
-        conn.commit()
+        if recarga_completa:
+            reiniciar_hechos(cursor)
+            # El TRUNCATE debe confirmarse antes de que el pool toque los hechos
+            conn.commit()
         
-        cargar_fact_ventas(cursor)
-        conn.commit()
+        # Los mapas se leen tras cargar las dimensiones: una vez por corrida
+        mapas = cargar_mapas_claves(cursor) if claves_en_memoria else None
+        if mes:
+            meses = recargar_mes(conn, cursor, pool, workers, mes, mapas)
+        else:
+            meses = cargar_hechos(conn, cursor, pool, workers, mapas)
         
         log_proceso(" Hechos cargados exitosamente")
         
+        # FASE 3 (opcional): instantánea Parquet para el motor columnar
+        if directorio_parquet:
+            exportar_parquet(conn, cursor, directorio_parquet, id_corrida, meses, completa=recarga_completa)
+        
         # Resumen final
-        fin = datetime.now()
-        duracion = (fin - inicio).total_seconds()
+        duracion = time.perf_counter() - reloj
         
         print("\n" + "="*50)
         print(" ETL COMPLETADO EXITOSAMENTE ")
         print("="*50)
         log_proceso(f" Duración total: {duracion:.2f} segundos")
         
-        # Estadísticas
-        print("\nRESUMEN DEL DATA WAREHOUSE:")
+        # Estadísticas: filas insertadas en la corrida y total estimado (sin COUNT(*))
+        print("\nRESUMEN DEL DATA WAREHOUSE (total estimado por pg_class.reltuples):")
         tablas_dw = [
             'dim_cliente', 'dim_mascota', 'dim_veterinario', 'dim_sede',
-            'dim_producto', 'dim_servicio', 'fact_citas', 'fact_ventas'
+            'dim_producto', 'dim_servicio', 'fact_citas', 'fact_ventas', 'fact_tratamientos'
         ]
         
+        estimadas = estimar_filas(cursor, tablas_dw)
+        cargadas = filas_cargadas_por_tabla()
         for tabla in tablas_dw:
-            cursor.execute(f"SELECT COUNT(*) FROM dw.{tabla}")
-            count = cursor.fetchone()[0]
-            print(f"  dw.{tabla}: {count:,} registros")
+            print(f"  dw.{tabla}: ~{estimadas.get(tabla, 0):,} registros "
+                  f"(+{cargadas.get(tabla, 0):,} en esta corrida)")
         
     except Exception as e:
         conn.rollback()
+        error = str(e).strip()
         log_proceso(f" ERROR EN ETL: {e}")
         raise
     
     finally:
+        duracion = time.perf_counter() - reloj
+        registrar_paso('corrida', None, 'TOTAL', inicio, duracion, sum(filas_cargadas_por_tabla().values()), error=error)
+        
+        if id_corrida is not None:
+            try:
+                guardar_pasos(cursor, id_corrida)
+                conn.commit()
+                log_proceso(f" {len(PASOS_ETL)} pasos guardados en dw.etl_run_log (corrida {id_corrida})")
+            except Exception as e:
+                conn.rollback()
+                log_proceso(f" No se pudo guardar dw.etl_run_log: {e}")
+        
+        if ruta_json:
+            escribir_reporte_json(ruta_json, {
+                'id_corrida': id_corrida,
+                'inicio': inicio,
+                'duracion_segundos': round(duracion, 3),
+                'estado': 'error' if error else 'ok',
+                'error': error,
+                'workers': workers,
+                'recarga_completa': recarga_completa,
+                'mes': mes,
+                'claves_en_memoria': claves_en_memoria,
+                'explain': explain,
+                'directorio_parquet': directorio_parquet,
+                'filas_por_tabla': filas_cargadas_por_tabla()
+            })
+            log_proceso(f" Reporte JSON: {ruta_json}")
+        
+        pool.closeall()
         cursor.close()
         conn.close()
         log_proceso(" Conexión cerrada")
 
 if __name__ == "__main__":
-    ejecutar_etl()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='ETL OLTP -> Data Warehouse - Veterinaria')
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument(
+        '--recarga-completa', action='store_true',
+        help='Vacía fact_citas, fact_ventas y fact_tratamientos y los recarga desde cero (backfill)'
+    )
+    modo.add_argument(
+        '--mes', metavar='YYYY-MM',
+        help='Vuelve a cargar solo ese mes en fact_citas, fact_ventas y fact_tratamientos '
+             '(y reenlaza sk_cita en los tratamientos de otros meses con citas de ese mes)'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=ETL_WORKERS,
+        help=f'Conexiones en paralelo para dimensiones y hechos (defecto: {ETL_WORKERS})'
+    )
+    parser.add_argument(
+        '--claves-en-memoria', action='store_true',
+        help='Resuelve las claves de citas y ventas en memoria y las carga con COPY'
+    )
+    parser.add_argument(
+        '--explain', action='store_true',
+        help='Guarda el plan EXPLAIN (ANALYZE, BUFFERS) de cada sentencia de carga en dw.etl_run_log'
+    )
+    parser.add_argument(
+        '--json', metavar='RUTA', dest='ruta_json',
+        help='Escribe además los pasos medidos de la corrida en un reporte JSON'
+    )
+    parser.add_argument(
+        '--exportar-parquet', metavar='DIR', dest='directorio_parquet',
+        help='Exporta dimensiones, hechos (por mes) y agregados a Parquet en DIR (requiere pyarrow)'
+    )
+    args = parser.parse_args()
+    ejecutar_etl(recarga_completa=args.recarga_completa, workers=args.workers, mes=args.mes,
+                 claves_en_memoria=args.claves_en_memoria, explain=args.explain, ruta_json=args.ruta_json,
+                 directorio_parquet=args.directorio_parquet)
\ No newline at end of file
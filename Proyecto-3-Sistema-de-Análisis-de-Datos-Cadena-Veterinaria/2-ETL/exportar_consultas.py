@@ -0,0 +1,125 @@
+"""
+============================================
+EXPORTACIÓN DE CONSULTAS - VETERINARIA
+============================================
+Vuelca una vista v_tableau_*, una consulta nombrada de 3-Analytics/analytics.sql
+o una consulta propia a CSV o Parquet en memoria acotada: el resultado se lee
+en flujo (cursor del lado del servidor, itersize filas por viaje, para
+Parquet; COPY ... TO STDOUT para CSV), así que extraer millones de filas de
+v_tableau_ventas no depende de la memoria del proceso.
+
+Uso:
+    python exportar_consultas.py --listar
+    python exportar_consultas.py --vista v_tableau_ventas --salida ventas.parquet
+    python exportar_consultas.py --vista v_tableau_ventas --salida ventas.csv
+    python exportar_consultas.py --consulta "Segmentación RFM" --salida rfm.parquet --itersize 20000
+    python exportar_consultas.py --sql "SELECT * FROM dw.v_tableau_ventas WHERE anio = 2024" --salida ventas_2024.csv
+
+El formato sale de la extensión de --salida (.csv o .parquet). El archivo se
+escribe en <salida>.tmp y se renombra al terminar. Parquet requiere pyarrow.
+"""
+
+import argparse
+import os
+import time
+
+import psycopg2
+
+try:
+    import resource  # Solo Unix: pico de memoria residente del reporte
+except ImportError:
+    resource = None
+
+import etl_process
+from benchmark_consultas import consultas_analytics, consultas_vistas
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def seleccionar_consulta(parser, args):
+    """(nombre, sql) de la vista, consulta nombrada o SQL indicados"""
+    if args.sql:
+        return 'consulta propia', args.sql
+    
+    if args.vista:
+        vista = args.vista if args.vista.startswith('dw.') else f"dw.{args.vista}"
+        vistas = {consulta['consulta']: consulta['sql'] for consulta in consultas_vistas()}
+        if vista not in vistas:
+            parser.error(f"Vista desconocida: {args.vista} (ver --listar)")
+        return vista, vistas[vista]
+    
+    coincidencias = [c for c in consultas_analytics() if args.consulta.lower() in c['consulta'].lower()]
+    if len(coincidencias) != 1:
+        nombres = ''.join(f"\n  {c['consulta']}" for c in coincidencias)
+        parser.error(f"--consulta '{args.consulta}' coincide con {len(coincidencias)} consultas de analytics.sql{nombres}")
+    return coincidencias[0]['consulta'], coincidencias[0]['sql']
+
+def listar_consultas():
+    """Imprime las vistas y las consultas nombradas disponibles"""
+    print("Vistas (--vista):")
+    for consulta in consultas_vistas():
+        print(f"  {consulta['consulta']}")
+    print("\nConsultas de analytics.sql (--consulta, basta una parte del nombre):")
+    for consulta in consultas_analytics():
+        print(f"  {consulta['consulta']}")
+
+# ============================================
+# EXPORTACIÓN
+# ============================================
+
+def exportar(nombre, sql, ruta, itersize):
+    """Escribe el resultado en ruta (CSV o Parquet según la extensión) y reporta filas, tiempo y memoria"""
+    conn = psycopg2.connect(**etl_process.DB_CONFIG)
+    # Los cursores con nombre necesitan una transacción: de solo lectura, sin autocommit
+    conn.set_session(readonly=True)
+    cursor = conn.cursor()
+    print(f" Exportando {nombre} -> {ruta}")
+    inicio = time.perf_counter()
+    try:
+        if ruta.lower().endswith('.csv'):
+            filas = etl_process.escribir_csv(cursor, sql, None, ruta)
+        else:
+            filas = etl_process.escribir_parquet(cursor, sql, None, ruta, itersize=itersize)
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+    
+    duracion = time.perf_counter() - inicio
+    linea = f" {filas:,} filas en {duracion:.2f}s ({filas / max(duracion, 1e-6):,.0f} filas/s)"
+    if resource:
+        linea += f", pico de memoria {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MB"  # Linux reporta KB
+    print(linea)
+    print(f" Archivo: {ruta} ({os.path.getsize(ruta) / 1024 ** 2:,.1f} MB)")
+
+def parsear_argumentos():
+    """Lee las opciones de línea de comandos"""
+    parser = argparse.ArgumentParser(description='Exportación en flujo de vistas y consultas a CSV/Parquet - Veterinaria')
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument('--vista', help='Vista de tableau_views.sql (p. ej. v_tableau_ventas)')
+    origen.add_argument('--consulta', metavar='TEXTO',
+                        help='Consulta de analytics.sql cuyo nombre contiene este texto (debe ser una sola)')
+    origen.add_argument('--sql', help='Consulta propia')
+    origen.add_argument('--listar', action='store_true', help='Lista las vistas y consultas disponibles')
+    parser.add_argument('--salida', metavar='RUTA', help='Archivo de salida (.csv o .parquet)')
+    parser.add_argument('--itersize', type=int, default=etl_process.ITERSIZE_EXPORTACION,
+                        help=f'Filas por viaje del cursor y por grupo de filas de Parquet '
+                             f'(defecto: {etl_process.ITERSIZE_EXPORTACION})')
+    args = parser.parse_args()
+    if not args.listar and not args.salida:
+        parser.error('--salida es obligatorio salvo con --listar')
+    if args.salida and not args.salida.lower().endswith(('.csv', '.parquet')):
+        parser.error(f"Extensión de salida no soportada: {args.salida} (.csv o .parquet)")
+    return parser, args
+
+def main():
+    parser, args = parsear_argumentos()
+    if args.listar:
+        listar_consultas()
+        return
+    nombre, sql = seleccionar_consulta(parser, args)
+    exportar(nombre, sql, args.salida, args.itersize)
+
+if __name__ == "__main__":
+    main()
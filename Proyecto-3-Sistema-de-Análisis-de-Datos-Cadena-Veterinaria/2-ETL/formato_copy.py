@@ -0,0 +1,18 @@
+"""
+============================================
+FORMATO COPY - VETERINARIA
+============================================
+Serialización de valores al formato texto de COPY ... FROM STDIN de
+PostgreSQL, compartida por data_generator.py (carga del OLTP) y
+etl_process.py (carga de hechos con claves resueltas en memoria).
+"""
+
+def valor_copy(valor):
+    """Serializa un valor al formato texto de COPY (NULL = \\N)"""
+    if valor is None:
+        return '\\N'
+    texto = str(valor)
+    return (texto.replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
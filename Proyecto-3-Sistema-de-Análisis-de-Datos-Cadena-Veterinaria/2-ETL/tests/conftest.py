@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del ETL se importan como scripts sueltos de 2-ETL
+DIRECTORIO_ETL = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRECTORIO_ETL)
+
+# ============================================
+# BASE DE PRUEBAS
+# ============================================
+# Las pruebas de extremo a extremo del ETL necesitan una base PostgreSQL
+# desechable, indicada en VETERINARIA_TEST_DSN (sin ella se omiten):
+#   VETERINARIA_TEST_DSN="dbname=veterinaria_pruebas user=postgres" python -m pytest -q tests
+# Cada prueba borra los esquemas public y dw de esa base y los vuelve a crear
+# con los scripts del proyecto (OLTP con los datos de initial_data.sql).
+
+DSN_PRUEBAS = os.environ.get('VETERINARIA_TEST_DSN')
+
+SCRIPTS_BASE = [
+    '1-Database/schema_oltp.sql',
+    '1-Database/initial_data.sql',
+    '1-Database/schema_datawarehouse.sql',
+    '3-Analytics/tableau_views.sql'
+]
+
+@pytest.fixture
+def bd(monkeypatch):
+    """Conexión en autocommit a la base de pruebas recién creada; el ETL se conecta a la misma"""
+    if not DSN_PRUEBAS:
+        pytest.skip("VETERINARIA_TEST_DSN no definido")
+    import psycopg2
+    import etl_process
+    
+    conn = psycopg2.connect(DSN_PRUEBAS)
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("DROP SCHEMA IF EXISTS dw CASCADE; DROP SCHEMA IF EXISTS public CASCADE; CREATE SCHEMA public;")
+        for script in SCRIPTS_BASE:
+            with open(os.path.join(os.path.dirname(DIRECTORIO_ETL), script), encoding='utf-8') as archivo:
+                cursor.execute(archivo.read())
+    monkeypatch.setattr(etl_process, 'DB_CONFIG', {'dsn': DSN_PRUEBAS})
+    yield conn
+    conn.close()
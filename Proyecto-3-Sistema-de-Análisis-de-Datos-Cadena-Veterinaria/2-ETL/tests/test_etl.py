@@ -0,0 +1,348 @@
+"""
+Pruebas del ETL: carga incremental por marcas de agua, detección de cambios
+SCD2, reanudación de corridas, particiones, claves sustitutas en memoria y
+agregados para Tableau.
+
+Las pruebas con el fixture bd corren el ETL completo contra la base de
+VETERINARIA_TEST_DSN (ver conftest.py) y se omiten sin ella.
+
+Uso (desde 2-ETL):
+    python -m pytest -q tests
+"""
+
+import math
+from array import array
+from datetime import date, timedelta
+
+import pytest
+
+import etl_process
+from etl_process import CalendarioClaves, MapaClaves, ejecutar_etl
+
+def consultar(bd, sql, parametros=None):
+    """Filas de una consulta (None para sentencias sin resultado)"""
+    with bd.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return cursor.fetchall() if cursor.description else None
+
+def valor(bd, sql, parametros=None):
+    return consultar(bd, sql, parametros)[0][0]
+
+def agregar_cita(bd, fecha, id_cita=None):
+    """Inserta una cita completada de la mascota 1 y devuelve su ID"""
+    return valor(bd, """
+        INSERT INTO Cita (ID_Cita, Fecha, Hora, Motivo, Estado, Costo, Duracion_Minutos, ID_Mascota, ID_Veterinario, ID_Sede)
+        VALUES (COALESCE(%s, nextval('cita_id_cita_seq')), %s, '10:00', 'Control', 'Completada', 50, 30, 1, 1, 1)
+        RETURNING ID_Cita;
+    """, (id_cita, fecha))
+
+def ids_citas_cargadas(bd):
+    return [fila[0] for fila in consultar(bd, "SELECT id_cita FROM dw.fact_citas ORDER BY id_cita;")]
+
+def ids_citas_origen(bd):
+    return [fila[0] for fila in consultar(bd, "SELECT ID_Cita FROM Cita ORDER BY ID_Cita;")]
+
+# ============================================
+# CARGA INCREMENTAL
+# ============================================
+
+def test_corrida_incremental_carga_solo_lo_nuevo(bd):
+    ejecutar_etl()
+    assert ids_citas_cargadas(bd) == ids_citas_origen(bd)
+    
+    nueva = agregar_cita(bd, '2024-03-25')
+    # Línea nueva en una venta ya cargada: la marca de agua es la del detalle
+    consultar(bd, """
+        INSERT INTO DetalleVenta (ID_Venta, ID_Producto, Cantidad, Precio_Unitario, Subtotal)
+        VALUES (1, 2, 1, 45.00, 45.00);
+    """)
+    ejecutar_etl()
+    
+    assert ids_citas_cargadas(bd) == ids_citas_origen(bd)
+    assert valor(bd, "SELECT COUNT(*) FROM dw.fact_citas WHERE id_cita = %s;", (nueva,)) == 1
+    assert valor(bd, "SELECT COUNT(*) FROM dw.fact_ventas WHERE tipo_venta = 'Producto';") == \
+        valor(bd, "SELECT COUNT(*) FROM DetalleVenta;")
+    assert valor(bd, "SELECT COUNT(*) FROM dw.fact_ventas WHERE tipo_venta = 'Servicio';") == \
+        valor(bd, "SELECT COUNT(*) FROM DetalleServicio;")
+
+def test_fila_sin_dia_en_dim_tiempo_se_reintenta(bd, monkeypatch):
+    # Sin margen de relectura: la fila solo puede volver por la lista de pendientes
+    monkeypatch.setattr(etl_process, 'MARGEN_MARCA_AGUA', 0)
+    ejecutar_etl()
+    
+    pendiente = agregar_cita(bd, '2024-06-10')
+    consultar(bd, "CREATE TABLE dia_retirado AS SELECT * FROM dw.dim_tiempo WHERE fecha = '2024-06-10';")
+    consultar(bd, "DELETE FROM dw.dim_tiempo WHERE fecha = '2024-06-10';")
+    ejecutar_etl()
+    assert pendiente not in ids_citas_cargadas(bd)
+    assert consultar(bd, "SELECT proceso, id_origen FROM dw.etl_pendientes;") == [('fact_citas', pendiente)]
+    
+    consultar(bd, "INSERT INTO dw.dim_tiempo SELECT * FROM dia_retirado;")
+    ejecutar_etl()
+    assert ids_citas_cargadas(bd) == ids_citas_origen(bd)
+    assert valor(bd, "SELECT COUNT(*) FROM dw.etl_pendientes;") == 0
+
+def test_margen_relee_ids_confirmados_tarde(bd, monkeypatch):
+    monkeypatch.setattr(etl_process, 'MARGEN_MARCA_AGUA', 5)
+    ejecutar_etl()
+    
+    # ID tomado por una transacción que confirma después que la siguiente
+    tardio = valor(bd, "SELECT nextval('cita_id_cita_seq');")
+    agregar_cita(bd, '2024-03-26')
+    ejecutar_etl()
+    agregar_cita(bd, '2024-03-27', id_cita=tardio)
+    ejecutar_etl()
+    
+    assert ids_citas_cargadas(bd) == ids_citas_origen(bd)
+
+# ============================================
+# DIMENSIONES SCD TIPO 2
+# ============================================
+
+def versiones_cliente(bd, id_cliente):
+    return consultar(bd, """
+        SELECT telefono, direccion, es_actual, fecha_fin IS NOT NULL
+        FROM dw.dim_cliente WHERE id_cliente = %s ORDER BY version;
+    """, (id_cliente,))
+
+def test_scd2_versiona_solo_los_cambios(bd):
+    ejecutar_etl()
+    clientes = valor(bd, "SELECT COUNT(*) FROM Cliente;")
+    assert valor(bd, "SELECT COUNT(*) FROM dw.dim_cliente;") == clientes
+    
+    telefono, direccion = consultar(bd, "SELECT Telefono, Direccion FROM Cliente WHERE ID_Cliente = 1;")[0]
+    consultar(bd, "UPDATE Cliente SET Telefono = '999000111' WHERE ID_Cliente = 1;")
+    consultar(bd, "UPDATE Cliente SET Direccion = NULL WHERE ID_Cliente = 2;")
+    ejecutar_etl()
+    
+    assert versiones_cliente(bd, 1) == [(telefono, direccion, False, True), ('999000111', direccion, True, False)]
+    assert [version[1:3] for version in versiones_cliente(bd, 2)] == [(versiones_cliente(bd, 2)[0][1], False), (None, True)]
+    assert valor(bd, "SELECT COUNT(*) FROM dw.dim_cliente;") == clientes + 2
+    
+    # Sin cambios (NULL incluido) no hay versiones nuevas
+    ejecutar_etl()
+    assert valor(bd, "SELECT COUNT(*) FROM dw.dim_cliente;") == clientes + 2
+    assert valor(bd, "SELECT COUNT(*) FROM dw.dim_cliente WHERE es_actual;") == clientes
+
+# ============================================
+# LOTES MENSUALES Y REANUDACIÓN
+# ============================================
+
+def test_corrida_fallida_se_reanuda_sin_duplicar(bd, monkeypatch):
+    ejecutar_etl()
+    for fecha in ['2024-04-10', '2024-05-10', '2024-06-10']:
+        agregar_cita(bd, fecha)
+    
+    cargar_lote = etl_process.cargar_lote
+    def cargar_lote_con_falla(cursor, lote, mapas=None):
+        if lote['proceso'] == 'fact_citas' and lote['mes'] == '2024-05':
+            raise RuntimeError('falla simulada')
+        return cargar_lote(cursor, lote, mapas)
+    
+    monkeypatch.setattr(etl_process, 'cargar_lote', cargar_lote_con_falla)
+    with pytest.raises(RuntimeError):
+        ejecutar_etl()
+    # Los otros meses quedaron confirmados y la marca de agua no avanzó
+    assert valor(bd, "SELECT id_en_curso IS NOT NULL FROM dw.etl_control WHERE proceso = 'fact_citas';")
+    assert valor(bd, "SELECT COUNT(*) FROM dw.etl_control_lotes WHERE proceso = 'fact_citas';") > 0
+    assert len(ids_citas_cargadas(bd)) == len(ids_citas_origen(bd)) - 1
+    
+    monkeypatch.setattr(etl_process, 'cargar_lote', cargar_lote)
+    ejecutar_etl()
+    assert ids_citas_cargadas(bd) == ids_citas_origen(bd)
+    assert valor(bd, "SELECT COUNT(*) FROM dw.etl_control_lotes;") == 0
+    assert valor(bd, "SELECT id_en_curso FROM dw.etl_control WHERE proceso = 'fact_citas';") is None
+
+# ============================================
+# PARTICIONES
+# ============================================
+
+def test_cita_del_mes_en_curso_extiende_dim_tiempo(bd):
+    hoy = date.today()
+    nueva = agregar_cita(bd, hoy)
+    ejecutar_etl()
+    
+    assert nueva in ids_citas_cargadas(bd)
+    assert valor(bd, "SELECT to_regclass(%s) IS NOT NULL;", (f"dw.fact_citas_{hoy:%Y_%m}",))
+    ultimo_mes = date(hoy.year + (hoy.month + etl_process.MESES_PARTICION_ADELANTO - 1) // 12,
+                      (hoy.month + etl_process.MESES_PARTICION_ADELANTO - 1) % 12 + 1, 1)
+    assert valor(bd, "SELECT MAX(fecha) FROM dw.dim_tiempo;") >= ultimo_mes
+    # Sin huecos: una fila por día
+    assert valor(bd, "SELECT MAX(fecha) - MIN(fecha) + 1 = COUNT(*) FROM dw.dim_tiempo;")
+
+def test_recarga_de_mes_reenlaza_tratamientos_de_otros_meses(bd):
+    # Tratamiento de abril cuya cita es de marzo
+    consultar(bd, """
+        INSERT INTO Tratamiento (Descripcion, Fecha_Inicio, Estado, Costo, ID_Cita)
+        VALUES ('Control de seguimiento', '2024-04-05 10:00', 'En Progreso', 30.00, 1);
+    """)
+    ejecutar_etl()
+    ejecutar_etl(mes='2024-03')
+    
+    assert consultar(bd, """
+        SELECT tr.ID_Tratamiento
+        FROM Tratamiento tr
+        INNER JOIN dw.fact_tratamientos ft ON ft.id_tratamiento = tr.ID_Tratamiento
+        LEFT JOIN dw.fact_citas fc ON fc.id_cita = tr.ID_Cita
+        WHERE ft.sk_cita IS DISTINCT FROM fc.sk_cita;
+    """) == []
+
+# ============================================
+# CLAVES SUSTITUTAS EN MEMORIA
+# ============================================
+
+@pytest.mark.parametrize('pares, tipo', [
+    ([(1, 10), (2, 20), (4, 40)], array),           # IDs densos
+    ([(1, 10), (1_000_000, 20), (7, 70)], dict)     # IDs dispersos
+])
+def test_mapa_claves_equivale_al_dict(pares, tipo):
+    mapa = MapaClaves(pares)
+    assert isinstance(mapa.claves, tipo)
+    esperado = dict(pares)
+    for natural in [None, -1, 0, 1, 2, 3, 4, 5, 7, 999_999, 1_000_000, 1_000_001]:
+        assert mapa.get(natural) == esperado.get(natural)
+
+def test_mapa_claves_vacio():
+    assert MapaClaves([]).get(1) is None
+
+class CursorDimTiempo:
+    """Cursor mínimo que responde las consultas de CalendarioClaves sobre filas (fecha, sk_tiempo)"""
+    
+    def __init__(self, filas):
+        self.filas = filas
+        self.resultado = None
+    
+    def execute(self, sql, parametros=None):
+        if 'COUNT(*)' in sql:
+            fechas = [fecha for fecha, _ in self.filas]
+            claves = [sk for _, sk in self.filas]
+            if not self.filas:
+                self.resultado = [(None, None, None, 0, 0)]
+                return
+            desfasadas = sum(
+                1 for fecha, sk in self.filas if sk - min(claves) != (fecha - min(fechas)).days
+            )
+            self.resultado = [(min(fechas), max(fechas), min(claves), len(self.filas), desfasadas)]
+        else:
+            self.resultado = list(self.filas)
+    
+    def fetchone(self):
+        return self.resultado[0]
+    
+    def fetchall(self):
+        return self.resultado
+
+def dim_tiempo(inicio, dias, sk_base=1):
+    return [(inicio + timedelta(days=n), sk_base + n) for n in range(dias)]
+
+@pytest.mark.parametrize('filas, aritmetico', [
+    (dim_tiempo(date(2020, 1, 1), 366 * 6), True),                                  # Como schema_datawarehouse.sql
+    (dim_tiempo(date(2024, 2, 27), 5, sk_base=20240227), True),                     # Otra numeración base
+    (dim_tiempo(date(2024, 1, 1), 10)[:4] + dim_tiempo(date(2024, 1, 1), 10)[5:], False),  # Hueco
+    ([(date(2024, 1, 2), 1), (date(2024, 1, 1), 2), (date(2024, 1, 3), 3)], False),  # Fuera de orden
+    ([], False)
+])
+def test_calendario_coincide_con_dim_tiempo(filas, aritmetico):
+    calendario = CalendarioClaves(CursorDimTiempo(filas))
+    assert calendario.aritmetico == aritmetico
+    
+    esperado = dict(filas)
+    if filas:
+        fechas = sorted(esperado)
+        desde, hasta = fechas[0] - timedelta(days=3), fechas[-1] + timedelta(days=3)
+        consultadas = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+    else:
+        consultadas = [date(2024, 1, 1)]
+    for fecha in consultadas + [None]:
+        assert calendario.get(fecha) == esperado.get(fecha)
+
+def hechos_sin_claves_propias(bd):
+    """Filas de citas y ventas sin su clave sustituta ni la fecha de carga"""
+    return {
+        hecho: consultar(bd, f"""
+            SELECT {', '.join(columnas)} FROM dw.{hecho} ORDER BY {', '.join(columnas)};
+        """)
+        for hecho, columnas in {
+            'fact_citas': ['id_cita', 'fecha', 'sk_tiempo', 'sk_cliente', 'sk_mascota', 'sk_veterinario',
+                           'sk_sede', 'hora_cita', 'estado', 'costo_cita', 'es_primera_cita', 'asistio'],
+            'fact_ventas': ['id_venta', 'tipo_venta', 'numero_linea', 'fecha', 'sk_tiempo', 'sk_cliente',
+                            'sk_sede', 'sk_producto', 'sk_servicio', 'cantidad', 'total', 'margen_total']
+        }.items()
+    }
+
+def test_claves_en_memoria_cargan_lo_mismo_que_sql(bd):
+    ejecutar_etl()
+    por_sql = hechos_sin_claves_propias(bd)
+    ejecutar_etl(recarga_completa=True, claves_en_memoria=True)
+    assert hechos_sin_claves_propias(bd) == por_sql
+    
+    # Una corrida repetida no duplica filas (COPY a tabla temporal + ON CONFLICT)
+    ejecutar_etl(claves_en_memoria=True)
+    assert hechos_sin_claves_propias(bd) == por_sql
+
+# ============================================
+# AGREGADOS Y RFM
+# ============================================
+
+def diferencias(bd, tabla, recalculo):
+    """Filas que difieren entre un agregado y su recálculo desde los hechos (en ambos sentidos)"""
+    return consultar(bd, f"""
+        (SELECT * FROM {tabla} EXCEPT ALL ({recalculo}))
+        UNION ALL
+        (({recalculo}) EXCEPT ALL SELECT * FROM {tabla});
+    """)
+
+def test_agregados_se_refrescan_con_la_carga(bd):
+    ejecutar_etl()
+    # Venta nueva en otro mes y cita nueva en un mes ya agregado
+    id_venta = valor(bd, """
+        INSERT INTO Venta (Fecha, Total, Tipo_Pago, Estado, ID_Cliente, ID_Sede, Descuento)
+        VALUES ('2024-05-02 10:00', 90.00, 'Efectivo', 'Completada', 1, 2, 0) RETURNING ID_Venta;
+    """)
+    consultar(bd, """
+        INSERT INTO DetalleVenta (ID_Venta, ID_Producto, Cantidad, Precio_Unitario, Subtotal)
+        VALUES (%s, 1, 1, 85.50, 85.50);
+    """, (id_venta,))
+    agregar_cita(bd, '2024-03-28')
+    ejecutar_etl()
+    
+    assert diferencias(bd, 'dw.agg_ventas_sede_mes', """
+        SELECT DATE_TRUNC('month', fecha)::DATE, sk_sede, COUNT(DISTINCT id_venta), SUM(cantidad),
+               SUM(total), SUM(margen_total), COUNT(DISTINCT sk_cliente)
+        FROM dw.fact_ventas WHERE sk_sede IS NOT NULL
+        GROUP BY 1, 2
+    """) == []
+    assert diferencias(bd, 'dw.agg_citas_mascota', """
+        SELECT sk_mascota, COUNT(*), SUM(costo_cita), COUNT(costo_cita), MIN(fecha), MAX(fecha)
+        FROM dw.fact_citas GROUP BY sk_mascota
+    """) == []
+    assert diferencias(bd, 'dw.rfm_clientes', """
+        SELECT sk_cliente, COUNT(DISTINCT id_venta), SUM(total), MAX(fecha)
+        FROM dw.fact_ventas GROUP BY sk_cliente
+    """) == []
+
+def percentiles_disc(valores, descendente):
+    """percentile_disc(0.2, 0.4, 0.6, 0.8) de PostgreSQL"""
+    ordenados = sorted(valores, reverse=descendente)
+    return [ordenados[max(math.ceil(fraccion * len(ordenados)) - 1, 0)] for fraccion in (0.2, 0.4, 0.6, 0.8)]
+
+def test_cortes_rfm_son_los_quintiles_de_los_clientes(bd):
+    ejecutar_etl()
+    estado = consultar(bd, """
+        SELECT r.ultima_compra, r.num_compras, r.gasto_total
+        FROM dw.rfm_clientes r
+        INNER JOIN dw.dim_cliente c ON r.sk_cliente = c.sk_cliente AND c.es_actual;
+    """)
+    clientes, ultima_compra, num_compras, gasto_total = consultar(bd, """
+        SELECT clientes, cortes_ultima_compra, cortes_num_compras, cortes_gasto_total FROM dw.rfm_cortes;
+    """)[0]
+    
+    assert clientes == len(estado)
+    assert ultima_compra == percentiles_disc([fila[0] for fila in estado], descendente=True)
+    assert num_compras == percentiles_disc([fila[1] for fila in estado], descendente=True)
+    assert gasto_total == percentiles_disc([fila[2] for fila in estado], descendente=True)
+    
+    # Como NTILE(5) sobre el orden descendente: el mayor gasto queda en el quintil 1
+    puntajes = consultar(bd, "SELECT m_score FROM dw.v_tableau_rfm_clientes ORDER BY gasto_total DESC;")
+    assert len(puntajes) == clientes
+    assert puntajes[0][0] == 1 and puntajes[-1][0] == 5
@@ -0,0 +1,119 @@
+"""
+Pruebas de la exportación del Data Warehouse: instantánea Parquet por mes
+(etl_process.py --exportar-parquet), consultas con DuckDB sobre ella y
+escritura en flujo de consultas a CSV/Parquet.
+
+Requieren la base de VETERINARIA_TEST_DSN (ver conftest.py), pyarrow y duckdb.
+
+Uso (desde 2-ETL):
+    python -m pytest -q tests
+"""
+
+import csv
+import json
+import os
+from functools import partial
+
+import psycopg2
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+pytest.importorskip('duckdb')
+
+import consultas_columnar
+import etl_process
+import exportar_consultas
+from etl_process import ARCHIVO_MANIFIESTO, ejecutar_etl
+
+def consultar(bd, sql, parametros=None):
+    with bd.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return cursor.fetchall() if cursor.description else None
+
+def leer_manifiesto(directorio):
+    with open(os.path.join(directorio, ARCHIVO_MANIFIESTO), encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+def filas_parquet(ruta, columnas):
+    tabla = pq.read_table(ruta, columns=columnas)
+    return sorted(zip(*(tabla.column(columna).to_pylist() for columna in columnas)))
+
+# ============================================
+# INSTANTÁNEA PARQUET
+# ============================================
+
+def test_exportacion_por_mes_coincide_con_la_base(bd, tmp_path):
+    ejecutar_etl(directorio_parquet=str(tmp_path))
+    
+    manifiesto = leer_manifiesto(tmp_path)
+    assert manifiesto['completa']
+    # initial_data.sql: todos los hechos son de marzo de 2024
+    assert os.listdir(tmp_path / 'fact_ventas') == ['mes_anio=2024-03']
+    ruta = tmp_path / 'fact_ventas' / 'mes_anio=2024-03' / 'parte.parquet'
+    columnas = ['id_venta', 'tipo_venta', 'numero_linea', 'sk_cliente', 'total']
+    assert filas_parquet(ruta, columnas) == sorted(consultar(bd, f"SELECT {', '.join(columnas)} FROM dw.fact_ventas;"))
+    
+    con, _, _ = consultas_columnar.abrir_instantanea(str(tmp_path))
+    sql = "SELECT sk_sede, COUNT(*), SUM(total) FROM dw.fact_ventas GROUP BY sk_sede ORDER BY sk_sede"
+    assert con.execute(sql).fetchall() == consultar(bd, sql)
+    sql = "SELECT cliente, gasto_total, rfm_score FROM dw.v_tableau_rfm_clientes ORDER BY sk_cliente"
+    assert con.execute(sql).fetchall() == consultar(bd, sql)
+
+def test_recarga_de_mes_reexporta_los_tratamientos_reenlazados(bd, tmp_path):
+    # Tratamiento de abril cuya cita es de marzo
+    consultar(bd, """
+        INSERT INTO Tratamiento (Descripcion, Fecha_Inicio, Estado, Costo, ID_Cita)
+        VALUES ('Control de seguimiento', '2024-04-05 10:00', 'En Progreso', 30.00, 1);
+    """)
+    ejecutar_etl(directorio_parquet=str(tmp_path))
+    ejecutar_etl(mes='2024-03', directorio_parquet=str(tmp_path))
+    
+    manifiesto = leer_manifiesto(tmp_path)
+    assert not manifiesto['completa']
+    assert manifiesto['tablas']['fact_tratamientos']['meses_escritos'] == 2
+    ruta = tmp_path / 'fact_tratamientos' / 'mes_anio=2024-04' / 'parte.parquet'
+    assert filas_parquet(ruta, ['id_tratamiento', 'sk_cita']) == consultar(bd, """
+        SELECT id_tratamiento, sk_cita FROM dw.fact_tratamientos WHERE fecha >= '2024-04-01' AND fecha < '2024-05-01';
+    """)
+
+# ============================================
+# EXPORTACIÓN EN FLUJO
+# ============================================
+
+def test_exportacion_en_flujo_igual_a_la_consulta(bd, tmp_path, capsys):
+    ejecutar_etl()
+    sql = "SELECT * FROM dw.v_tableau_ventas ORDER BY sk_venta"
+    esperado = consultar(bd, sql)
+    
+    # itersize menor que el resultado: varios viajes del cursor y grupos de filas
+    exportar_consultas.exportar('ventas', sql, str(tmp_path / 'ventas.parquet'), itersize=4)
+    tabla = pq.read_table(tmp_path / 'ventas.parquet')
+    assert tabla.num_rows == len(esperado)
+    # Los NUMERIC sin precisión (cocientes de la vista) se escriben como double
+    flotantes = [pa.types.is_floating(campo.type) for campo in tabla.schema]
+    assert list(zip(*(columna.to_pylist() for columna in tabla.columns))) == [
+        tuple(float(valor) if flotante and valor is not None else valor for valor, flotante in zip(fila, flotantes))
+        for fila in esperado
+    ]
+    
+    exportar_consultas.exportar('ventas', sql, str(tmp_path / 'ventas.csv'), itersize=4)
+    with open(tmp_path / 'ventas.csv', encoding='utf-8', newline='') as archivo:
+        assert len(list(csv.reader(archivo))) == len(esperado) + 1  # Cabecera
+    assert sorted(os.listdir(tmp_path)) == ['ventas.csv', 'ventas.parquet']
+
+@pytest.mark.parametrize('escribir', [
+    etl_process.escribir_csv,
+    partial(etl_process.escribir_parquet, itersize=1_000)  # Varios grupos de filas antes de la falla
+])
+def test_escritura_fallida_no_deja_archivos(bd, tmp_path, escribir):
+    conn = psycopg2.connect(etl_process.DB_CONFIG['dsn'])
+    try:
+        # Falla a mitad del resultado
+        sql = "SELECT g, 1 / (5000 - g) AS x FROM generate_series(1, 10000) AS g"
+        with pytest.raises(psycopg2.Error):
+            escribir(conn.cursor(), sql, None, str(tmp_path / 'salida'))
+    finally:
+        conn.rollback()
+        conn.close()
+    assert os.listdir(tmp_path) == []
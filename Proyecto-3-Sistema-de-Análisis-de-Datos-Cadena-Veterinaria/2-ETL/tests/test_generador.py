@@ -0,0 +1,142 @@
+"""
+Pruebas del generador de datos: shards reproducibles, numeración de detalles,
+muestreo sobre tramos de IDs y permutación de claves únicas.
+
+Uso (desde 2-ETL):
+    python -m pytest -q tests
+"""
+
+import random
+
+import numpy as np
+import pytest
+from faker import Faker
+
+import data_generator
+from data_generator import (TAMANO_LOTE, PermutacionClaves, TramosIds, clave_unica, construir_shard,
+                            numerar_detalles)
+
+# ============================================
+# SHARDS
+# ============================================
+
+def construir(entidad, numero_shard, ids, **contexto):
+    return construir_shard(entidad, numero_shard, ids, Faker(data_generator.LOCALE_FAKER), contexto)
+
+def test_shard_depende_solo_de_su_numero():
+    ids = range(10_001, 10_051)
+    assert construir('clientes', 1, ids) == construir('clientes', 1, ids)
+    assert construir('clientes', 1, ids) != construir('clientes', 2, ids)
+
+def test_claves_unicas_entre_shards():
+    # Inicio de tres shards consecutivos, construidos por separado como en --workers N
+    filas = []
+    for numero_shard in range(3):
+        inicio = 1 + numero_shard * TAMANO_LOTE
+        columnas, filas_shard = construir('clientes', numero_shard, range(inicio, inicio + 300))['Cliente']
+        filas.extend(filas_shard)
+    for columna in ['Dni', 'Correo_Electronico']:
+        valores = [fila[columnas.index(columna)] for fila in filas]
+        assert len(set(valores)) == len(valores), columna
+
+# ============================================
+# NUMERACIÓN DE DETALLES
+# ============================================
+
+def test_numerar_detalles_por_venta_y_linea():
+    # (ID_Venta, ...) en el orden en que las construye el generador
+    filas = [(50, 'a'), (50, 'b'), (51, 'c'), (53, 'd'), (53, 'e'), (53, 'f')]
+    numeradas = numerar_detalles(filas, id_venta_base=50, id_detalle_base=1_000, maximo_por_venta=5)
+    assert [fila[0] for fila in numeradas] == [1_000, 1_001, 1_005, 1_015, 1_016, 1_017]
+    assert [fila[1:] for fila in numeradas] == filas
+
+def test_numerar_detalles_no_se_solapan_entre_shards():
+    # Dos shards numerados por separado con las mismas bases no repiten IDs
+    primero = [(venta, linea) for venta in range(10, 20) for linea in range(venta % 3 + 1)]
+    segundo = [(venta, linea) for venta in range(20, 30) for linea in range(venta % 3 + 1)]
+    primero = numerar_detalles(primero, 10, 500, 3)
+    segundo = numerar_detalles(segundo, 10, 500, 3)
+    ids = [fila[0] for fila in primero + segundo]
+    assert len(set(ids)) == len(ids)
+
+def test_detalles_de_ventas_con_bases():
+    precios = {'precios_producto': {1: 10.0, 2: 20.0}, 'precios_servicio': {1: 5.0}}
+    cargas = construir_shard(
+        'ventas', 0, range(100, 120), Faker(data_generator.LOCALE_FAKER),
+        dict(ids_clientes=[1, 2], ids_sedes=[1], ids_productos=[1, 2], ids_servicios=[1], **precios),
+        {'base_venta': 100, 'base_detalle_venta': 1, 'base_detalle_servicio': 1}
+    )
+    columnas, detalles = cargas['DetalleVenta']
+    assert columnas[:2] == ['ID_Detalle', 'ID_Venta']
+    assert all(1 <= fila[0] - (fila[1] - 100) * data_generator.MAX_PRODUCTOS_VENTA <= 5 for fila in detalles)
+    assert len({fila[0] for fila in detalles}) == len(detalles)
+
+# ============================================
+# TRAMOS DE IDS
+# ============================================
+
+TRAMOS = [(1, 5), (10, 10), (20, 24), (100, 102)]
+
+def ids_de_tramos(tramos):
+    return [i for inicio, fin in tramos for i in range(inicio, fin + 1)]
+
+def test_tramos_se_indexan_como_la_lista():
+    tramos = TramosIds(TRAMOS)
+    lista = ids_de_tramos(TRAMOS)
+    assert len(tramos) == len(lista)
+    assert [tramos[i] for i in range(len(tramos))] == lista
+    assert tramos.tomar(np.arange(len(lista))).tolist() == lista
+    with pytest.raises(IndexError):
+        tramos[len(lista)]
+
+def test_tramos_muestrean_dentro_de_las_islas():
+    tramos = TramosIds(TRAMOS)
+    validos = set(ids_de_tramos(TRAMOS))
+    rng = random.Random(7)
+    muestra = [rng.choice(tramos) for _ in range(5_000)]
+    assert set(muestra) == validos
+    
+    gen = np.random.default_rng(7)
+    assert set(data_generator.elegir_np(gen, tramos, 5_000).tolist()) <= validos
+
+def test_tramos_mismo_sorteo_que_la_lista():
+    tramos = TramosIds(TRAMOS)
+    lista = ids_de_tramos(TRAMOS)
+    rng_tramos, rng_lista = random.Random(3), random.Random(3)
+    assert [rng_tramos.choice(tramos) for _ in range(100)] == [rng_lista.choice(lista) for _ in range(100)]
+
+def test_tramos_vacios():
+    tramos = TramosIds([])
+    assert len(tramos) == 0
+    with pytest.raises(IndexError):
+        random.Random(1).choice(tramos)
+
+# ============================================
+# PERMUTACIÓN DE CLAVES ÚNICAS
+# ============================================
+
+@pytest.mark.parametrize('espacio', [1, 2, 3, 7, 16, 100, 1000, 4097])
+def test_permutacion_es_biyeccion(espacio):
+    permutacion = PermutacionClaves(espacio, f"prueba-{espacio}")
+    assert sorted(permutacion[i] for i in range(espacio)) == list(range(espacio))
+
+def test_permutacion_depende_de_la_etiqueta():
+    a = PermutacionClaves(1000, 'a')
+    b = PermutacionClaves(1000, 'b')
+    assert [a[i] for i in range(1000)] != [b[i] for i in range(1000)]
+
+def test_permutacion_fuera_del_espacio():
+    with pytest.raises(IndexError):
+        PermutacionClaves(10, 'prueba')[10]
+
+def test_clave_unica_dentro_del_rango():
+    claves = [clave_unica(i, 1_000, 1_999) for i in range(1_000)]
+    assert sorted(claves) == list(range(1_000, 2_000))
+
+def test_clave_unica_fuera_del_espacio():
+    with pytest.raises(ValueError):
+        clave_unica(1_000, 1_000, 1_999)
+
+def test_espacio_de_claves_se_valida_antes_de_construir():
+    with pytest.raises(ValueError, match='Colegiatura'):
+        data_generator.validar_espacio_claves('veterinarios', range(1, 10_001))
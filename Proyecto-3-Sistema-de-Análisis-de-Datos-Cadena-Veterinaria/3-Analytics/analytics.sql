@@ -137,29 +137,28 @@ ORDER BY dias_sin_vender DESC;
 -- 3. ANÁLISIS DE CLIENTES
 -- ============================================
 
--- Segmentación RFM de Clientes
+-- Segmentación RFM de Clientes (estado por cliente y cortes de quintil que mantiene el ETL)
 WITH rfm_base AS (
     SELECT 
         c.sk_cliente,
         c.nombre_completo,
         c.segmento_cliente,
-        MAX(t.fecha) AS ultima_compra,
-        CURRENT_DATE - MAX(t.fecha) AS recency,
-        COUNT(DISTINCT v.id_venta) AS frequency,
-        SUM(v.total) AS monetary
-    FROM dw.fact_ventas v
-    INNER JOIN dw.dim_cliente c ON v.sk_cliente = c.sk_cliente
-    INNER JOIN dw.dim_tiempo t ON v.sk_tiempo = t.sk_tiempo
+        r.ultima_compra,
+        CURRENT_DATE - r.ultima_compra AS recency,
+        r.num_compras AS frequency,
+        r.gasto_total AS monetary
+    FROM dw.rfm_clientes r
+    INNER JOIN dw.dim_cliente c ON r.sk_cliente = c.sk_cliente
     WHERE c.es_actual = TRUE
-    GROUP BY c.sk_cliente, c.nombre_completo, c.segmento_cliente
 ),
 rfm_scores AS (
     SELECT 
-        *,
-        NTILE(5) OVER (ORDER BY recency) AS r_score,
-        NTILE(5) OVER (ORDER BY frequency DESC) AS f_score,
-        NTILE(5) OVER (ORDER BY monetary DESC) AS m_score
-    FROM rfm_base
+        b.*,
+        dw.quintil_rfm(b.ultima_compra, k.cortes_ultima_compra) AS r_score,
+        dw.quintil_rfm(b.frequency, k.cortes_num_compras) AS f_score,
+        dw.quintil_rfm(b.monetary, k.cortes_gasto_total) AS m_score
+    FROM rfm_base b
+    CROSS JOIN dw.rfm_cortes k
 )
 SELECT 
     nombre_completo,
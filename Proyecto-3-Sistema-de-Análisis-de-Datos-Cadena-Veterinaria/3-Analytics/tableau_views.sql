@@ -6,6 +6,10 @@
 -- Estas vistas simplifican la conexión de Tableau y mejoran el rendimiento
 -- Úsalas como fuentes de datos principales en Tableau
 
+-- Las vistas 3 a 7 leen los agregados dw.agg_* y el estado RFM (dw.rfm_*) que
+-- el ETL mantiene (schema_datawarehouse.sql): su costo no depende del
+-- histórico de hechos
+
 -- ============================================
 -- VISTA 1: VENTAS CONSOLIDADAS (Uso principal)
 -- ============================================
@@ -20,8 +24,8 @@ SELECT
     fv.sk_producto,
     fv.sk_servicio,
     
-    -- Dimensión Tiempo
-    t.fecha,
+    -- Dimensión Tiempo (fecha del hecho: los filtros por fecha podan particiones)
+    fv.fecha,
     t.anio AS año,
     t.mes,
     t.mes_nombre,
@@ -101,8 +105,8 @@ SELECT
     fc.sk_veterinario,
     fc.sk_sede,
     
-    -- Dimensión Tiempo
-    t.fecha,
+    -- Dimensión Tiempo (fecha del hecho: los filtros por fecha podan particiones)
+    fc.fecha,
     t.anio AS año,
     t.mes,
     t.mes_nombre,
@@ -187,17 +191,17 @@ WITH ventas_mes AS (
         s.nombre AS sede,
         s.ciudad,
         
-        -- Métricas de ventas
-        COUNT(DISTINCT fv.id_venta) AS num_ventas,
-        SUM(fv.cantidad) AS unidades_vendidas,
-        SUM(fv.total) AS ingresos_ventas,
-        SUM(fv.margen_total) AS margen_ventas,
+        -- Métricas de ventas (una fila por mes y sede en el agregado)
+        SUM(a.num_ventas) AS num_ventas,
+        SUM(a.unidades_vendidas)::BIGINT AS unidades_vendidas,
+        SUM(a.ingresos_ventas) AS ingresos_ventas,
+        SUM(a.margen_ventas) AS margen_ventas,
         
         -- Clientes
-        COUNT(DISTINCT fv.sk_cliente) AS clientes_unicos
-    FROM dw.fact_ventas fv
-    INNER JOIN dw.dim_tiempo t ON fv.sk_tiempo = t.sk_tiempo
-    INNER JOIN dw.dim_sede s ON fv.sk_sede = s.sk_sede AND s.es_actual = TRUE
+        SUM(a.clientes_unicos) AS clientes_unicos
+    FROM dw.agg_ventas_sede_mes a
+    INNER JOIN dw.dim_tiempo t ON a.fecha_mes = t.fecha
+    INNER JOIN dw.dim_sede s ON a.sk_sede = s.sk_sede AND s.es_actual = TRUE
     GROUP BY t.anio, t.mes, t.mes_nombre, t.mes_anio, s.nombre, s.ciudad
 ),
 citas_mes AS (
@@ -207,12 +211,12 @@ citas_mes AS (
         s.nombre AS sede,
         
         -- Métricas de citas
-        COUNT(*) AS num_citas,
-        SUM(CASE WHEN fc.asistio THEN 1 ELSE 0 END) AS citas_completadas,
-        SUM(fc.costo_cita) AS ingresos_citas
-    FROM dw.fact_citas fc
-    INNER JOIN dw.dim_tiempo t ON fc.sk_tiempo = t.sk_tiempo
-    INNER JOIN dw.dim_sede s ON fc.sk_sede = s.sk_sede AND s.es_actual = TRUE
+        SUM(a.total_citas) AS num_citas,
+        SUM(a.citas_completadas) AS citas_completadas,
+        SUM(a.ingresos_citas) AS ingresos_citas
+    FROM dw.agg_citas_veterinario_mes a
+    INNER JOIN dw.dim_tiempo t ON a.fecha_mes = t.fecha
+    INNER JOIN dw.dim_sede s ON a.sk_sede = s.sk_sede AND s.es_actual = TRUE
     GROUP BY t.anio, t.mes, s.nombre
 )
 SELECT 
@@ -278,37 +282,35 @@ SELECT
     p.tipo,
     
     -- Métricas agregadas
-    COUNT(*) AS veces_vendido,
-    SUM(fv.cantidad) AS unidades_totales,
-    SUM(fv.total) AS ingresos_totales,
-    SUM(fv.margen_total) AS margen_total,
+    SUM(a.veces_vendido) AS veces_vendido,
+    SUM(a.unidades)::BIGINT AS unidades_totales,
+    SUM(a.ingresos) AS ingresos_totales,
+    SUM(a.margen) AS margen_total,
     
     -- Promedios
-    ROUND(AVG(fv.precio_unitario), 2) AS precio_promedio,
-    ROUND(AVG(fv.margen_unitario), 2) AS margen_promedio,
+    ROUND(SUM(a.suma_precio_unitario) / NULLIF(SUM(a.lineas_con_precio), 0), 2) AS precio_promedio,
+    ROUND(SUM(a.suma_margen_unitario) / NULLIF(SUM(a.lineas_con_margen), 0), 2) AS margen_promedio,
     
     -- Porcentajes
-    ROUND(SUM(fv.margen_total) / NULLIF(SUM(fv.total), 0) * 100, 2) AS margen_porcentaje,
+    ROUND(SUM(a.margen) / NULLIF(SUM(a.ingresos), 0) * 100, 2) AS margen_porcentaje,
     
     -- Ranking
-    RANK() OVER (ORDER BY SUM(fv.total) DESC) AS ranking_por_ingresos,
-    RANK() OVER (ORDER BY SUM(fv.margen_total) DESC) AS ranking_por_margen,
+    RANK() OVER (ORDER BY SUM(a.ingresos) DESC) AS ranking_por_ingresos,
+    RANK() OVER (ORDER BY SUM(a.margen) DESC) AS ranking_por_margen,
     
     -- Última venta
-    MAX(t.fecha) AS ultima_venta,
-    CURRENT_DATE - MAX(t.fecha) AS dias_sin_vender,
+    MAX(a.ultima_venta) AS ultima_venta,
+    CURRENT_DATE - MAX(a.ultima_venta) AS dias_sin_vender,
     
     -- Clasificación ABC
     CASE 
-        WHEN PERCENT_RANK() OVER (ORDER BY SUM(fv.total) DESC) <= 0.20 THEN 'A - Alto Valor'
-        WHEN PERCENT_RANK() OVER (ORDER BY SUM(fv.total) DESC) <= 0.50 THEN 'B - Valor Medio'
+        WHEN PERCENT_RANK() OVER (ORDER BY SUM(a.ingresos) DESC) <= 0.20 THEN 'A - Alto Valor'
+        WHEN PERCENT_RANK() OVER (ORDER BY SUM(a.ingresos) DESC) <= 0.50 THEN 'B - Valor Medio'
         ELSE 'C - Bajo Valor'
     END AS clasificacion_abc
     
-FROM dw.fact_ventas fv
-INNER JOIN dw.dim_producto p ON fv.sk_producto = p.sk_producto AND p.es_actual = TRUE
-INNER JOIN dw.dim_tiempo t ON fv.sk_tiempo = t.sk_tiempo
-WHERE fv.tipo_venta = 'Producto'
+FROM dw.agg_productos_mes a
+INNER JOIN dw.dim_producto p ON a.sk_producto = p.sk_producto AND p.es_actual = TRUE
 GROUP BY p.sk_producto, p.nombre, p.categoria, p.tipo
 ORDER BY ingresos_totales DESC;
 
@@ -326,28 +328,28 @@ WITH rfm_base AS (
         c.segmento_cliente,
         
         -- Recency: días desde última compra
-        CURRENT_DATE - MAX(t.fecha) AS recency,
+        r.ultima_compra,
+        CURRENT_DATE - r.ultima_compra AS recency,
         
         -- Frequency: número de compras
-        COUNT(DISTINCT fv.id_venta) AS frequency,
+        r.num_compras AS frequency,
         
         -- Monetary: total gastado
-        SUM(fv.total) AS monetary
+        r.gasto_total AS monetary
         
     FROM dw.dim_cliente c
-    INNER JOIN dw.fact_ventas fv ON c.sk_cliente = fv.sk_cliente
-    INNER JOIN dw.dim_tiempo t ON fv.sk_tiempo = t.sk_tiempo
+    INNER JOIN dw.rfm_clientes r ON c.sk_cliente = r.sk_cliente
     WHERE c.es_actual = TRUE
-    GROUP BY c.sk_cliente, c.nombre_completo, c.ciudad, c.segmento_cliente
 ),
 rfm_scores AS (
     SELECT 
-        *,
-        -- Scores de 1-5 (5 es mejor)
-        NTILE(5) OVER (ORDER BY recency) AS r_score,
-        NTILE(5) OVER (ORDER BY frequency DESC) AS f_score,
-        NTILE(5) OVER (ORDER BY monetary DESC) AS m_score
-    FROM rfm_base
+        b.*,
+        -- Scores de 1-5 (5 es mejor): cortes de quintil que el ETL calcula sobre dw.rfm_clientes
+        dw.quintil_rfm(b.ultima_compra, k.cortes_ultima_compra) AS r_score,
+        dw.quintil_rfm(b.frequency, k.cortes_num_compras) AS f_score,
+        dw.quintil_rfm(b.monetary, k.cortes_gasto_total) AS m_score
+    FROM rfm_base b
+    CROSS JOIN dw.rfm_cortes k
 )
 SELECT 
     sk_cliente,
@@ -357,7 +359,7 @@ SELECT
     
     -- Métricas RFM
     recency AS dias_desde_ultima_compra,
-    frequency AS numero_compras,
+    frequency::BIGINT AS numero_compras,
     ROUND(monetary, 2) AS gasto_total,
     ROUND(monetary / frequency, 2) AS ticket_promedio,
     
@@ -401,41 +403,45 @@ SELECT
     s.ciudad,
     
     -- Métricas de citas
-    COUNT(*) AS total_citas,
-    SUM(CASE WHEN fc.asistio THEN 1 ELSE 0 END) AS citas_completadas,
-    SUM(CASE WHEN NOT fc.asistio THEN 1 ELSE 0 END) AS citas_no_asistidas,
+    SUM(a.total_citas) AS total_citas,
+    SUM(a.citas_completadas) AS citas_completadas,
+    SUM(a.citas_no_asistidas) AS citas_no_asistidas,
     
     -- Tasas
-    ROUND(SUM(CASE WHEN fc.asistio THEN 1 ELSE 0 END)::NUMERIC / COUNT(*) * 100, 2) AS tasa_asistencia_pct,
+    ROUND(SUM(a.citas_completadas)::NUMERIC / SUM(a.total_citas) * 100, 2) AS tasa_asistencia_pct,
     
     -- Tiempos
-    ROUND(AVG(fc.duracion_minutos), 2) AS duracion_promedio_min,
-    SUM(fc.duracion_minutos) AS minutos_totales,
-    ROUND(SUM(fc.duracion_minutos) / 60.0, 2) AS horas_totales,
+    ROUND(SUM(a.minutos_totales)::NUMERIC / NULLIF(SUM(a.citas_con_duracion), 0), 2) AS duracion_promedio_min,
+    SUM(a.minutos_totales)::BIGINT AS minutos_totales,
+    ROUND(SUM(a.minutos_totales) / 60.0, 2) AS horas_totales,
     
     -- Ingresos
-    SUM(fc.costo_cita) AS ingresos_citas,
-    ROUND(AVG(fc.costo_cita), 2) AS costo_promedio_cita,
+    SUM(a.ingresos_citas) AS ingresos_citas,
+    ROUND(SUM(a.ingresos_citas) / NULLIF(SUM(a.citas_con_costo), 0), 2) AS costo_promedio_cita,
     
     -- Productividad
-    ROUND(SUM(fc.costo_cita) / NULLIF(SUM(fc.duracion_minutos) / 60.0, 0), 2) AS ingreso_por_hora,
+    ROUND(SUM(a.ingresos_citas) / NULLIF(SUM(a.minutos_totales) / 60.0, 0), 2) AS ingreso_por_hora,
     
     -- Tipos de consulta
-    SUM(CASE WHEN fc.es_emergencia THEN 1 ELSE 0 END) AS consultas_emergencia,
-    SUM(CASE WHEN fc.es_control THEN 1 ELSE 0 END) AS consultas_control,
-    SUM(CASE WHEN fc.es_primera_cita THEN 1 ELSE 0 END) AS primeras_consultas,
+    SUM(a.consultas_emergencia) AS consultas_emergencia,
+    SUM(a.consultas_control) AS consultas_control,
+    SUM(a.primeras_consultas) AS primeras_consultas,
     
-    -- Mascotas únicas atendidas
-    COUNT(DISTINCT fc.sk_mascota) AS mascotas_unicas,
+    -- Mascotas únicas atendidas (no se suman por mes: pares veterinario-mascota)
+    MAX(mv.mascotas_unicas) AS mascotas_unicas,
     
     -- Fechas
-    MIN(t.fecha) AS primera_cita,
-    MAX(t.fecha) AS ultima_cita
-    
-FROM dw.fact_citas fc
-INNER JOIN dw.dim_veterinario v ON fc.sk_veterinario = v.sk_veterinario AND v.es_actual = TRUE
-INNER JOIN dw.dim_sede s ON fc.sk_sede = s.sk_sede AND s.es_actual = TRUE
-INNER JOIN dw.dim_tiempo t ON fc.sk_tiempo = t.sk_tiempo
+    MIN(a.primera_cita) AS primera_cita,
+    MAX(a.ultima_cita) AS ultima_cita
+    
+FROM dw.agg_citas_veterinario_mes a
+INNER JOIN dw.dim_veterinario v ON a.sk_veterinario = v.sk_veterinario AND v.es_actual = TRUE
+INNER JOIN dw.dim_sede s ON a.sk_sede = s.sk_sede AND s.es_actual = TRUE
+LEFT JOIN (
+    SELECT sk_veterinario, sk_sede, COUNT(*) AS mascotas_unicas
+    FROM dw.agg_mascotas_veterinario
+    GROUP BY sk_veterinario, sk_sede
+) mv ON a.sk_veterinario = mv.sk_veterinario AND a.sk_sede = mv.sk_sede
 GROUP BY v.sk_veterinario, v.nombre_completo, v.especialidad, v.categoria_especialidad, s.nombre, s.ciudad
 ORDER BY ingresos_citas DESC;
 
@@ -462,38 +468,35 @@ SELECT
     c.ciudad AS ciudad_dueno,
     
     -- Estadísticas de citas
-    COUNT(fc.id_cita) AS total_citas,
-    MAX(t.fecha) AS ultima_visita,
-    MIN(t.fecha) AS primera_visita,
-    CURRENT_DATE - MAX(t.fecha) AS dias_sin_visita,
+    COALESCE(a.total_citas, 0)::BIGINT AS total_citas,
+    a.ultima_visita,
+    a.primera_visita,
+    CURRENT_DATE - a.ultima_visita AS dias_sin_visita,
     
     -- Ingresos generados
-    SUM(fc.costo_cita) AS gasto_total_citas,
-    ROUND(AVG(fc.costo_cita), 2) AS gasto_promedio_cita,
+    a.gasto_total::NUMERIC AS gasto_total_citas,
+    ROUND(a.gasto_total / NULLIF(a.citas_con_costo, 0), 2) AS gasto_promedio_cita,
     
     -- Clasificación de cliente
     CASE 
-        WHEN COUNT(fc.id_cita) >= 10 THEN 'VIP'
-        WHEN COUNT(fc.id_cita) >= 5 THEN 'Regular'
-        WHEN COUNT(fc.id_cita) >= 2 THEN 'Ocasional'
+        WHEN a.total_citas >= 10 THEN 'VIP'
+        WHEN a.total_citas >= 5 THEN 'Regular'
+        WHEN a.total_citas >= 2 THEN 'Ocasional'
         ELSE 'Nuevo'
     END AS frecuencia_visitas,
     
     -- Alerta de seguimiento
     CASE 
-        WHEN CURRENT_DATE - MAX(t.fecha) > 365 THEN 'Inactivo +1 año'
-        WHEN CURRENT_DATE - MAX(t.fecha) > 180 THEN 'Necesita seguimiento'
-        WHEN CURRENT_DATE - MAX(t.fecha) > 90 THEN 'Revisión recomendada'
+        WHEN CURRENT_DATE - a.ultima_visita > 365 THEN 'Inactivo +1 año'
+        WHEN CURRENT_DATE - a.ultima_visita > 180 THEN 'Necesita seguimiento'
+        WHEN CURRENT_DATE - a.ultima_visita > 90 THEN 'Revisión recomendada'
         ELSE 'Activo'
     END AS estado_seguimiento
     
 FROM dw.dim_mascota m
 INNER JOIN dw.dim_cliente c ON m.id_cliente = c.id_cliente AND c.es_actual = TRUE
-LEFT JOIN dw.fact_citas fc ON m.sk_mascota = fc.sk_mascota
-LEFT JOIN dw.dim_tiempo t ON fc.sk_tiempo = t.sk_tiempo
+LEFT JOIN dw.agg_citas_mascota a ON m.sk_mascota = a.sk_mascota
 WHERE m.es_actual = TRUE AND m.estado = 'Activo'
-GROUP BY m.sk_mascota, m.nombre, m.especie, m.raza, m.sexo, m.edad_anios, 
-         m.grupo_edad, m.tamano, m.peso_kg, m.id_cliente, c.nombre_completo, c.ciudad
 ORDER BY total_citas DESC;
 
 COMMENT ON VIEW dw.v_tableau_mascotas_activas IS 'Vista consolidada de mascotas activas con análisis de frecuencia';